@@ -18,16 +18,26 @@
 
 #include "caf/config.hpp"
 
+#include <atomic>
 #include <chrono>
+#include <condition_variable>
+#include <deque>
 #include <functional>
 #include <iomanip>
 #include <iostream>
+#include <iterator>
+#include <map>
+#include <mutex>
 #include <set>
+#include <stdexcept>
 #include <thread>
 #include <unordered_map>
 
+#include <fcntl.h>
+#include <unistd.h>
+
 CAF_PUSH_WARNINGS
-#include "third_party/pybind/include/pybind11/pybind11.h"
+#include <pybind11/pybind11.h>
 CAF_POP_WARNINGS
 
 #include "caf/all.hpp"
@@ -51,20 +61,93 @@ constexpr char default_banner[] = R"__(
 
 constexpr char init_script[] = R"__(
 from CAF import *
-
-caf_mail_cache=[]
+from collections import OrderedDict
+
+class MailCache(object):
+    # Stores messages skipped by a selective receive in arrival order. Indexes
+    # messages by leading atom and by type signature, i.e., filters created
+    # with match_atom or match_types find their message without a scan.
+    def __init__(self):
+        self.next_seq = 0
+        # maps sequence numbers to messages
+        self.messages = OrderedDict()
+        # map keys to OrderedDicts of sequence numbers
+        self.by_atom = {}
+        self.by_types = {}
+    def __len__(self):
+        return len(self.messages)
+    def keys_of(self, msg):
+        lead = str(msg[0]) if msg and isinstance(msg[0], atom_value) else None
+        return lead, tuple(type(x) for x in msg)
+    def append(self, msg):
+        seq = self.next_seq
+        self.next_seq += 1
+        self.messages[seq] = msg
+        lead, types = self.keys_of(msg)
+        if lead is not None:
+            self.by_atom.setdefault(lead, OrderedDict())[seq] = None
+        self.by_types.setdefault(types, OrderedDict())[seq] = None
+    def remove(self, seq):
+        msg = self.messages.pop(seq)
+        lead, types = self.keys_of(msg)
+        for index, key in ((self.by_atom, lead), (self.by_types, types)):
+            bucket = index.get(key)
+            if bucket is not None:
+                del bucket[seq]
+                if not bucket:
+                    del index[key]
+        return msg
+    def candidates(self, msg_filter):
+        # returns the sequence numbers of all messages that may match
+        lead = getattr(msg_filter, 'caf_leading_atom', None)
+        if lead is not None:
+            return self.by_atom.get(lead, ())
+        types = getattr(msg_filter, 'caf_type_signature', None)
+        if types is not None:
+            return self.by_types.get(types, ())
+        return self.messages
+    def select(self, msg_filter):
+        for seq in self.candidates(msg_filter):
+            if msg_filter(self.messages[seq]):
+                return self.remove(seq)
+        return None
+    def take(self, max_n):
+        # removes up to max_n messages in arrival order
+        seqs = []
+        for seq in self.messages:
+            if len(seqs) == max_n:
+                break
+            seqs.append(seq)
+        return [self.remove(seq) for seq in seqs]
+
+def match_atom(name, predicate = None):
+    # returns a filter for messages with the atom `name` as first element,
+    # optionally also checking `predicate`
+    name = str(name)
+    def msg_filter(msg):
+        return bool(msg) and isinstance(msg[0], atom_value) \
+               and str(msg[0]) == name and (not predicate or predicate(msg))
+    msg_filter.caf_leading_atom = name
+    return msg_filter
+
+def match_types(*types):
+    # returns a filter for messages with the given element types, e.g.,
+    # match_types(ok_atom, int)
+    def msg_filter(msg):
+        return tuple(type(x) for x in msg) == types
+    msg_filter.caf_type_signature = types
+    return msg_filter
+
+caf_mail_cache = MailCache()
 
 def select_from_mail_cache(msg_filter):
-    global caf_mail_cache
-    for i, v in enumerate(caf_mail_cache):
-        if msg_filter(v):
-            return caf_mail_cache.pop(i)
+    return caf_mail_cache.select(msg_filter)
 
 def no_receive_filter(x):
     return True
 
 def receive_one(abs_timeout):
-    if abs_timeout:
+    if abs_timeout is not None:
         return dequeue_message_with_timeout(abs_timeout)
     else:
         return dequeue_message()
@@ -76,7 +159,7 @@ def receive(timeout = None, msg_filter = no_receive_filter):
         return msg
     # calculate absolute timeout
     abs_timeout = None
-    if timeout:
+    if timeout is not None:
       abs_timeout = absolute_receive_timeout(int(timeout))
     # receive message via mailbox
     msg = receive_one(abs_timeout)
@@ -85,22 +168,72 @@ def receive(timeout = None, msg_filter = no_receive_filter):
         msg = receive_one(abs_timeout)
     return msg
 
+def receive_batch(max_n, timeout = None):
+    # returns up to max_n messages, waits up to timeout ms (forever if None)
+    # only if no message is available
+    msgs = caf_mail_cache.take(max_n)
+    if len(msgs) < max_n:
+        if msgs:
+            timeout = 0
+        elif timeout is not None:
+            timeout = int(timeout)
+        msgs += dequeue_batch(max_n - len(msgs), timeout)
+    return msgs
+
+)__";
+
+// requires Python 3.5 or later
+constexpr char async_init_script[] = R"__(
+import asyncio
+
+class AsyncMailbox(object):
+    # Dispatches incoming messages to pending async_receive calls. A thread in
+    # CAF moves messages from the mailbox to a queue and signals the event
+    # loop via a pipe, i.e., waiting for messages never blocks the loop.
+    def __init__(self, loop):
+        self.loop = loop
+        self.waiters = []
+        loop.add_reader(start_async_receive(), self.dispatch)
+    def dispatch(self):
+        for msg in drain_async_messages():
+            for i, (msg_filter, future) in enumerate(self.waiters):
+                if not future.done() and msg_filter(msg):
+                    del self.waiters[i]
+                    future.set_result(msg)
+                    break
+            else:
+                caf_mail_cache.append(msg)
+    async def receive(self, timeout, msg_filter):
+        msg = select_from_mail_cache(msg_filter)
+        if msg:
+            return msg
+        waiter = (msg_filter, self.loop.create_future())
+        self.waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter[1],
+                                          timeout / 1000.0 if timeout else None)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+caf_async_mailbox = None
+
+async def async_receive(timeout = None, msg_filter = no_receive_filter):
+    # like receive, but suspends the calling coroutine instead of blocking
+    global caf_async_mailbox
+    loop = asyncio.get_event_loop()
+    if caf_async_mailbox is None or caf_async_mailbox.loop is not loop:
+        caf_async_mailbox = AsyncMailbox(loop)
+    return await caf_async_mailbox.receive(timeout, msg_filter)
+
 )__";
 
 } // namespace
 
 namespace caf {
 
-void register_class(atom_value*, pybind11::module& m, const std::string& name) {
-  auto repr_fun = [](atom_value x) { return "atom('" + to_string(x) + "')"; };
-  auto cmp = [](atom_value x, atom_value y) { return x == y; };
-  std::string (*to_string_fun)(atom_value) = &to_string;
-  pybind11::class_<atom_value>(m, name.c_str())
-    .def("__str__", to_string_fun)
-    .def("__repr__", repr_fun)
-    .def("__eq__", cmp);
-}
-
 namespace python {
 namespace {
 
@@ -179,18 +312,37 @@ public:
   }
 };
 
+/// Copies objects that implement the buffer protocol (bytes, bytearray,
+/// memoryview, NumPy arrays, ...) into a `byte_buffer` with a single `memcpy`
+/// instead of converting element by element. Received byte buffers become
+/// `bytes` in Python.
+class buffer_binding : public cpp_binding {
+public:
+  using cpp_binding::cpp_binding;
+
+  void append(message_builder& xs, pybind11::handle x) const override {
+    Py_buffer view;
+    if (PyObject_GetBuffer(x.ptr(), &view, PyBUF_C_CONTIGUOUS) != 0)
+      throw pybind11::error_already_set();
+    byte_buffer buf(static_cast<size_t>(view.len));
+    if (view.len > 0)
+      memcpy(buf.data(), view.buf, static_cast<size_t>(view.len));
+    PyBuffer_Release(&view);
+    xs.append(std::move(buf));
+  }
+
+  pybind11::object to_object(const type_erased_tuple& xs,
+                             size_t pos) const override {
+    auto& buf = xs.get_as<byte_buffer>(pos);
+    return pybind11::bytes(reinterpret_cast<const char*>(buf.data()),
+                           buf.size());
+  }
+};
+
 using binding_ptr = std::unique_ptr<binding>;
 using py_binding_ptr = std::unique_ptr<py_binding>;
 using cpp_binding_ptr = std::unique_ptr<cpp_binding>;
 
-atom_value atom_from_string(const std::string& str) {
-  static constexpr size_t buf_size = 11;
-  char buf[buf_size];
-  memset(buf, 0, buf_size);
-  strncpy(buf, str.c_str(), std::min<size_t>(buf_size - 1, str.size()));
-  return atom(buf);
-}
-
 template <class T>
 class has_register_class {
 private:
@@ -261,20 +413,9 @@ public:
     return x_;
   }
 
-  friend void serialize(serializer& sink, absolute_receive_timeout& x,
-                        const unsigned int) {
-    auto tse = x.x_.time_since_epoch();
-    auto ms_since_epoch = std::chrono::duration_cast<ms>(tse).count();
-    sink << static_cast<uint64_t>(ms_since_epoch);
-  }
-
-  friend void serialize(deserializer& source, absolute_receive_timeout& x,
-                        const unsigned int) {
-    uint64_t ms_since_epoch;
-    source >> ms_since_epoch;
-    clock_type::time_point y;
-    y += ms(static_cast<ms::rep>(ms_since_epoch));
-    x.x_ = y;
+  template <class Inspector>
+  friend auto inspect(Inspector& f, absolute_receive_timeout& x) {
+    return f(meta::type_name("absolute_receive_timeout"), x.x_);
   }
 
 private:
@@ -305,12 +446,54 @@ public:
     // create Python bindings for builtin CAF types
     add_cpp<actor>("actor", "@actor");
     add_cpp<message>("message", "@message");
-    add_cpp<atom_value>("atom_value", "@atom");
+    // each atom is a type of its own, e.g., caf::ok_atom becomes CAF.ok_atom
+    add_atom_type<add_atom>("add");
+    add_atom_type<close_atom>("close");
+    add_atom_type<connect_atom>("connect");
+    add_atom_type<contact_atom>("contact");
+    add_atom_type<delete_atom>("delete");
+    add_atom_type<demonitor_atom>("demonitor");
+    add_atom_type<div_atom>("div");
+    add_atom_type<flush_atom>("flush");
+    add_atom_type<forward_atom>("forward");
+    add_atom_type<get_atom>("get");
+    add_atom_type<idle_atom>("idle");
+    add_atom_type<join_atom>("join");
+    add_atom_type<leave_atom>("leave");
+    add_atom_type<link_atom>("link");
+    add_atom_type<migrate_atom>("migrate");
+    add_atom_type<monitor_atom>("monitor");
+    add_atom_type<mul_atom>("mul");
+    add_atom_type<ok_atom>("ok");
+    add_atom_type<open_atom>("open");
+    add_atom_type<pending_atom>("pending");
+    add_atom_type<ping_atom>("ping");
+    add_atom_type<pong_atom>("pong");
+    add_atom_type<publish_atom>("publish");
+    add_atom_type<publish_udp_atom>("publish_udp");
+    add_atom_type<put_atom>("put");
+    add_atom_type<receive_atom>("receive");
+    add_atom_type<redirect_atom>("redirect");
+    add_atom_type<resolve_atom>("resolve");
+    add_atom_type<spawn_atom>("spawn");
+    add_atom_type<stream_atom>("stream");
+    add_atom_type<sub_atom>("sub");
+    add_atom_type<subscribe_atom>("subscribe");
+    add_atom_type<sys_atom>("sys");
+    add_atom_type<tick_atom>("tick");
+    add_atom_type<unlink_atom>("unlink");
+    add_atom_type<unpublish_atom>("unpublish");
+    add_atom_type<unpublish_udp_atom>("unpublish_udp");
+    add_atom_type<unsubscribe_atom>("unsubscribe");
+    add_atom_type<update_atom>("update");
+    add_atom_type<wait_for_atom>("wait_for");
     // fill list for native type bindings
     add_cpp<bool>("bool", "bool", nullptr);
     add_cpp<float>("float", "float", nullptr);
     add_cpp<int32_t>("int32_t", "@i32", nullptr);
     add_cpp<std::string>("str", "@str", nullptr);
+    // pass Python buffers as byte_buffer
+    add_buffer_binding();
     // custom types of caf_python
     add_message_type<absolute_receive_timeout>("absolute_receive_timeout");
   }
@@ -327,10 +510,29 @@ public:
   void py_init(pybind11::module& x) const {
     for (auto& f : register_funs_)
       f(x);
+    // allows checks such as isinstance(x, atom_value)
+    pybind11::list atom_types;
+    for (auto& kvp : atom_factories_)
+      atom_types.append(pybind11::type::of(kvp.second()));
+    x.attr("atom_value") = pybind11::tuple(atom_types);
+  }
+
+  /// Returns a new instance of the atom type for `name`, e.g., `ok_atom` for
+  /// "ok", or throws `pybind11::value_error` for unknown names.
+  pybind11::object make_atom(const std::string& name) const {
+    auto i = atom_factories_.find(name);
+    if (i == atom_factories_.end())
+      throw pybind11::value_error("unknown atom: " + name);
+    return i->second();
   }
 
   std::string full_pre_run_script() const {
-    return init_script + pre_run;
+    std::string result = init_script;
+#if PY_MAJOR_VERSION >= 3
+    result += async_init_script;
+#endif
+    result += pre_run;
+    return result;
   }
 
   std::string ipython_script() const {
@@ -368,10 +570,22 @@ public:
     return portable_bindings_;
   }
 
+  /// Returns the binding for the builtin type with type number `nr` or
+  /// `nullptr`.
+  cpp_binding* builtin_binding(uint16_t nr) const {
+    auto i = builtin_bindings_.find(nr);
+    return i != builtin_bindings_.end() ? i->second : nullptr;
+  }
+
   const std::unordered_map<std::string, cpp_binding_ptr>& cpp_bindings() const {
     return cpp_bindings_;
   }
 
+  /// Returns the binding for objects that implement the buffer protocol.
+  binding* buffer_fallback() const {
+    return buffer_binding_;
+  }
+
 private:
   template <class T>
   void add_py(std::string name) {
@@ -390,7 +604,10 @@ private:
     py_name.insert(0, "CAF.");
     cpp_bindings_.emplace(py_name, cpp_binding_ptr{ptr});
     bindings_.emplace(std::move(py_name), ptr);
-    portable_bindings_.emplace(std::move(cpp_name), ptr);
+    if (type_nr<T>::value != 0)
+      builtin_bindings_.emplace(type_nr<T>::value, ptr);
+    else
+      portable_bindings_.emplace(std::move(cpp_name), ptr);
   }
 
   template <class T>
@@ -398,10 +615,43 @@ private:
     add_cpp<T>(name, name);
   }
 
+  template <class T>
+  void add_atom_type(std::string name) {
+    auto reg = [name](pybind11::module& m, const std::string& py_name) {
+      auto str_fun = [name](const T&) { return name; };
+      auto repr_fun = [name](const T&) { return "atom('" + name + "')"; };
+      auto cmp = [](const T&, const T&) { return true; };
+      auto hash_fun = [name](const T&) {
+        return std::hash<std::string>{}(name);
+      };
+      pybind11::class_<T>(m, py_name.c_str())
+        .def(pybind11::init<>())
+        .def("__str__", str_fun)
+        .def("__repr__", repr_fun)
+        .def("__eq__", cmp, pybind11::is_operator())
+        .def("__hash__", hash_fun);
+    };
+    add_cpp<T>(name + "_atom", "caf::" + name + "_atom", reg);
+    atom_factories_.emplace(std::move(name),
+                            [] { return pybind11::cast(T{}); });
+  }
+
+  void add_buffer_binding() {
+    auto ptr = new buffer_binding("byte_buffer", false);
+    cpp_bindings_.emplace("CAF.byte_buffer", cpp_binding_ptr{ptr});
+    for (auto name : {"bytes", "bytearray", "memoryview"})
+      bindings_.emplace(name, ptr);
+    builtin_bindings_.emplace(type_nr<byte_buffer>::value, ptr);
+    buffer_binding_ = ptr;
+  }
+
   std::unordered_map<std::string, cpp_binding*> portable_bindings_;
+  std::unordered_map<uint16_t, cpp_binding*> builtin_bindings_;
   std::unordered_map<std::string, binding*> bindings_;
   std::unordered_map<std::string, cpp_binding_ptr> cpp_bindings_;
   std::unordered_map<std::string, py_binding_ptr> py_bindings_;
+  binding* buffer_binding_ = nullptr;
+  std::map<std::string, std::function<pybind11::object()>> atom_factories_;
 
   std::vector<std::function<void(pybind11::module&)>> register_funs_;
 };
@@ -411,10 +661,137 @@ struct py_context {
   scoped_actor& self;
 };
 
+/// Moves messages from the mailbox of a scoped actor to a queue in a
+/// background thread and signals new messages via a pipe. This allows an
+/// event loop in Python to wait for messages without blocking. Once started,
+/// all receive functions fetch messages from the queue instead of the mailbox.
+class async_mailbox {
+public:
+  using clock_type = absolute_receive_timeout::clock_type;
+
+  async_mailbox(scoped_actor& self) : self_(self), running_(true) {
+    if (pipe(pipe_) != 0)
+      CAF_RAISE_ERROR("unable to create pipe for async_mailbox");
+    fcntl(pipe_[0], F_SETFL, fcntl(pipe_[0], F_GETFL) | O_NONBLOCK);
+    thread_ = std::thread{[this] { run(); }};
+  }
+
+  ~async_mailbox() {
+    running_ = false;
+    thread_.join();
+    close(pipe_[0]);
+    close(pipe_[1]);
+  }
+
+  /// Returns the read end of the pipe.
+  int fd() const {
+    return pipe_[0];
+  }
+
+  /// Returns all queued messages without blocking.
+  std::deque<mailbox_element_ptr> take() {
+    // clear the pipe before taking the messages, otherwise we could miss the
+    // notification for a message that arrives in between
+    char buf[64];
+    while (read(pipe_[0], buf, sizeof(buf)) > 0)
+      ; // nop
+    std::deque<mailbox_element_ptr> result;
+    std::unique_lock<std::mutex> guard{mtx_};
+    result.swap(queue_);
+    return result;
+  }
+
+  /// Returns the next queued message without blocking.
+  mailbox_element_ptr try_pop() {
+    std::unique_lock<std::mutex> guard{mtx_};
+    if (queue_.empty())
+      return nullptr;
+    auto result = std::move(queue_.front());
+    queue_.pop_front();
+    return result;
+  }
+
+  /// Puts messages back to the front of the queue, e.g., after failing to
+  /// convert them, and signals them via the pipe again.
+  void requeue(std::deque<mailbox_element_ptr> xs) {
+    if (xs.empty())
+      return;
+    {
+      std::unique_lock<std::mutex> guard{mtx_};
+      queue_.insert(queue_.begin(), std::make_move_iterator(xs.begin()),
+                    std::make_move_iterator(xs.end()));
+    }
+    cv_.notify_one();
+    notify();
+  }
+
+  /// Blocks until a message is queued or until `timeout` (unless `nullptr`)
+  /// expires.
+  mailbox_element_ptr pop(const clock_type::time_point* timeout) {
+    std::unique_lock<std::mutex> guard{mtx_};
+    auto ready = [this] { return !queue_.empty(); };
+    if (timeout == nullptr)
+      cv_.wait(guard, ready);
+    else if (!cv_.wait_until(guard, *timeout, ready))
+      return nullptr;
+    auto result = std::move(queue_.front());
+    queue_.pop_front();
+    return result;
+  }
+
+private:
+  void run() {
+    // wake up regularly to check whether we should stop
+    auto interval = std::chrono::milliseconds(100);
+    while (running_) {
+      if (!self_->await_data(clock_type::now() + interval))
+        continue;
+      auto ptr = self_->next_message();
+      if (!ptr)
+        continue;
+      bool was_empty;
+      {
+        std::unique_lock<std::mutex> guard{mtx_};
+        was_empty = queue_.empty();
+        queue_.emplace_back(std::move(ptr));
+      }
+      cv_.notify_one();
+      if (was_empty)
+        notify();
+    }
+  }
+
+  void notify() {
+    char c = 'm';
+    if (write(pipe_[1], &c, 1) != 1)
+      cerr << "async_mailbox: unable to write to pipe" << endl;
+  }
+
+  scoped_actor& self_;
+  int pipe_[2];
+  std::atomic<bool> running_;
+  std::thread thread_;
+  std::mutex mtx_;
+  std::condition_variable cv_;
+  std::deque<mailbox_element_ptr> queue_;
+};
+
 namespace {
 
 py_context* s_context;
 
+std::unique_ptr<async_mailbox> s_async_mailbox;
+
+// Messages that we took from the mailbox but could not convert yet. Only
+// accessed while holding the GIL.
+std::deque<mailbox_element_ptr> s_stash;
+
+// Set while a thread waits on the mailbox of the scoped actor without the
+// GIL. The mailbox allows only a single reader, so we must neither start the
+// async_mailbox nor read from the mailbox in another thread meanwhile. Only
+// accessed while holding the GIL.
+bool s_blocking_receive = false;
+
 } // namespace
 
 inline void set_py_exception_fill(std::ostream&) {
@@ -433,80 +810,351 @@ void set_py_exception(Ts&&... xs) {
   PyErr_SetString(PyExc_RuntimeError, oss.str().c_str());
 }
 
+/// Caches the binding for each Python type to avoid looking up bindings by
+/// type name for each argument. The cache uses the address of the type object
+/// as key. This is safe even for types that the program creates and drops at
+/// runtime, because the cache owns a reference to each type in it: a cached
+/// type never gets freed, i.e., its address cannot become the address of
+/// another type. The price is that cached types live until the program ends.
+class py_binding_cache {
+public:
+  /// Returns the binding for the type of `x` or `nullptr` after setting a
+  /// Python exception for types that have no binding.
+  binding* get(pybind11::handle x) {
+    auto type = Py_TYPE(x.ptr());
+    auto i = cache_.find(type);
+    if (i != cache_.end())
+      return i->second;
+    binding* res = nullptr;
+    auto& bindings = s_context->cfg.bindings();
+    std::string type_name = PyEval_GetFuncName(x.ptr());
+    auto kvp = bindings.find(type_name);
+    if (kvp != bindings.end()) {
+      res = kvp->second;
+    } else if (PyObject_CheckBuffer(x.ptr())) {
+      res = s_context->cfg.buffer_fallback();
+    } else {
+      set_py_exception(R"(Unable to add element of type ")", type_name,
+                       R"(" to message: type is unknown to CAF)");
+      return nullptr;
+    }
+    // keep the type alive as long as its address is a key in the cache
+    Py_INCREF(type);
+    cache_.emplace(type, res);
+    return res;
+  }
+
+private:
+  std::unordered_map<PyTypeObject*, binding*> cache_;
+};
+
+namespace {
+
+py_binding_cache s_py_binding_cache;
+
+} // namespace
+
+bool append_to_message(message_builder& mb, pybind11::handle x) {
+  auto ptr = s_py_binding_cache.get(x);
+  if (ptr == nullptr)
+    return false;
+  ptr->append(mb, x);
+  return true;
+}
+
 void py_send(const pybind11::args& xs) {
   if (xs.size() < 2) {
     set_py_exception("Too few arguments to call CAF.send");
-    return;
+    throw pybind11::error_already_set();
   }
   auto i = xs.begin();
   auto dest = (*i).cast<actor>();
   ++i;
   message_builder mb;
-  auto& bindings = s_context->cfg.bindings();
-  for (; i != xs.end(); ++i) {
-    std::string type_name = PyEval_GetFuncName((*i).ptr());
-    auto kvp = bindings.find(type_name);
-    if (kvp == bindings.end()) {
-      set_py_exception(R"(Unable to add element of type ")", type_name,
-                       R"(" to message: type is unknown to CAF)");
-      return;
+  for (; i != xs.end(); ++i)
+    if (!append_to_message(mb, *i))
+      throw pybind11::error_already_set();
+  s_context->self->send(dest, mb.move_to_message());
+}
+
+/// Sends one message per element of `xs`. Sending is all-or-nothing: we
+/// convert all elements before sending the first message, i.e., `dest`
+/// receives no message at all if any element fails to convert.
+void py_send_many(const actor& dest, pybind11::iterable xs) {
+  // each element is either a tuple of message elements or a single element
+  std::vector<message> msgs;
+  for (auto x : xs) {
+    message_builder mb;
+    if (PyTuple_Check(x.ptr())) {
+      for (auto y : pybind11::reinterpret_borrow<pybind11::tuple>(x))
+        if (!append_to_message(mb, y))
+          throw pybind11::error_already_set();
+    } else if (!append_to_message(mb, x)) {
+      throw pybind11::error_already_set();
     }
-    kvp->second->append(mb, *i);
+    msgs.emplace_back(mb.move_to_message());
   }
-  s_context->self->send(dest, mb.move_to_message());
+  for (auto& msg : msgs)
+    s_context->self->send(dest, std::move(msg));
 }
 
-pybind11::tuple tuple_from_message(const type_erased_tuple& msg) {
-  auto& self = s_context->self;
-  auto& bindings = s_context->cfg.portable_bindings();
-  pybind11::tuple result(msg.size());
-  auto& types = self->system().types();
-  for (size_t i = 0; i < msg.size(); ++i) {
-    auto rtti = msg.type(i);
-    auto str = types.portable_name(rtti);
+/// Caches the binding for each runtime type of message elements to avoid
+/// looking up portable names and bindings by string for each element. Keys
+/// are type numbers and pointers to `std::type_info` objects, which have
+/// static storage duration, i.e., keys never dangle.
+class binding_cache {
+public:
+  /// Returns the binding for `rtti` or `nullptr` after setting a Python
+  /// exception for types that have no binding.
+  cpp_binding* get(const rtti_pair& rtti) {
+    if (rtti.first != 0) {
+      if (rtti.first < builtins_.size() && builtins_[rtti.first] != nullptr)
+        return builtins_[rtti.first];
+    } else {
+      auto i = custom_.find(rtti.second);
+      if (i != custom_.end())
+        return i->second;
+    }
+    auto res = resolve(rtti);
+    if (res == nullptr)
+      return nullptr;
+    if (rtti.first != 0) {
+      if (rtti.first >= builtins_.size())
+        builtins_.resize(rtti.first + 1u, nullptr);
+      builtins_[rtti.first] = res;
+    } else {
+      custom_.emplace(rtti.second, res);
+    }
+    return res;
+  }
+
+private:
+  cpp_binding* resolve(const rtti_pair& rtti) {
+    auto& types = s_context->self->system().types();
+    // builtin types have no type_info, i.e., we look them up by number
+    if (rtti.first != 0) {
+      auto res = s_context->cfg.builtin_binding(rtti.first);
+      if (res == nullptr)
+        set_py_exception(R"(Unable to add element of type ")",
+                         types.portable_name(rtti),
+                         R"(" to message: type is unknown to CAF)");
+      return res;
+    }
+    auto& bindings = s_context->cfg.portable_bindings();
+    auto& str = types.portable_name(rtti);
     if (str == types.default_type_name()) {
-      set_py_exception("Unable to extract element #", i,
-                       " from message: ", "could not get portable name of ",
+      set_py_exception("Unable to extract element from message: ",
+                       "could not get portable name of ",
                        rtti.second->name());
-      return pybind11::tuple{};
+      return nullptr;
     }
     auto kvp = bindings.find(str);
     if (kvp == bindings.end()) {
       set_py_exception(R"(Unable to add element of type ")", str,
                        R"(" to message: type is unknown to CAF)");
+      return nullptr;
+    }
+    return kvp->second;
+  }
+
+  // indexed by the type number of builtin types
+  std::vector<cpp_binding*> builtins_;
+  // custom types have the type number 0
+  std::unordered_map<const std::type_info*, cpp_binding*> custom_;
+};
+
+namespace {
+
+binding_cache s_binding_cache;
+
+} // namespace
+
+pybind11::tuple tuple_from_message(const type_erased_tuple& msg) {
+  pybind11::tuple result(msg.size());
+  for (size_t i = 0; i < msg.size(); ++i) {
+    auto ptr = s_binding_cache.get(msg.type(i));
+    if (ptr == nullptr)
+      return pybind11::tuple{};
+    // conversions may throw, e.g., for strings that are no valid UTF-8
+    pybind11::object obj;
+    try {
+      obj = ptr->to_object(msg, i);
+    } catch (pybind11::error_already_set& err) {
+      err.restore();
+      return pybind11::tuple{};
+    } catch (std::exception& err) {
+      set_py_exception("Unable to extract element from message: ",
+                       err.what());
       return pybind11::tuple{};
     }
-    auto obj = kvp->second->to_object(msg, i);
     PyTuple_SetItem(result.ptr(), static_cast<int>(i), obj.release().ptr());
   }
   return result;
 }
 
-pybind11::tuple py_dequeue() {
-  auto& self = s_context->self;
-  auto ptr = self->next_message();
-  while (!ptr) {
-    self->await_data();
-    ptr = self->next_message();
+/// Puts messages back for the next receive, preserving their order.
+void requeue(std::deque<mailbox_element_ptr> xs) {
+  if (s_async_mailbox) {
+    s_async_mailbox->requeue(std::move(xs));
+    return;
   }
-  return tuple_from_message(std::move(ptr->content()));
+  s_stash.insert(s_stash.begin(), std::make_move_iterator(xs.begin()),
+                 std::make_move_iterator(xs.end()));
 }
 
-pybind11::tuple py_dequeue_with_timeout(absolute_receive_timeout timeout) {
+/// Returns the next message without blocking or `nullptr`.
+mailbox_element_ptr try_next_message() {
+  if (!s_stash.empty()) {
+    auto result = std::move(s_stash.front());
+    s_stash.pop_front();
+    return result;
+  }
+  if (s_async_mailbox)
+    return s_async_mailbox->try_pop();
+  // another thread currently reads from the mailbox
+  if (s_blocking_receive)
+    return nullptr;
+  // next_message blocks until a message arrives
   auto& self = s_context->self;
-  auto ptr = self->next_message();
-  while (!ptr) {
-    if (!self->await_data(timeout.value()))
-      return pybind11::none{};
-    ptr = self->next_message();
+  if (!self->has_next_message())
+    return nullptr;
+  return self->next_message();
+}
+
+mailbox_element_ptr
+await_message(const absolute_receive_timeout::clock_type::time_point* timeout) {
+  if (!s_stash.empty()) {
+    auto result = std::move(s_stash.front());
+    s_stash.pop_front();
+    return result;
   }
-  return tuple_from_message(std::move(ptr->content()));
+  // access s_async_mailbox only while holding the GIL
+  auto mbox = s_async_mailbox.get();
+  if (mbox == nullptr && s_blocking_receive)
+    throw std::runtime_error("another thread is already receiving messages");
+  // the guard outlives `nogil`, i.e., resets the flag with the GIL acquired
+  struct blocking_receive_guard {
+    bool active;
+    ~blocking_receive_guard() {
+      if (active)
+        s_blocking_receive = false;
+    }
+  } guard{mbox == nullptr};
+  s_blocking_receive = guard.active;
+  // release the GIL while waiting to allow other Python threads to run
+  pybind11::gil_scoped_release nogil;
+  if (mbox != nullptr)
+    return mbox->pop(timeout);
+  auto& self = s_context->self;
+  if (timeout != nullptr && !self->await_data(*timeout))
+    return nullptr;
+  return self->next_message();
+}
+
+/// Converts the content of `ptr` to a tuple. Drops messages that we fail to
+/// convert, i.e., the next receive returns the message after it.
+pybind11::tuple tuple_from_element(mailbox_element_ptr ptr) {
+  auto result = tuple_from_message(ptr->content());
+  if (PyErr_Occurred())
+    throw pybind11::error_already_set();
+  return result;
+}
+
+pybind11::tuple py_dequeue() {
+  return tuple_from_element(await_message(nullptr));
+}
+
+pybind11::object py_dequeue_with_timeout(absolute_receive_timeout timeout) {
+  auto ptr = await_message(&timeout.value());
+  if (!ptr)
+    return pybind11::none{};
+  return tuple_from_element(std::move(ptr));
+}
+
+/// Converts `xs` to tuples and appends them to `result`. On error, puts the
+/// failed message and all messages after it back for the next receive and
+/// raises the error unless `result` already has converted messages, i.e.,
+/// the failed message raises on the next receive and we never drop messages
+/// that we could convert.
+void append_converted(pybind11::list& result,
+                      std::deque<mailbox_element_ptr>& xs) {
+  while (!xs.empty()) {
+    auto tup = tuple_from_message(std::move(xs.front()->content()));
+    if (PyErr_Occurred()) {
+      if (pybind11::len(result) == 0) {
+        // drop only the message we failed to convert
+        xs.pop_front();
+        requeue(std::move(xs));
+        throw pybind11::error_already_set();
+      }
+      PyErr_Clear();
+      requeue(std::move(xs));
+      return;
+    }
+    result.append(std::move(tup));
+    xs.pop_front();
+  }
+}
+
+pybind11::list py_dequeue_batch(size_t max_n, pybind11::object timeout) {
+  // waits for the first message (unless timeout is 0) and then takes all
+  // messages that are ready, up to max_n, without blocking again
+  pybind11::list result;
+  if (max_n == 0)
+    return result;
+  mailbox_element_ptr ptr;
+  if (timeout.is_none()) {
+    ptr = await_message(nullptr);
+  } else {
+    absolute_receive_timeout abs_timeout{timeout.cast<int>()};
+    ptr = await_message(&abs_timeout.value());
+  }
+  std::deque<mailbox_element_ptr> xs;
+  while (ptr != nullptr) {
+    xs.emplace_back(std::move(ptr));
+    if (xs.size() == max_n)
+      break;
+    ptr = try_next_message();
+  }
+  append_converted(result, xs);
+  return result;
+}
+
+int py_start_async_receive() {
+  if (s_blocking_receive)
+    throw std::runtime_error("cannot start async receive while another "
+                             "thread waits for messages");
+  if (!s_async_mailbox) {
+    s_async_mailbox.reset(new async_mailbox(s_context->self));
+    // hand over messages that we took from the mailbox before
+    std::deque<mailbox_element_ptr> xs;
+    xs.swap(s_stash);
+    s_async_mailbox->requeue(std::move(xs));
+  }
+  return s_async_mailbox->fd();
+}
+
+pybind11::list py_drain_async_messages() {
+  pybind11::list result;
+  if (!s_async_mailbox)
+    return result;
+  auto xs = s_async_mailbox->take();
+  append_converted(result, xs);
+  return result;
 }
 
 actor py_self() {
   return s_context->self;
 }
 
+pybind11::object py_atom(const std::string& name) {
+  return s_context->cfg.make_atom(name);
+}
+
+void py_send_invalid_utf8(const actor& dest) {
+  s_context->self->send(dest, std::string{"\xff\xfe"});
+}
+
 struct foo {
   int x;
   int y;
@@ -518,10 +1166,9 @@ struct foo {
   }
 };
 
-template <class Processor>
-void serialize(Processor& proc, foo& f, const unsigned int) {
-  proc& f.x;
-  proc& f.y;
+template <class Inspector>
+auto inspect(Inspector& f, foo& x) {
+  return f(meta::type_name("foo"), x.x, x.y);
 }
 
 std::string to_string(const foo& x) {
@@ -548,16 +1195,36 @@ void register_class(foo*, pybind11::module& m, const std::string& name) {
 #endif
 
 CAF_MODULE_INIT_RES caf_module_init() {
-  pybind11::module m("CAF", "Python binding for CAF");
+  static PyModuleDef def;
+  auto m = pybind11::module::create_extension_module(
+    "CAF", "Python binding for CAF", &def);
   s_context->cfg.py_init(m);
   // add classes
   // add free functions
   m.def("send", &py_send, "Sends a message to an actor")
+    .def("send_many", &py_send_many,
+         "Sends one message per element of an iterable to an actor, "
+         "elements are either tuples or single values. Sends nothing if "
+         "any element fails to convert")
     .def("dequeue_message", &py_dequeue, "Receives the next message")
     .def("dequeue_message_with_timeout", &py_dequeue_with_timeout,
          "Receives the next message")
+    .def("dequeue_batch", &py_dequeue_batch,
+         "Receives up to max_n messages, waiting up to timeout ms (forever "
+         "if None) for the first one",
+         pybind11::arg("max_n"), pybind11::arg("timeout") = pybind11::none())
+    .def("start_async_receive", &py_start_async_receive,
+         "Moves incoming messages to a queue in the background and returns a "
+         "file descriptor that becomes readable when messages arrive")
+    .def("drain_async_messages", &py_drain_async_messages,
+         "Returns all queued messages after start_async_receive")
     .def("self", &py_self, "Returns the global self handle")
-    .def("atom", &atom_from_string, "Creates an atom from a string");
+    .def("atom", &py_atom,
+         "Returns an instance of the atom type for a name, e.g., "
+         "atom('ok') == ok_atom()")
+    .def("_send_invalid_utf8", &py_send_invalid_utf8,
+         "Sends a string that is no valid UTF-8 to an actor, i.e., a "
+         "message that Python cannot convert (for testing)");
   CAF_MODULE_INIT_RET(m.ptr())
 }
 
@@ -610,6 +1277,7 @@ void caf_main(actor_system& system, const config& cfg) {
     cerr << "Unable to launch interactive Python shell!" << endl
          << "Please install it using: pip install ipython" << endl;
   }
+  s_async_mailbox.reset();
   Py_Finalize();
 }
 
@@ -0,0 +1,91 @@
+# Tests for async_receive of caf-python. Runs in the interpreter of
+# caf-python, i.e., with the names of its init script in scope. Once started,
+# the async mailbox stays active, i.e., this test needs a process of its own.
+
+# usage: caf-python -f libcaf_python/test/async_receive.py
+
+import asyncio, unittest
+
+import CAF
+
+class AsyncReceiveTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        # errors of AsyncMailbox.dispatch end up in the exception handler
+        self.errors = []
+        self.loop.set_exception_handler(
+            lambda loop, ctx: self.errors.append(ctx.get('exception')))
+
+    def tearDown(self):
+        async def drain():
+            while await async_receive(10):
+                pass
+        self.loop.run_until_complete(drain())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_receive(self):
+        async def run():
+            send(self_handle, atom('ping'), 1)
+            first = await async_receive(1000)
+            # messages arriving while the coroutine waits
+            self.loop.call_later(0.05, send, self_handle, atom('pong'), 2)
+            second = await async_receive(1000)
+            return first, second
+        self.assertEqual(self.run_async(run()),
+                         ((ping_atom(), 1), (pong_atom(), 2)))
+
+    def test_receive_timeout(self):
+        self.assertIsNone(self.run_async(async_receive(10)))
+
+    def test_filters(self):
+        async def run():
+            waiter = asyncio.ensure_future(
+                async_receive(1000, match_atom('pong')))
+            await asyncio.sleep(0.01)
+            send(self_handle, atom('ping'), 1)
+            send(self_handle, atom('pong'), 2)
+            result = await waiter
+            # the skipped message waits in the cache
+            return result, await async_receive(1000)
+        self.assertEqual(self.run_async(run()),
+                         ((pong_atom(), 2), (ping_atom(), 1)))
+
+    def test_concurrent_receives(self):
+        async def run():
+            waiters = [asyncio.ensure_future(async_receive(1000))
+                       for _ in range(3)]
+            await asyncio.sleep(0.01)
+            for i in range(3):
+                send(self_handle, atom('ok'), i)
+            return await asyncio.gather(*waiters)
+        self.assertEqual(self.run_async(run()),
+                         [(ok_atom(), 0), (ok_atom(), 1), (ok_atom(), 2)])
+
+    def test_unconvertible_message(self):
+        # the failed message raises in dispatch while the messages after it
+        # get requeued and still arrive in order
+        async def run():
+            send(self_handle, atom('ok'), 1)
+            CAF._send_invalid_utf8(self_handle)
+            send(self_handle, atom('ok'), 2)
+            send(self_handle, atom('ok'), 3)
+            return [await async_receive(1000) for _ in range(3)]
+        self.assertEqual(self.run_async(run()),
+                         [(ok_atom(), 1), (ok_atom(), 2), (ok_atom(), 3)])
+        self.assertEqual([type(x) for x in self.errors], [UnicodeDecodeError])
+
+    def test_blocking_receive_after_start(self):
+        # blocking receives read from the queue of the async mailbox as well
+        self.run_async(async_receive(10))
+        send(self_handle, atom('ok'), 1)
+        self.assertEqual(receive(1000), (ok_atom(), 1))
+        self.assertEqual(receive_batch(10, 10), [])
+
+self_handle = self()
+
+unittest.main(argv=['caf-python'])
@@ -0,0 +1,66 @@
+# Tests for batched dequeues and the type binding caches of caf-python. Runs
+# in the interpreter of caf-python, i.e., with the names of its init script
+# in scope.
+
+# usage: caf-python -f libcaf_python/test/batch.py
+
+import gc, time, unittest
+
+class BatchTest(unittest.TestCase):
+    def tearDown(self):
+        # leave no message behind for the next test
+        while receive(0):
+            pass
+
+    def test_batches(self):
+        for i in range(10):
+            send(self_handle, atom('ok'), i)
+        self.assertEqual(receive_batch(4), [(ok_atom(), i) for i in range(4)])
+        self.assertEqual(dequeue_batch(4, 0),
+                         [(ok_atom(), i) for i in range(4, 8)])
+        self.assertEqual(receive_batch(4, 1000), [(ok_atom(), 8),
+                                                  (ok_atom(), 9)])
+        self.assertEqual(receive_batch(0), [])
+
+    def test_timeouts(self):
+        self.assertEqual(receive_batch(10, 0), [])
+        start = time.monotonic()
+        self.assertEqual(receive_batch(10, 50), [])
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_cache_first(self):
+        # messages skipped by selective receives come first and a batch with
+        # cached messages does not block for more
+        send(self_handle, atom('get'), 1)
+        send(self_handle, atom('ok'), 2)
+        self.assertEqual(receive(1000, match_atom('ok')), (ok_atom(), 2))
+        send(self_handle, atom('get'), 3)
+        self.assertEqual(receive_batch(10), [(get_atom(), 1),
+                                             (get_atom(), 3)])
+
+    def test_mixed_types(self):
+        # each type resolves its binding once and then hits the cache
+        msgs = [(atom('ok'), 1, 'a', 1.5, True, b'x', self_handle)] * 3
+        msgs += [(foo(1, 2),), (atom('get'),)] * 3
+        send_many(self_handle, msgs)
+        result = receive_batch(len(msgs), 1000)
+        self.assertEqual([x[:6] for x in result[:3]],
+                         [(ok_atom(), 1, 'a', 1.5, True, b'x')] * 3)
+        self.assertEqual([(x.x, x.y) for (x,) in result[3::2]], [(1, 2)] * 3)
+        self.assertEqual(result[4::2], [(get_atom(),)] * 3)
+
+    def test_python_types_created_at_runtime(self):
+        # the cache for Python types keeps each cached type alive, i.e., a
+        # new type never gets the address and binding of a dropped one
+        for _ in range(100):
+            buffer_type = type('buffer_type', (bytearray,), {})
+            send(self_handle, buffer_type(b'x'))
+            del buffer_type
+            gc.collect()
+            other_type = type('other_type', (object,), {})
+            self.assertRaises(RuntimeError, send, self_handle, other_type())
+            self.assertEqual(receive(1000), (b'x',))
+
+self_handle = self()
+
+unittest.main(argv=['caf-python'])
@@ -0,0 +1,101 @@
+# Tests for the indexed mail cache of selective receives in caf-python. Runs
+# in the interpreter of caf-python, i.e., with the names of its init script
+# in scope.
+
+# usage: caf-python -f libcaf_python/test/mail_cache.py
+
+import unittest
+
+class MailCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = MailCache()
+        self.msgs = [(ok_atom(), 1), (get_atom(), 'x'), (1, 2), (ok_atom(), 3),
+                     ('ok', 4), (), (get_atom(), 5)]
+        for msg in self.msgs:
+            self.cache.append(msg)
+
+    def test_match_atom(self):
+        # finds messages in arrival order and ignores strings that look like
+        # atoms
+        select = self.cache.select
+        self.assertEqual(select(match_atom('ok')), (ok_atom(), 1))
+        self.assertEqual(select(match_atom('ok')), (ok_atom(), 3))
+        self.assertIsNone(select(match_atom('ok')))
+        self.assertEqual(select(match_atom('get', lambda x: x[1] == 5)),
+                         (get_atom(), 5))
+        self.assertEqual(select(match_atom(get_atom())), (get_atom(), 'x'))
+        self.assertIsNone(select(match_atom('put')))
+        self.assertEqual(len(self.cache), 3)
+
+    def test_match_types(self):
+        select = self.cache.select
+        self.assertEqual(select(match_types(ok_atom, int)), (ok_atom(), 1))
+        self.assertEqual(select(match_types(int, int)), (1, 2))
+        self.assertEqual(select(match_types()), ())
+        self.assertEqual(select(match_types(ok_atom, int)), (ok_atom(), 3))
+        self.assertIsNone(select(match_types(ok_atom, int)))
+        self.assertEqual(len(self.cache), 3)
+
+    def test_index_lookups(self):
+        # filters with an index key only look at their bucket
+        calls = []
+        def pred(msg):
+            calls.append(msg)
+            return False
+        self.assertIsNone(self.cache.select(match_atom('get', pred)))
+        self.assertEqual(calls, [(get_atom(), 'x'), (get_atom(), 5)])
+
+    def test_arbitrary_predicates(self):
+        select = self.cache.select
+        self.assertEqual(select(lambda x: len(x) == 2 and x[1] == 4),
+                         ('ok', 4))
+        self.assertEqual(select(no_receive_filter), (ok_atom(), 1))
+        self.assertIsNone(select(lambda x: False))
+        self.assertEqual(len(self.cache), 5)
+
+    def test_indexes_stay_consistent(self):
+        # messages leave all indexes, no matter which filter selected them
+        select = self.cache.select
+        self.assertEqual(select(no_receive_filter), (ok_atom(), 1))
+        self.assertEqual(select(match_types(ok_atom, int)), (ok_atom(), 3))
+        self.assertIsNone(select(match_atom('ok')))
+        self.assertEqual(self.cache.take(100), [
+            (get_atom(), 'x'), (1, 2), ('ok', 4), (), (get_atom(), 5)])
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.by_atom, {})
+        self.assertEqual(self.cache.by_types, {})
+
+    def test_take(self):
+        self.assertEqual(self.cache.take(0), [])
+        self.assertEqual(self.cache.take(2), self.msgs[:2])
+        self.assertEqual(self.cache.take(100), self.msgs[2:])
+        self.assertEqual(self.cache.take(1), [])
+
+class SelectiveReceiveTest(unittest.TestCase):
+    def tearDown(self):
+        # leave no message behind for the next test
+        while receive(0):
+            pass
+
+    def test_out_of_order_receives(self):
+        # receive skips messages into the cache and later receives take them
+        # from the cache in arrival order
+        for i in range(100):
+            send(self_handle, atom('ping') if i % 2 else atom('pong'), i)
+        for i in range(1, 100, 2):
+            self.assertEqual(receive(1000, match_atom('ping')),
+                             (ping_atom(), i))
+        self.assertEqual(len(caf_mail_cache), 50)
+        for i in range(0, 100, 2):
+            self.assertEqual(receive(1000, match_types(pong_atom, int)),
+                             (pong_atom(), i))
+        self.assertEqual(len(caf_mail_cache), 0)
+
+    def test_receive_timeout_keeps_skipped_messages(self):
+        send(self_handle, atom('ok'), 1)
+        self.assertIsNone(receive(10, match_atom('get')))
+        self.assertEqual(receive(), (ok_atom(), 1))
+
+self_handle = self()
+
+unittest.main(argv=['caf-python'])
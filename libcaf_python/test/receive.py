@@ -0,0 +1,62 @@
+# Tests for blocking receives of caf-python. Runs in the interpreter of
+# caf-python, i.e., with the names of its init script in scope.
+
+# usage: caf-python -f libcaf_python/test/receive.py
+
+import unittest
+
+import CAF
+
+class ReceiveTest(unittest.TestCase):
+    def tearDown(self):
+        # leave no message behind for the next test
+        while receive(0):
+            pass
+
+    def test_receive(self):
+        send(self_handle, atom('ping'), 42)
+        send(self_handle, 'hello', 1.5, True)
+        send(self_handle, b'\x00\xff')
+        self.assertEqual(receive(1000), (ping_atom(), 42))
+        self.assertEqual(receive(), ('hello', 1.5, True))
+        self.assertEqual(receive(1000), (b'\x00\xff',))
+
+    def test_receive_timeout(self):
+        self.assertIsNone(receive(10))
+
+    def test_atoms(self):
+        self.assertEqual(atom('ok'), ok_atom())
+        self.assertNotEqual(atom('ok'), atom('get'))
+        self.assertNotEqual(atom('ok'), 'ok')
+        self.assertEqual(str(atom('ok')), 'ok')
+        self.assertEqual(repr(ok_atom()), "atom('ok')")
+        self.assertEqual(len({ok_atom(), atom('ok'), get_atom()}), 2)
+        self.assertIsInstance(ok_atom(), atom_value)
+        self.assertNotIsInstance('ok', atom_value)
+        self.assertRaises(ValueError, atom, 'no_such')
+
+    def test_unconvertible_message(self):
+        # receive drops the message and raises, the next receive continues
+        # with the message after it
+        send(self_handle, atom('ok'), 1)
+        CAF._send_invalid_utf8(self_handle)
+        send(self_handle, atom('ok'), 2)
+        self.assertEqual(receive(1000), (ok_atom(), 1))
+        self.assertRaises(UnicodeDecodeError, receive, 1000)
+        self.assertEqual(receive(1000), (ok_atom(), 2))
+
+    def test_unconvertible_message_in_batch(self):
+        # the batch ends before the message, i.e., the messages after it
+        # stay in order for the next receives
+        send(self_handle, atom('ok'), 1)
+        CAF._send_invalid_utf8(self_handle)
+        send(self_handle, atom('ok'), 2)
+        send(self_handle, atom('ok'), 3)
+        self.assertEqual(receive_batch(10, 1000), [(ok_atom(), 1)])
+        self.assertRaises(UnicodeDecodeError, receive_batch, 10, 1000)
+        self.assertEqual(receive_batch(10, 1000),
+                         [(ok_atom(), 2), (ok_atom(), 3)])
+
+self_handle = self()
+
+unittest.main(argv=['caf-python'])
@@ -0,0 +1,42 @@
+# Tests for send and send_many of caf-python. Runs in the interpreter of
+# caf-python, i.e., with the names of its init script in scope.
+
+# usage: caf-python -f libcaf_python/test/send.py
+
+import unittest
+
+class SendTest(unittest.TestCase):
+    def tearDown(self):
+        # leave no message behind for the next test
+        while receive(0):
+            pass
+
+    def test_send(self):
+        send(self_handle, atom('ok'), 1, 'two', b'3')
+        self.assertEqual(receive(1000), (ok_atom(), 1, 'two', b'3'))
+
+    def test_send_errors(self):
+        self.assertRaises(RuntimeError, send, self_handle)
+        self.assertRaises(RuntimeError, send, self_handle, 1, object())
+        self.assertIsNone(receive(10))
+
+    def test_send_many(self):
+        send_many(self_handle, [(atom('ok'), 1), 2, ('three',), ()])
+        self.assertEqual(receive_batch(10, 1000),
+                         [(ok_atom(), 1), (2,), ('three',), ()])
+        send_many(self_handle, (x for x in range(3)))
+        self.assertEqual(receive_batch(10, 1000), [(0,), (1,), (2,)])
+        send_many(self_handle, [])
+        self.assertIsNone(receive(10))
+
+    def test_send_many_is_all_or_nothing(self):
+        # elements with unknown types or values that do not fit the C++
+        # type raise before sending the first message
+        for bad in (object(), (1, object()), 1 << 40):
+            self.assertRaises(RuntimeError, send_many, self_handle,
+                              [(atom('ok'), 1), bad, (atom('ok'), 2)])
+            self.assertIsNone(receive(10))
+
+self_handle = self()
+
+unittest.main(argv=['caf-python'])
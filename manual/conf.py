@@ -20,38 +20,143 @@
 # import sys
 # sys.path.insert(0, os.path.abspath('.'))
 
-import os, sys, git, re, pathlib
+import os, sys, re, json, zlib, pathlib
 
 # -- CAF-specific variables ---------------------------------------------------
 
 conf_dir = pathlib.Path(__file__).parent.absolute()
 root_dir = conf_dir.parent.absolute()
 
-# Fetch the CAF version.
-import re
-with open(os.path.join(root_dir, "libcaf_core/caf/config.hpp")) as f:
-    match = re.search('^#define CAF_VERSION ([0-9]+)$', f.read(), re.MULTILINE)
+config_hpp = os.path.join(root_dir, "libcaf_core/caf/config.hpp")
+
+# Resolving version and release only depends on config.hpp and the Git HEAD,
+# so we store the result next to this file and reuse it as long as none of
+# the inputs changed. This keeps GitPython out of incremental builds.
+version_cache_file = os.path.join(conf_dir, ".version-cache.json")
+
+def find_git_dir(path):
+    # returns the Git directory and the common directory for refs and objects
+    git_dir = os.path.join(path, ".git")
+    if os.path.isfile(git_dir):
+        # worktrees and submodules use a file with "gitdir: <path>"
+        with open(git_dir) as f:
+            line = f.read().strip()
+        if not line.startswith("gitdir: "):
+            return None, None
+        git_dir = os.path.join(path, line[len("gitdir: "):])
+    if not os.path.isdir(git_dir):
+        return None, None
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_file):
+        with open(commondir_file) as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+    return git_dir, common_dir
+
+def read_head(git_dir, common_dir):
+    # returns the commit ID of HEAD and the ref file it depends on
+    with open(os.path.join(git_dir, "HEAD")) as f:
+        head = f.read().strip()
+    if not head.startswith("ref: "):
+        return head, None
+    ref = head[len("ref: "):]
+    for base in (git_dir, common_dir):
+        ref_file = os.path.join(base, ref)
+        if os.path.isfile(ref_file):
+            with open(ref_file) as f:
+                return f.read().strip(), ref_file
+    packed_refs = os.path.join(common_dir, "packed-refs")
+    if os.path.isfile(packed_refs):
+        with open(packed_refs) as f:
+            for line in f:
+                xs = line.split()
+                if len(xs) == 2 and xs[1] == ref:
+                    return xs[0], packed_refs
+    return None, None
+
+def read_commit_message(common_dir, commit):
+    # reads a loose commit object, returns None for packed objects
+    path = os.path.join(common_dir, "objects", commit[:2], commit[2:])
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        raw = zlib.decompress(f.read())
+    header, _, body = raw.partition(b"\0")
+    if not header.startswith(b"commit "):
+        return None
+    _, _, message = body.partition(b"\n\n")
+    return message.decode("utf-8", "replace")
+
+def read_head_with_gitpython():
+    import git
+    repo = git.Repo(root_dir)
+    return str(repo.head.commit), repo.head.commit.message
+
+def read_version():
+    # returns the CAF version as string, e.g., "0.17.3"
+    with open(config_hpp) as f:
+        match = re.search('^#define CAF_VERSION ([0-9]+)$', f.read(),
+                          re.MULTILINE)
     if match == None:
         raise RuntimeError("unable to locate CAF_VERSION string in config.hpp")
     raw_version = int(match.group(1))
     major = int(raw_version / 10000)
     minor = int(raw_version / 100) % 100
     patch = raw_version % 100
-    version = '{}.{}.{}'.format(major, minor, patch)
-
-# We're building a stable release if the last commit message is
-# "Change version to <version>".
-repo = git.Repo(root_dir)
-is_stable = repo.head.commit.message.startswith("Change version to " + version)
-
-# Generate the full version, including alpha/beta/rc tags. For stable releases,
-# this is always the same as the CAF version.
-if is_stable:
-    release = version
-else:
-    last_commit_full = str(repo.head.commit)
-    last_commit = last_commit_full[:7]
-    release = version + "+exp.sha." + last_commit
+    return '{}.{}.{}'.format(major, minor, patch)
+
+def mtimes(paths):
+    return [os.stat(x).st_mtime_ns if x and os.path.exists(x) else None
+            for x in paths]
+
+def resolve_version():
+    # returns version and release, using the cache if possible
+    git_dir, common_dir = find_git_dir(root_dir)
+    head_file = os.path.join(git_dir, "HEAD") if git_dir else None
+    commit, ref_file = None, None
+    if git_dir:
+        try:
+            commit, ref_file = read_head(git_dir, common_dir)
+        except (IOError, OSError):
+            pass
+    key = mtimes([head_file, config_hpp, ref_file])
+    try:
+        with open(version_cache_file) as f:
+            cached = json.load(f)
+        if cached["key"] == key and cached["commit"] == commit:
+            return cached["version"], cached["release"]
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+    version = read_version()
+    message = None
+    if commit:
+        try:
+            message = read_commit_message(common_dir, commit)
+        except (IOError, OSError, zlib.error):
+            pass
+    if message is None:
+        commit, message = read_head_with_gitpython()
+    # We're building a stable release if the last commit message is
+    # "Change version to <version>".
+    is_stable = message.startswith("Change version to " + version)
+    # Generate the full version, including alpha/beta/rc tags. For stable
+    # releases, this is always the same as the CAF version.
+    if is_stable:
+        release = version
+    else:
+        release = version + "+exp.sha." + commit[:7]
+    try:
+        tmp = version_cache_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"key": key, "commit": commit, "version": version,
+                       "release": release}, f)
+        os.replace(tmp, version_cache_file)
+    except (IOError, OSError):
+        # the cache is optional, e.g., for read-only source trees
+        pass
+    return version, release
+
+version, release = resolve_version()
 
 # -- Enable Sphinx to find the literal includes -------------------------------
 
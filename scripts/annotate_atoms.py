@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+# Replaces integers in log lines that are valid atom_value encodings with the
+# decoded atom in single quotes, e.g., `4090473` becomes `'add'`. Works as a
+# filter in a pipe and flushes whenever it has processed all available input.
+#
+# Any integer with the marker 0xF right before its characters is a valid
+# encoding, which includes plenty of ordinary numbers for short atoms. Hence,
+# the script only considers atoms with at least --min-length characters or,
+# with --atoms, only the atoms listed in a file (one name per line).
+
+# usage:  some_caf_app | annotate_atoms.py
+#         annotate_atoms.py --atoms atoms.txt < caf.log > annotated.log
+
+import argparse, sys, os, re, functools
+
+from atom_codec import MAX_LENGTH, MARKER, atom_read, atom_length, atom_encode
+
+# maximum number of bytes we read at once
+READ_SIZE = 1024 * 1024
+
+def make_rx(min_length):
+    # returns a regex for integers that are large enough to encode an atom
+    # with `min_length` characters, letting the regex engine discard most
+    # numbers before we convert anything
+    lower = MARKER << (6 * min_length)
+    upper = 1 << 64
+    digits = '{{{0},{1}}}'.format(len(str(lower)), len(str(upper)))
+    hex_digits = '{{{0},16}}'.format(len('{0:x}'.format(lower)))
+    return re.compile(rb'(?<![\w.])(?:0x[0-9a-fA-F]' + hex_digits.encode()
+                      + rb'|[0-9]' + digits.encode() + rb')(?![\w.])')
+
+class Annotator(object):
+    def __init__(self, min_length, atoms=None, cache_size=65536):
+        self.min_length = min_length
+        # maps values to replacements if we only replace known atoms
+        self.atoms = atoms
+        self.rx = make_rx(min_length)
+        # the same few atoms make up most matches, so we cache by the raw
+        # token to skip integer conversion as well
+        self.convert = functools.lru_cache(cache_size)(self.convert)
+
+    def convert(self, token):
+        # returns the replacement for a token
+        value = int(token, 16) if token[1:2] == b'x' else int(token)
+        if self.atoms is not None:
+            return self.atoms.get(value, token)
+        if atom_length(value) < self.min_length:
+            return token
+        return ("'" + atom_read(value) + "'").encode('ascii')
+
+    def annotate(self, data):
+        # annotates a block of complete lines
+        convert = self.convert
+        return self.rx.sub(lambda m: convert(m.group()), data)
+
+def read_atoms(path):
+    # reads atom names (one per line) and returns a value -> replacement map
+    result = {}
+    with open(path) as fp:
+        for line in fp:
+            name = line.strip()
+            if not name or name.startswith('#'):
+                continue
+            if name.startswith("'") and name.endswith("'"):
+                name = name[1:-1]
+            result[atom_encode(name)] = ("'" + name + "'").encode('ascii')
+    return result
+
+def run(fp, out, annotator):
+    # reads whatever input is available, processes all complete lines at once
+    # and flushes, i.e., latency stays low when following a live log and
+    # throughput stays high when processing a file
+    read = getattr(fp, 'read1', fp.read)
+    partial = b''
+    while True:
+        data = read(READ_SIZE)
+        if not data:
+            break
+        data = partial + data
+        last = data.rfind(b'\n') + 1
+        if last == 0 and len(data) < READ_SIZE:
+            partial = data
+            continue
+        if last == 0:
+            last = len(data)
+        partial = data[last:]
+        out.write(annotator.annotate(data[:last]))
+        out.flush()
+    if partial:
+        out.write(annotator.annotate(partial))
+    out.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description='Replace atom_value integers in logs with atom names.')
+    parser.add_argument('--atoms', help='only replace the atoms listed in this file (one name per line)')
+    parser.add_argument('--min-length', type=int, default=3, help='minimum number of characters of replaced atoms (default: %(default)s)')
+    parser.add_argument('--cache-size', type=int, default=65536, help='maximum number of decoded values to remember (default: %(default)s)')
+    parser.add_argument('log', nargs='?', default='-', help='path to the log file or "-" for reading from STDIN (default)')
+    args = parser.parse_args()
+    if not 1 <= args.min_length <= MAX_LENGTH:
+        sys.exit('--min-length must be between 1 and {0}'.format(MAX_LENGTH))
+    atoms = None
+    if args.atoms:
+        atoms = read_atoms(args.atoms)
+        if atoms:
+            args.min_length = min(args.min_length,
+                                  min(atom_length(x) for x in atoms))
+    annotator = Annotator(args.min_length, atoms, args.cache_size)
+    try:
+        if args.log == '-':
+            run(sys.stdin.buffer, sys.stdout.buffer, annotator)
+        else:
+            if not os.path.isfile(args.log):
+                sys.exit('no such file: ' + args.log)
+            with open(args.log, 'rb') as fp:
+                run(fp, sys.stdout.buffer, annotator)
+    except BrokenPipeError:
+        # the reader went away, e.g., `| head`
+        sys.stderr.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,475 @@
+#!/usr/bin/env python
+
+# Converts CAF logs into a compact columnar archive and prints the lines that
+# match a query. The archive stores each field of the file format in its own
+# column: categories such as `%c %C %M %F %t` as codes into a dictionary,
+# levels as CAF_LOG_LEVEL_* values, `%r` as deltas and `%a` and `%L` as
+# integers. Each block of up to --block-size lines compresses each column
+# separately with zlib and records min/max values per column, which allows
+# queries to skip blocks and to decompress only the columns they need.
+#
+# Queries print the original lines, i.e., their output works as input for
+# the other scripts, e.g., `indent_trace_log.py -t -`. Lines that do not match
+# the file format continue the message of the previous line.
+
+# usage:   (convert): archive_trace_log.py pack -o caf.cafa FILENAME
+#            (query): archive_trace_log.py query -a 42 --begin 1000 caf.cafa
+#  (query + indent): archive_trace_log.py query -t 1234 caf.cafa \
+#                      | indent_trace_log.py -t -
+#        (overview): archive_trace_log.py info caf.cafa
+
+# The archive consists of the compressed columns of all blocks followed by a
+# footer and a trailer:
+#
+#   footer:  zlib-compressed JSON with the file format, the dictionaries,
+#            whether the log ends with a newline and per block the number of
+#            lines, min/max values and the offset and size of each column
+#   trailer: uint64 offset of the footer, MAGIC
+#
+# Integer columns are little-endian int64 arrays, messages are UTF-8 strings
+# prefixed by their lengths (an int64 column of their own).
+
+import argparse, sys, os, json, zlib, struct, mmap, itertools
+from array import array
+
+from caf_log import (DEFAULT_FORMAT, LEVELS, LEVEL_NAMES, INT_FIELDS,
+                     CATEGORICAL_FIELDS, LineParser, Interner, parse_format)
+
+MAGIC = b'CAFARC1\n'
+
+VERSION = 1
+
+TRAILER = struct.Struct('<Q8s')
+
+# default number of lines per block
+BLOCK_SIZE = 65536
+
+# restores the original bytes of logs that are not valid UTF-8
+ENCODING_ERRORS = 'surrogateescape'
+
+def column_kind(name):
+    if name == 'runtime':
+        return 'delta'
+    if name == 'level':
+        return 'level'
+    if name in INT_FIELDS:
+        return 'int'
+    if name in CATEGORICAL_FIELDS:
+        return 'category'
+    return 'text'
+
+# -- column encoding ----------------------------------------------------------
+
+def encode_ints(values, delta=False):
+    xs = array('q', values)
+    if delta and xs:
+        xs = array('q', [xs[0]] + [b - a for a, b in zip(xs, xs[1:])])
+    if sys.byteorder == 'big':
+        xs.byteswap()
+    return xs.tobytes()
+
+def decode_ints(buf, delta=False):
+    xs = array('q')
+    xs.frombytes(buf)
+    if sys.byteorder == 'big':
+        xs.byteswap()
+    return list(itertools.accumulate(xs)) if delta else xs.tolist()
+
+def encode_texts(values):
+    raw = [x.encode('utf-8', ENCODING_ERRORS) for x in values]
+    return encode_ints([len(x) for x in raw]), b''.join(raw)
+
+def decode_texts(lengths, blob):
+    text = blob.decode('utf-8', ENCODING_ERRORS)
+    if len(text) == len(blob):
+        # pure ASCII, i.e., byte offsets are character offsets
+        result = []
+        pos = 0
+        for n in lengths:
+            result.append(text[pos:pos + n])
+            pos += n
+        return result
+    result = []
+    pos = 0
+    for n in lengths:
+        result.append(blob[pos:pos + n].decode('utf-8', ENCODING_ERRORS))
+        pos += n
+    return result
+
+# -- writing archives ---------------------------------------------------------
+
+class ArchiveWriter(object):
+    def __init__(self, fp, parser, block_size=BLOCK_SIZE, level=6):
+        self.fp = fp
+        self.parser = parser
+        self.block_size = block_size
+        self.level = level
+        self.fields = parser.fields
+        self.kinds = [column_kind(x) for x in self.fields]
+        self.interners = dict((x, Interner()) for x in self.fields
+                              if column_kind(x) == 'category')
+        self.codes = [self.interners[x].code if x in self.interners else None
+                      for x in self.fields]
+        self.level_index = parser.column('level')
+        self.columns = [[] for _ in self.fields]
+        self.blocks = []
+        # lines before the first line that matches the format
+        self.preamble = []
+        self.lines = 0
+        # whether the last line ends with a newline, i.e., the log was not cut
+        # off in the middle of a line
+        self.newline_at_end = True
+        fp.write(MAGIC)
+        self.offset = len(MAGIC)
+
+    def add(self, line):
+        self.newline_at_end = line.endswith('\n')
+        xs = self.parser.parse(line)
+        if xs is not None and self.level_index is not None \
+           and xs[self.level_index] not in LEVELS:
+            xs = None
+        if xs is None:
+            # continues the message of the previous line
+            line = line.rstrip('\n')
+            messages = self.columns[self.parser.column('message')] \
+                       if 'message' in self.fields else None
+            if messages:
+                messages[-1] += '\n' + line
+            else:
+                self.preamble.append(line)
+            return
+        if len(self.columns[0]) == self.block_size:
+            self.flush_block()
+        self.lines += 1
+        for x, kind, code, column in zip(xs, self.kinds, self.codes,
+                                         self.columns):
+            if kind == 'text':
+                column.append(x)
+            elif code is not None:
+                column.append(code(x))
+            elif kind == 'level':
+                column.append(LEVELS[x])
+            else:
+                column.append(int(x))
+
+    def write_column(self, buf):
+        data = zlib.compress(buf, self.level)
+        self.fp.write(data)
+        result = [self.offset, len(data)]
+        self.offset += len(data)
+        return result
+
+    def flush_block(self):
+        if not self.columns or not self.columns[0]:
+            return
+        block = {'lines': len(self.columns[0]), 'stats': {}, 'columns': {}}
+        for name, kind, values in zip(self.fields, self.kinds, self.columns):
+            if kind == 'text':
+                lengths, blob = encode_texts(values)
+                block['columns'][name] = self.write_column(lengths)
+                block['columns'][name + '.data'] = self.write_column(blob)
+                continue
+            block['stats'][name] = [min(values), max(values)]
+            block['columns'][name] = \
+                self.write_column(encode_ints(values, kind == 'delta'))
+        self.blocks.append(block)
+        self.columns = [[] for _ in self.fields]
+
+    def close(self):
+        self.flush_block()
+        footer = {
+            'version': VERSION,
+            'format': self.parser.format,
+            'fields': self.fields,
+            'dictionaries': dict((k, v.values)
+                                 for k, v in self.interners.items()),
+            'preamble': self.preamble,
+            'newline_at_end': self.newline_at_end,
+            'blocks': self.blocks,
+        }
+        raw = zlib.compress(json.dumps(footer).encode('utf-8'), self.level)
+        self.fp.write(raw)
+        self.fp.write(TRAILER.pack(self.offset, MAGIC))
+        self.offset += len(raw) + TRAILER.size
+
+# -- reading archives ---------------------------------------------------------
+
+class Archive(object):
+    def __init__(self, path):
+        self.fp = open(path, 'rb')
+        self.mm = None
+        try:
+            footer = self.read_footer(path)
+        except ValueError:
+            self.close()
+            raise
+        self.format = footer['format']
+        self.fields = footer['fields']
+        self.dictionaries = footer['dictionaries']
+        self.preamble = footer['preamble']
+        self.newline_at_end = footer.get('newline_at_end', True)
+        self.blocks = footer['blocks']
+        self.size = len(self.mm)
+
+    def read_footer(self, path):
+        try:
+            self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError('not a CAF log archive: ' + path)
+        if len(self.mm) < len(MAGIC) + TRAILER.size \
+           or self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError('not a CAF log archive: ' + path)
+        offset, magic = TRAILER.unpack_from(self.mm,
+                                            len(self.mm) - TRAILER.size)
+        if magic != MAGIC:
+            raise ValueError('incomplete CAF log archive: ' + path)
+        raw = zlib.decompress(self.mm[offset:len(self.mm) - TRAILER.size])
+        footer = json.loads(raw.decode('utf-8'))
+        if footer.get('version') != VERSION:
+            raise ValueError('unsupported archive version: ' + path)
+        return footer
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.fp.close()
+
+    def raw_column(self, block, name):
+        offset, size = block['columns'][name]
+        return zlib.decompress(self.mm[offset:offset + size])
+
+    def column(self, block, name):
+        # returns the decoded values of a column in a block
+        kind = column_kind(name)
+        if kind == 'text':
+            return decode_texts(decode_ints(self.raw_column(block, name)),
+                                self.raw_column(block, name + '.data'))
+        values = decode_ints(self.raw_column(block, name), kind == 'delta')
+        if kind == 'category':
+            strings = self.dictionaries[name]
+            return [strings[x] for x in values]
+        if kind == 'level':
+            return [LEVEL_NAMES.get(x, '') for x in values]
+        return [str(x) for x in values]
+
+    def template(self):
+        # returns a str.format template that renders a line from the values
+        # of all fields in the order of `self.fields`
+        result = ''
+        for name, text in parse_format(self.format):
+            if name == 'text':
+                result += text.replace('{', '{{').replace('}', '}}')
+            elif name == 'newline':
+                pass
+            else:
+                if name == 'actor':
+                    result += 'actor'
+                result += '{' + str(self.fields.index(name)) + '}'
+        return result + '\n'
+
+# -- queries ------------------------------------------------------------------
+
+class Query(object):
+    # Selects lines by ranges or sets of column values. Each condition maps a
+    # column to a (min, max, values) tuple, where values is a set of allowed
+    # (encoded) values or None.
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.conditions = {}
+        # set if a condition can never match, e.g., for an unknown thread
+        self.empty = False
+
+    def add_range(self, name, first=None, last=None):
+        self.require(name)
+        self.conditions[name] = (float('-inf') if first is None else first,
+                                 float('inf') if last is None else last,
+                                 None)
+
+    def add_values(self, name, values):
+        self.require(name)
+        if name in self.archive.dictionaries:
+            strings = self.archive.dictionaries[name]
+            codes = set(i for i, x in enumerate(strings) if x in values)
+        else:
+            codes = set(int(x) for x in values)
+        if not codes:
+            self.empty = True
+            return
+        self.conditions[name] = (min(codes), max(codes), codes)
+
+    def require(self, name):
+        if name not in self.archive.fields:
+            raise ValueError('archived file format has no {0} field: {1}'
+                             .format(name, self.archive.format))
+
+    def skip(self, block):
+        # checks the min/max statistics of a block
+        for name, (first, last, codes) in self.conditions.items():
+            low, high = block['stats'][name]
+            if high < first or low > last:
+                return True
+        return False
+
+    def select(self, block):
+        # returns the positions of matching lines in a block, decompressing
+        # only the columns with conditions
+        rows = range(block['lines'])
+        for name, (first, last, codes) in self.conditions.items():
+            values = decode_ints(self.archive.raw_column(block, name),
+                                 column_kind(name) == 'delta')
+            if codes is not None:
+                rows = [i for i in rows if values[i] in codes]
+            else:
+                rows = [i for i in rows if first <= values[i] <= last]
+            if not rows:
+                break
+        return rows
+
+    def lines(self):
+        # yields matching lines in their original order, without a newline at
+        # the end of the last line if the log had none
+        lines = self.matching_lines()
+        if self.archive.newline_at_end:
+            for line in lines:
+                yield line
+            return
+        prev = None
+        for line in lines:
+            if prev is not None:
+                yield prev
+            prev = line
+        if prev is not None:
+            yield prev[:-1] if self.includes_last else prev
+
+    def matching_lines(self):
+        # yields matching lines in their original order and sets
+        # `includes_last` if the last line of the log is among them
+        archive = self.archive
+        template = archive.template()
+        self.includes_last = False
+        if self.empty:
+            return
+        if not self.conditions:
+            self.includes_last = not archive.blocks and bool(archive.preamble)
+            for line in archive.preamble:
+                yield line + '\n'
+        for block in archive.blocks:
+            if self.skip(block):
+                continue
+            rows = self.select(block) if self.conditions \
+                   else range(block['lines'])
+            if not rows:
+                continue
+            self.includes_last = block is archive.blocks[-1] \
+                                 and rows[-1] == block['lines'] - 1
+            columns = [archive.column(block, x) for x in archive.fields]
+            if len(rows) == block['lines']:
+                for xs in zip(*columns):
+                    yield template.format(*xs)
+            else:
+                for i in rows:
+                    yield template.format(*[x[i] for x in columns])
+
+# -- command line interface ---------------------------------------------------
+
+def pack(args):
+    if not os.path.isfile(args.log):
+        sys.exit('no such file: ' + args.log)
+    output = args.output or os.path.splitext(args.log)[0] + '.cafa'
+    # readers detect incomplete archives by the missing trailer
+    # splits only at '\n' and keeps line endings such as '\r\n' as they are
+    with open(args.log, errors=ENCODING_ERRORS, newline='\n') as fp, \
+         open(output, 'wb') as out:
+        writer = ArchiveWriter(out, LineParser(args.format), args.block_size,
+                               args.level)
+        for line in fp:
+            writer.add(line)
+        writer.close()
+    size = os.path.getsize(args.log)
+    packed = writer.offset
+    print('{0} lines in {1} blocks: {2} -> {3} bytes ({4:.1f}%)'
+          .format(writer.lines, len(writer.blocks), size, packed,
+                  100.0 * packed / size if size else 0))
+
+def query(args):
+    if not os.path.isfile(args.archive):
+        sys.exit('no such file: ' + args.archive)
+    try:
+        archive = Archive(args.archive)
+        q = Query(archive)
+        if args.begin is not None or args.end is not None:
+            q.add_range('runtime', args.begin, args.end)
+        if args.level:
+            q.add_range('level', last=LEVELS[args.level])
+        for name, values in (('actor', args.actors),
+                             ('thread', args.threads),
+                             ('component', args.components)):
+            if values:
+                q.add_values(name, values)
+    except ValueError as err:
+        sys.exit(str(err))
+    out = sys.stdout.buffer
+    try:
+        for line in q.lines():
+            out.write(line.encode('utf-8', ENCODING_ERRORS))
+        out.flush()
+    except BrokenPipeError:
+        # the reader went away, e.g., `| head`
+        sys.stderr.close()
+    archive.close()
+
+def info(args):
+    if not os.path.isfile(args.archive):
+        sys.exit('no such file: ' + args.archive)
+    try:
+        archive = Archive(args.archive)
+    except ValueError as err:
+        sys.exit(str(err))
+    sizes = {}
+    for block in archive.blocks:
+        for name, (offset, size) in block['columns'].items():
+            sizes[name.split('.')[0]] = sizes.get(name.split('.')[0], 0) + size
+    print('format: ' + archive.format)
+    print('lines: {0}, blocks: {1}, bytes: {2}'
+          .format(sum(x['lines'] for x in archive.blocks),
+                  len(archive.blocks), archive.size))
+    for name in archive.fields:
+        entries = len(archive.dictionaries.get(name, []))
+        print('{0:>12} {1:>12} bytes{2}'
+              .format(name, sizes.get(name, 0),
+                      ', {0} distinct values'.format(entries)
+                      if name in archive.dictionaries else ''))
+    archive.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Store CAF logs in a compact columnar archive and query it.')
+    commands = parser.add_subparsers(dest='command')
+    cmd = commands.add_parser('pack', help='convert a log file to an archive')
+    cmd.add_argument('-f', '--format', default=DEFAULT_FORMAT, help='value of logger.file-format (default: "%(default)s")')
+    cmd.add_argument('-o', '--output', help='path to the archive (default: FILENAME with the extension .cafa)')
+    cmd.add_argument('--block-size', type=int, default=BLOCK_SIZE, help='number of lines per block (default: %(default)s)')
+    cmd.add_argument('--level', type=int, default=6, choices=range(1, 10), help='zlib compression level (default: %(default)s)')
+    cmd.add_argument('log', help='path to the log file')
+    cmd = commands.add_parser('query', help='print matching lines of an archive')
+    cmd.add_argument('--begin', type=int, help='only include lines with %%r >= BEGIN')
+    cmd.add_argument('--end', type=int, help='only include lines with %%r <= END')
+    cmd.add_argument('-a', '--actor', dest='actors', action='append', help='only include lines of actors with given ID(s)')
+    cmd.add_argument('-t', '--thread', dest='threads', action='append', help='only include lines of given thread(s)')
+    cmd.add_argument('-c', '--component', dest='components', action='append', help='only include lines of given component(s)')
+    cmd.add_argument('-l', '--level', choices=['ERROR', 'WARN', 'INFO', 'DEBUG', 'TRACE'], help='only include lines with at least this severity')
+    cmd.add_argument('archive', help='path to the archive')
+    cmd = commands.add_parser('info', help='print statistics of an archive')
+    cmd.add_argument('archive', help='path to the archive')
+    args = parser.parse_args()
+    if args.command == 'pack':
+        pack(args)
+    elif args.command == 'query':
+        query(args)
+    elif args.command == 'info':
+        info(args)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
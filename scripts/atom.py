@@ -1,39 +1,106 @@
 #!/usr/bin/env python
 
+# Decodes atom_value integers to atom names or encodes names with --encode.
+
+# usage           (single): atom.py 0xf...
+#          (stream of text): atom.py < values.txt
+#        (stream of uint64): atom.py --binary -r values.bin
+#                 (encoding): atom.py --encode < names.txt
+
 from __future__ import print_function
-import sys
+import argparse, sys, itertools
 
-# decodes 6bit characters to ASCII
-DECODING_TABLE = ' 0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+from atom_codec import np, atom_read, atom_encode, decode_many, encode_many
 
-def atom_read(x):
-    result = ''
-    read_chars = ((x & 0xF000000000000000) >> 60) == 0xF
-    mask = 0x0FC0000000000000
-    bitshift = 54
-    while bitshift >= 0:
+# number of values we convert at once
+BATCH_SIZE = 65536
 
-        if read_chars:
-            result += DECODING_TABLE[(x & mask) >> bitshift]
-        elif ((x & mask) >> bitshift) == 0xF:
-            read_chars = True
+def parse_value(s):
+    s = s.strip()
+    return int(s, 16) if s.startswith('0x') else int(s)
 
-        bitshift -= 6
-        mask = mask >> 6
-    return result
+def decode_lines(lines, out):
+    while True:
+        batch = list(itertools.islice(lines, BATCH_SIZE))
+        if not batch:
+            return
+        try:
+            values = [parse_value(x) for x in batch]
+        except ValueError:
+            # slow path: echo lines that are not numbers
+            values = []
+            for x in batch:
+                try:
+                    values.append(parse_value(x))
+                except ValueError:
+                    values.append(x.rstrip('\n'))
+            out.write(''.join((x if isinstance(x, str) else atom_read(x))
+                              + '\n' for x in values))
+            continue
+        out.write(''.join(x + '\n' for x in decode_many(values)))
 
-if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print('*** Usage: atom.py <atom_val>')
-        sys.exit(-1)
-    try:
-        s = sys.argv[1]
-        if s.startswith('0x'):
-            val = int(s, 16)
+def encode_lines(lines, out, binary):
+    while True:
+        batch = [x.rstrip('\n') for x in itertools.islice(lines, BATCH_SIZE)]
+        if not batch:
+            return
+        if binary:
+            out.buffer.write(b''.join(x.to_bytes(8, 'little')
+                                      for x in encode_many(batch)))
+        else:
+            out.write(''.join('0x{0:x}\n'.format(x)
+                              for x in encode_many(batch)))
+
+def decode_binary(fp, out):
+    # reads little-endian uint64 values
+    while True:
+        buf = fp.read(8 * BATCH_SIZE)
+        if len(buf) % 8 != 0:
+            buf += fp.read(8 - len(buf) % 8)
+        if not buf:
+            return
+        if np is not None:
+            values = np.frombuffer(buf, dtype='<u8', count=len(buf) // 8)
         else:
-            val = int(s)
-        print(atom_read(val))
-    except ValueError:
-        print('Not a number:', sys.argv[1])
-        print('*** Usage: atom.py <atom_val>')
-        sys.exit(-2)
+            values = [int.from_bytes(buf[i:i + 8], 'little')
+                      for i in range(0, len(buf) - 7, 8)]
+        out.write(''.join(x + '\n' for x in decode_many(values)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode or encode atom values.')
+    parser.add_argument('-r', '--read', action='append', help='read values (or names with --encode) from this file, "-" for STDIN (default: STDIN)')
+    parser.add_argument('--binary', action='store_true', help='values are little-endian uint64 instead of text lines')
+    parser.add_argument('--encode', action='store_true', help='encode atom names to values')
+    parser.add_argument('values', nargs='*', help='values (or names with --encode) to convert instead of reading files')
+    args = parser.parse_args()
+    if args.values:
+        for x in args.values:
+            if args.encode:
+                print('0x{0:x}'.format(atom_encode(x)))
+                continue
+            try:
+                print(atom_read(parse_value(x)))
+            except ValueError:
+                print('Not a number:', x)
+                parser.print_usage()
+                sys.exit(-2)
+        return
+    for path in args.read or ['-']:
+        mode = 'rb' if args.binary and not args.encode else 'r'
+        if path == '-':
+            fp = sys.stdin.buffer if mode == 'rb' else sys.stdin
+        else:
+            fp = open(path, mode)
+        try:
+            if args.encode:
+                encode_lines(iter(fp), sys.stdout, args.binary)
+            elif args.binary:
+                decode_binary(fp, sys.stdout)
+            else:
+                decode_lines(iter(fp), sys.stdout)
+        finally:
+            if fp not in (sys.stdin, sys.stdin.buffer):
+                fp.close()
+
+if __name__ == '__main__':
+    main()
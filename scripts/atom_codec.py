@@ -0,0 +1,140 @@
+# Encoding and decoding of `atom_value` integers, i.e., the 64-bit encoding
+# behind `atom()` in CAF versions before 0.18. An atom stores up to 10
+# characters with 6 bits each, prefixed by the marker 0xF. Characters outside
+# of DECODING_TABLE encode to 0, i.e., decode as a whitespace.
+#
+# The functions `decode_many` and `encode_many` process many values at once
+# with NumPy if available and fall back to the scalar functions otherwise.
+#
+# Usage from other scripts:
+#
+#   from atom_codec import atom_read, atom_encode, decode_many
+#   atom_read(0x...)           # -> 'name'
+#   decode_many(np_array)      # -> NumPy array of strings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# decodes 6bit characters to ASCII
+DECODING_TABLE = ' 0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+# encodes ASCII to 6bit characters
+ENCODING_TABLE = [0] * 128
+for code, ch in enumerate(DECODING_TABLE):
+    ENCODING_TABLE[ord(ch)] = code
+
+# maximum number of characters in an atom
+MAX_LENGTH = 10
+
+# marks the beginning of the characters
+MARKER = 0xF
+
+def atom_read(x):
+    result = ''
+    read_chars = ((x & 0xF000000000000000) >> 60) == 0xF
+    mask = 0x0FC0000000000000
+    bitshift = 54
+    while bitshift >= 0:
+        if read_chars:
+            result += DECODING_TABLE[(x & mask) >> bitshift]
+        elif ((x & mask) >> bitshift) == 0xF:
+            read_chars = True
+        bitshift -= 6
+        mask = mask >> 6
+    return result
+
+def atom_length(x):
+    # returns the number of characters if `x` is a valid atom_value with the
+    # marker right before the characters and -1 otherwise
+    n = x.bit_length() - 4
+    if n < 0 or n % 6 != 0 or n > 6 * MAX_LENGTH or x >> n != MARKER:
+        return -1
+    return n // 6
+
+def atom_encode(name):
+    if len(name) > MAX_LENGTH:
+        raise ValueError('atom names have at most {0} characters: {1}'
+                         .format(MAX_LENGTH, name))
+    result = MARKER
+    for ch in name:
+        code = ord(ch)
+        result = (result << 6) | (ENCODING_TABLE[code] if code < 128 else 0)
+    return result
+
+# -- vectorized versions ------------------------------------------------------
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('vectorized atom encoding requires NumPy')
+
+if np is not None:
+    _DECODING_CHARS = np.array(list(DECODING_TABLE) + [''], dtype='U1')
+    _ENCODING_CODES = np.array(ENCODING_TABLE, dtype=np.uint64)
+    # bit offset of each 6-bit group, most significant group first
+    _SHIFTS = np.arange(6 * (MAX_LENGTH - 1), -1, -6, dtype=np.uint64)
+
+def decode_array(values):
+    # decodes an array of uint64 values into an array of strings ('U10')
+    _require_numpy()
+    values = np.asarray(values, dtype=np.uint64).ravel()
+    n = len(values)
+    groups = ((values[:, None] >> _SHIFTS) & np.uint64(0x3F)).astype(np.intp)
+    # the characters start after the first group with the marker or at the
+    # first group if the upper 4 bits hold the marker
+    is_marker = groups == MARKER
+    first_marker = np.where(is_marker.any(axis=1), is_marker.argmax(axis=1),
+                            MAX_LENGTH)
+    full = (values >> np.uint64(60)) == np.uint64(MARKER)
+    start = np.where(full, 0, first_marker + 1)
+    # move all characters to the front, padding with the empty string
+    index = start[:, None] + np.arange(MAX_LENGTH)
+    valid = index < MAX_LENGTH
+    codes = np.take_along_axis(groups, np.minimum(index, MAX_LENGTH - 1),
+                               axis=1)
+    codes[~valid] = len(DECODING_TABLE)
+    chars = np.ascontiguousarray(_DECODING_CHARS[codes])
+    # NumPy strips trailing NUL characters from strings
+    return chars.view('U{0}'.format(MAX_LENGTH)).reshape(n)
+
+def encode_array(names):
+    # encodes an array of strings with at most 10 characters into uint64
+    _require_numpy()
+    names = np.asarray(names, dtype='U')
+    if names.dtype.itemsize // 4 > MAX_LENGTH:
+        raise ValueError('atom names have at most {0} characters'
+                         .format(MAX_LENGTH))
+    names = names.astype('U{0}'.format(MAX_LENGTH)).ravel()
+    codepoints = names.view(np.uint32).reshape(len(names), MAX_LENGTH)
+    lengths = np.char.str_len(names)
+    codes = _ENCODING_CODES[np.where(codepoints < 128, codepoints, 0)]
+    result = np.full(len(names), MARKER, dtype=np.uint64)
+    for i in range(MAX_LENGTH):
+        active = lengths > i
+        result[active] = (result[active] << np.uint64(6)) | codes[active, i]
+    return result
+
+def decode_many(values):
+    # returns a list of strings for an iterable of integers
+    if np is None:
+        return [atom_read(x) for x in values]
+    values = list(values)
+    try:
+        xs = np.array(values, dtype=np.uint64)
+    except OverflowError:
+        # negative numbers or values beyond 64 bits, decode them just like
+        # atom_read does for single values
+        return [atom_read(x) for x in values]
+    return decode_array(xs).tolist()
+
+def encode_many(names):
+    # returns a list of integers for an iterable of strings
+    if np is None:
+        return [atom_encode(x) for x in names]
+    names = list(names)
+    if any(x.endswith('\x00') for x in names):
+        # NumPy strips trailing NUL characters, which encode to 0 just like
+        # any other character outside of DECODING_TABLE
+        return [atom_encode(x) for x in names]
+    return encode_array(names).tolist()
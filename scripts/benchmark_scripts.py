@@ -0,0 +1,491 @@
+#!/usr/bin/env python
+
+# Benchmarks the scripts in this directory on synthetic inputs. Generators are
+# deterministic for a given seed and size, i.e., all runs with the same
+# arguments process the same bytes. Generated inputs stay in the work
+# directory and get reused by later runs.
+#
+# For each benchmark, the harness reports throughput (MB/s and lines/s of
+# input) and the peak RSS of the script. Results can be stored as a baseline
+# and later runs then print the relative change to the baseline.
+#
+# Measuring the peak RSS of each run requires `os.wait4`, i.e., the harness
+# runs on Unix platforms only.
+
+# usage    (run all): benchmark_scripts.py
+#      (some, large): benchmark_scripts.py --size 2048 -b indent -b demystify
+#   (store baseline): benchmark_scripts.py --save baseline.json
+#         (compare): benchmark_scripts.py --baseline baseline.json
+
+import argparse, sys, os, json, random, subprocess, time, importlib.util
+from collections import deque
+
+from atom_codec import atom_encode
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ROOT_DIR = os.path.dirname(SCRIPTS_DIR)
+
+# pandoc-filter.py resolves examples relative to the working directory
+# (`../../examples/`), i.e., we run it two levels below the root
+PANDOC_FILTER_DIR = os.path.join(ROOT_DIR, 'libcaf_core', 'caf')
+
+MB = 1024 * 1024
+
+# -- generators ---------------------------------------------------------------
+
+# (class, method, file) for generated trace lines
+FUNCTIONS = [
+    ('caf.scheduled_actor', 'resume', 'scheduled_actor.cpp'),
+    ('caf.scheduled_actor', 'consume', 'scheduled_actor.cpp'),
+    ('caf.scheduled_actor', 'activate', 'scheduled_actor.cpp'),
+    ('caf.local_actor', 'request_response_timeout', 'local_actor.cpp'),
+    ('caf.abstract_actor', 'enqueue', 'abstract_actor.cpp'),
+    ('caf.io.basp.instance', 'handle', 'instance.cpp'),
+    ('caf.io.network.default_multiplexer', 'handle', 'default_multiplexer.cpp'),
+    ('caf.stream_manager', 'handle', 'stream_manager.cpp'),
+]
+
+ATOM_NAMES = ['add', 'sub', 'get', 'put', 'ok', 'tick', 'update', 'publish',
+              'subscribe', 'get_state', 'sys_atom', 'join_atom', 'flush']
+
+NODE = '7C5E3BEB1DE2B7D4B2C9C6D2F1A00C0B1F2D9A7E#4242'
+
+class Output(object):
+    # counts bytes and lines while writing in large blocks
+    def __init__(self, path, size):
+        self.fp = open(path, 'w')
+        self.size = size
+        self.written = 0
+        self.lines = 0
+        self.buf = []
+        self.buf_size = 0
+
+    def done(self):
+        return self.written + self.buf_size >= self.size
+
+    def add(self, line):
+        self.buf.append(line)
+        self.buf_size += len(line)
+        self.lines += 1
+        if self.buf_size >= MB:
+            self.flush()
+
+    def flush(self):
+        self.fp.write(''.join(self.buf))
+        self.written += self.buf_size
+        self.buf = []
+        self.buf_size = 0
+
+    def close(self):
+        self.flush()
+        self.fp.close()
+        return {'bytes': self.written, 'lines': self.lines}
+
+def gen_trace_log(path, size, seed, num_threads=16, num_actors=2000):
+    # writes a multi-threaded trace log in the default file format with nested
+    # ENTRY/EXIT pairs, debug output and SPAWN/SEND/RECEIVE/TERMINATE events
+    rng = random.Random(seed)
+    out = Output(path, size)
+    threads = [str(139900000000000 + 4096 * i) for i in range(num_threads)]
+    stacks = dict((t, []) for t in threads)
+    actors = list(range(1, num_actors + 1))
+    # messages in mailboxes, we receive them in FIFO order
+    in_flight = deque()
+    runtime = 0
+    fmt = '{0} {1} {2} actor{3} {4} {5} {6} {7}:{8} {9}\n'
+    for x in actors[:num_threads * 4]:
+        out.add(fmt.format(runtime, 'caf_flow', 'DEBUG', 0, threads[0],
+                           'caf.actor_system', 'spawn', 'actor_system.cpp',
+                           204, 'SPAWN ; ID = {0} ; NAME = worker ; TYPE = '
+                           'caf::detail::stateful_actor ; ARGS = () ; NODE = '
+                           '{1} ; GROUPS = []'.format(x, NODE)))
+    while not out.done():
+        runtime += rng.randint(0, 2)
+        thread = rng.choice(threads)
+        stack = stacks[thread]
+        actor = stack[0][0] if stack else rng.choice(actors)
+        roll = rng.random()
+        if stack and (roll < 0.35 or len(stack) > 12):
+            _, (cls, method, fname) = stack.pop()
+            out.add(fmt.format(runtime, 'caf', 'TRACE', actor, thread, cls,
+                               'operator()', fname, 40, 'EXIT'))
+        elif roll < 0.75:
+            func = rng.choice(FUNCTIONS)
+            stack.append((actor, func))
+            out.add(fmt.format(runtime, 'caf', 'TRACE', actor, thread,
+                               func[0], func[1], func[2], 40,
+                               'ENTRY x = {0}'.format(rng.randint(0, 99))))
+        elif roll < 0.83:
+            # SEND shows up in the context of the sender
+            receiver = rng.choice(actors)
+            content = '({0}, {1})'.format(
+                "'" + rng.choice(ATOM_NAMES) + "'", rng.randint(0, 9999))
+            in_flight.append((receiver, actor, content))
+            out.add(fmt.format(runtime, 'caf_flow', 'DEBUG', actor, thread,
+                               'caf.scheduled_actor', 'enqueue',
+                               'scheduled_actor.cpp', 159,
+                               'SEND ; TO = {0}@{1} ; FROM = {2}@{1} ; '
+                               'STAGES = [] ; CONTENT = {3}'
+                               .format(receiver, NODE, actor, content)))
+        elif roll < 0.9:
+            if not in_flight:
+                continue
+            receiver, sender, content = in_flight.popleft()
+            out.add(fmt.format(runtime, 'caf_flow', 'DEBUG', receiver, thread,
+                               'caf.scheduled_actor', 'consume',
+                               'scheduled_actor.cpp', 641,
+                               'RECEIVE ; FROM = {0}@{1} ; STAGES = [] ; '
+                               'CONTENT = {2}'.format(sender, NODE, content)))
+        elif roll < 0.995:
+            out.add(fmt.format(runtime, 'caf', 'DEBUG', actor, thread,
+                               'caf.local_actor', 'on_exit', 'local_actor.cpp',
+                               88, 'state = {0}, pending = {1}'
+                               .format(rng.randint(0, 9), rng.randint(0, 99))))
+        else:
+            out.add(fmt.format(runtime, 'caf_flow', 'DEBUG', actor, thread,
+                               'caf.local_actor', 'cleanup', 'local_actor.cpp',
+                               113, 'TERMINATE ; ID = {0} ; REASON = '
+                               'none ; NODE = {1}'.format(actor, NODE)))
+    return out.close()
+
+def typed_mpi(rng, depth):
+    def arg():
+        if depth > 0 and rng.random() < 0.3:
+            return typed_mpi(rng, depth - 1)
+        roll = rng.random()
+        if roll < 0.4:
+            return 'caf::atom_constant<{0}>'.format(
+                atom_encode(rng.choice(ATOM_NAMES)))
+        if roll < 0.7:
+            return 'std::__1::vector<int, std::__1::allocator<int> >'
+        return rng.choice(['int', 'double', 'caf::actor', 'std::__1::string'])
+    def type_list(n):
+        return 'caf::detail::type_list<{0}>'.format(
+            ', '.join(arg() for _ in range(n)))
+    return 'caf::typed_mpi<{0}, {1}>'.format(type_list(rng.randint(1, 4)),
+                                             type_list(rng.randint(0, 2)))
+
+def gen_compiler_errors(path, size, seed):
+    # writes compiler diagnostics for large typed actor interfaces, each
+    # interface repeats across a backtrace of notes
+    rng = random.Random(seed)
+    out = Output(path, size)
+    interfaces = []
+    for _ in range(32):
+        handlers = [typed_mpi(rng, 2) for _ in range(rng.randint(5, 60))]
+        interfaces.append('caf::typed_actor<{0}>'.format(', '.join(handlers)))
+    while not out.done():
+        iface = rng.choice(interfaces)
+        out.add('/src/app/main.cpp:{0}:{1}: error: no matching function for '
+                'call to \'spawn\' with {2}\n'.format(rng.randint(1, 999),
+                                                     rng.randint(1, 80),
+                                                     iface))
+        for _ in range(rng.randint(1, 6)):
+            out.add('/usr/include/caf/actor_system.hpp:{0}:3: note: in '
+                    'instantiation of {1} requested here\n'
+                    .format(rng.randint(1, 999), iface))
+        out.add('1 error generated.\n')
+    return out.close()
+
+def gen_profile(path, size, seed, num_workers=16, num_actors=5000):
+    # writes records in the layout of profiled_coordinator
+    rng = random.Random(seed)
+    out = Output(path, size)
+    out.add('{0:<20} {1:<10} {2:<10} {3:<14} {4:<14} {5:<14} {6}\n'.format(
+        'clock', 'type', 'id', 'time', 'usr', 'sys', 'mem'))
+    clock = 1600000000000000
+    while not out.done():
+        clock += rng.randint(1, 2000)
+        if rng.random() < 0.1:
+            kind, ident = 'worker', rng.randrange(num_workers)
+            elapsed = rng.randint(100000, 1000000)
+        else:
+            # a few hot actors dominate
+            kind = 'actor'
+            ident = int(rng.paretovariate(1.2)) % num_actors
+            elapsed = rng.randint(1, 20000)
+        usr = rng.randint(0, elapsed)
+        sys_time = rng.randint(0, elapsed - usr)
+        out.add('{0:<20} {1:<10} {2:<10} {3:<14} {4:<14} {5:<14} {6}\n'.format(
+            clock, kind, ident, elapsed, usr, sys_time,
+            rng.randint(1000, 90000)))
+    return out.close()
+
+def gen_atoms(path, size, seed):
+    # writes atom values, one per line, mostly known atoms mixed with noise
+    rng = random.Random(seed)
+    out = Output(path, size)
+    values = [atom_encode(x) for x in ATOM_NAMES]
+    while not out.done():
+        if rng.random() < 0.9:
+            out.add('{0}\n'.format(rng.choice(values)))
+        else:
+            out.add('0x{0:x}\n'.format(rng.getrandbits(64)))
+    return out.close()
+
+def gen_atoms_binary(path, size, seed):
+    rng = random.Random(seed)
+    values = [atom_encode(x) for x in ATOM_NAMES]
+    n = size // 8
+    with open(path, 'wb') as fp:
+        for first in range(0, n, 65536):
+            fp.write(b''.join(rng.choice(values).to_bytes(8, 'little')
+                              for _ in range(min(65536, n - first))))
+    return {'bytes': n * 8, 'lines': n}
+
+def gen_annotated_log(path, size, seed):
+    # writes log lines with raw atom values in their messages
+    rng = random.Random(seed)
+    out = Output(path, size)
+    values = [atom_encode(x) for x in ATOM_NAMES]
+    runtime = 0
+    while not out.done():
+        runtime += rng.randint(0, 3)
+        out.add('{0} caf DEBUG actor{1} 139900000000000 caf.local_actor '
+                'handle local_actor.cpp:42 got ({2}, {3}, 0x{4:x})\n'.format(
+                    runtime, rng.randint(1, 999), rng.choice(values),
+                    rng.randint(0, 99999), rng.choice(values)))
+    return out.close()
+
+def gen_pandoc_ast(path, size, seed):
+    # writes a pandoc JSON document with raw LaTeX code listings for examples
+    # of this repository, many of them repeating the same file
+    rng = random.Random(seed)
+    examples_dir = os.path.join(ROOT_DIR, 'examples')
+    examples = []
+    for root, dirs, files in os.walk(examples_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.cpp'):
+                rel = os.path.relpath(os.path.join(root, name), examples_dir)
+                with open(os.path.join(root, name)) as fp:
+                    examples.append((rel[:-4], sum(1 for _ in fp)))
+    blocks = []
+    written = 0
+    while written < size:
+        name, num_lines = rng.choice(examples)
+        if rng.random() < 0.5:
+            first = rng.randint(1, num_lines)
+            last = rng.randint(first, num_lines)
+            tex = '\\cppexample[{0}-{1}]{{{2}}}'.format(first, last, name)
+        else:
+            tex = '\\cppexample{{{0}}}'.format(name)
+        blocks.append({'t': 'RawBlock', 'c': ['latex', tex]})
+        blocks.append({'t': 'Para', 'c': [{'t': 'Str', 'c': 'text'}]})
+        written += len(tex) + 80
+    doc = {'pandoc-api-version': [1, 20], 'meta': {}, 'blocks': blocks}
+    with open(path, 'w') as fp:
+        json.dump(doc, fp)
+    return {'bytes': os.path.getsize(path), 'lines': len(blocks) // 2}
+
+# name -> generator
+INPUTS = {
+    'trace': gen_trace_log,
+    'errors': gen_compiler_errors,
+    'profile': gen_profile,
+    'atoms': gen_atoms,
+    'atoms-bin': gen_atoms_binary,
+    'atom-log': gen_annotated_log,
+    'listings': gen_pandoc_ast,
+}
+
+INPUT_SUFFIXES = {
+    'atoms-bin': '.bin',
+    'listings': '.json',
+}
+
+def ensure_input(work_dir, name, size, seed):
+    # returns the path and the meta data (bytes, lines) of a generated input,
+    # reusing previous results for the same parameters
+    base = os.path.join(work_dir, '{0}-{1}mb-{2}'.format(name, size // MB,
+                                                          seed))
+    path = base + INPUT_SUFFIXES.get(name, '.log')
+    meta_path = base + '.meta.json'
+    if os.path.isfile(path) and os.path.isfile(meta_path):
+        with open(meta_path) as fp:
+            meta = json.load(fp)
+        if meta.get('bytes') == os.path.getsize(path):
+            return path, meta
+    sys.stderr.write('-- generating {0} ({1} MB)\n'.format(name, size // MB))
+    meta = INPUTS[name](path, size, seed)
+    with open(meta_path, 'w') as fp:
+        json.dump(meta, fp)
+    return path, meta
+
+# -- benchmarks ---------------------------------------------------------------
+
+def script(name):
+    return os.path.join(SCRIPTS_DIR, name)
+
+# name -> (input, function returning (arguments, use input as STDIN)), each
+# script writes its regular output to /dev/null
+BENCHMARKS = [
+    ('pandoc-filter', 'listings',
+     lambda x: ([script('pandoc-filter.py'), 'rst'], True)),
+    ('indent_trace_log', 'trace',
+     lambda x: ([script('indent_trace_log.py'), x], False)),
+    ('indent_trace_log-threads', 'trace',
+     lambda x: ([script('indent_trace_log.py'), '-t', x], False)),
+    ('indent_trace_log-jobs', 'trace',
+     lambda x: ([script('indent_trace_log.py'), '-t', '-j', '0', x], False)),
+    ('index_trace_log', 'trace',
+     lambda x: ([script('index_trace_log.py'), x], False)),
+    ('profile_trace_log', 'trace',
+     lambda x: ([script('profile_trace_log.py'), x], False)),
+    ('export_trace_log', 'trace',
+     lambda x: ([script('export_trace_log.py'), '-o', os.devnull, x],
+                False)),
+    ('archive_trace_log-pack', 'trace',
+     lambda x: ([script('archive_trace_log.py'), 'pack', '-o', x + '.cafa',
+                 x], False)),
+    ('graph_trace_log', 'trace',
+     lambda x: ([script('graph_trace_log.py'), '-o', x + '.dot', x],
+                False)),
+    ('mailbox_trace_log', 'trace',
+     lambda x: ([script('mailbox_trace_log.py'), x], False)),
+    ('demystify', 'errors',
+     lambda x: ([script('demystify.py')], True)),
+    ('demystify-nocache', 'errors',
+     lambda x: ([script('demystify.py'), '--cache-size', '0'], True)),
+    ('atom', 'atoms',
+     lambda x: ([script('atom.py')], True)),
+    ('atom-binary', 'atoms-bin',
+     lambda x: ([script('atom.py'), '--binary'], True)),
+    ('annotate_atoms', 'atom-log',
+     lambda x: ([script('annotate_atoms.py')], True)),
+    ('caf_prof-stream', 'profile',
+     lambda x: ([script('caf_prof.py'), '-r', x, '--stream', '--summary',
+                 '--no-plots'], False)),
+    ('caf_prof-rollup', 'profile',
+     lambda x: ([script('caf_prof.py'), '-r', x, '--rollup', os.devnull,
+                 '--no-plots'], False)),
+]
+
+# benchmarks that need a module that may be missing, name -> module
+REQUIREMENTS = {
+    'pandoc-filter': 'pandocfilters',
+    'caf_prof-stream': 'numpy',
+    'caf_prof-rollup': 'numpy',
+}
+
+# benchmarks that run in another directory than SCRIPTS_DIR, name -> path
+WORKING_DIRS = {
+    'pandoc-filter': PANDOC_FILTER_DIR,
+}
+
+def run_once(args, input_path, use_stdin, cwd):
+    # returns wall-clock seconds and peak RSS in KiB, or None on errors
+    stdin = open(input_path, 'rb') if use_stdin else subprocess.DEVNULL
+    try:
+        start = time.time()
+        proc = subprocess.Popen([sys.executable] + args, stdin=stdin,
+                                stdout=subprocess.DEVNULL, cwd=cwd)
+        # wait4 gives us the resource usage of this very child
+        _, status, usage = os.wait4(proc.pid, 0)
+        elapsed = time.time() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    finally:
+        if use_stdin:
+            stdin.close()
+    if proc.returncode != 0:
+        return None
+    # ru_maxrss is in KiB on Linux but in bytes on macOS
+    rss = usage.ru_maxrss // 1024 if sys.platform == 'darwin' \
+          else usage.ru_maxrss
+    return elapsed, rss
+
+def run_benchmark(name, input_path, meta, make_args, repeat):
+    args, use_stdin = make_args(input_path)
+    cwd = WORKING_DIRS.get(name, SCRIPTS_DIR)
+    # the listing cache of pandoc-filter.py would turn later runs into cache
+    # lookups
+    os.environ['CAF_LISTING_CACHE'] = ''
+    best = None
+    for _ in range(repeat):
+        res = run_once(args, input_path, use_stdin, cwd)
+        if res is None:
+            return None
+        if best is None or res[0] < best[0]:
+            best = res
+    elapsed, rss = best
+    return {
+        'seconds': round(elapsed, 3),
+        'mb_per_s': round(meta['bytes'] / MB / elapsed, 2),
+        'lines_per_s': round(meta['lines'] / elapsed),
+        'peak_rss_mb': round(rss / 1024.0, 1),
+    }
+
+def change(new, old):
+    if not old:
+        return ''
+    return '{0:+.1f}%'.format(100.0 * (new - old) / old)
+
+def print_result(name, res, base, out):
+    if res is None:
+        out.write('{0:<26} FAILED\n'.format(name))
+        return
+    base = base or {}
+    out.write('{0:<26} {1:>9.2f} {2:>8} {3:>12} {4:>8} {5:>10.1f} {6:>8}\n'
+              .format(name, res['mb_per_s'],
+                      change(res['mb_per_s'], base.get('mb_per_s')),
+                      res['lines_per_s'],
+                      change(res['lines_per_s'], base.get('lines_per_s')),
+                      res['peak_rss_mb'],
+                      change(res['peak_rss_mb'], base.get('peak_rss_mb'))))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the CAF scripts on synthetic inputs.')
+    parser.add_argument('-b', '--bench', action='append', help='only run benchmarks whose name starts with this prefix (repeatable)')
+    parser.add_argument('-d', '--work-dir', default=os.path.join(os.environ.get('TMPDIR', '/tmp'), 'caf-script-bench'), help='directory for generated inputs (default: %(default)s)')
+    parser.add_argument('--size', type=int, default=64, help='size of each generated input in MB (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=42, help='seed for the generators (default: %(default)s)')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='run each benchmark N times and report the fastest run (default: %(default)s)')
+    parser.add_argument('--baseline', help='compare against results in this JSON file')
+    parser.add_argument('--save', help='store results as JSON baseline in this file')
+    parser.add_argument('-l', '--list', action='store_true', help='list all benchmarks and exit')
+    args = parser.parse_args()
+    if args.list:
+        for name, input_name, _ in BENCHMARKS:
+            print('{0:<26} {1}'.format(name, input_name))
+        return
+    if not hasattr(os, 'wait4'):
+        sys.exit('benchmark_scripts.py requires os.wait4, i.e., a Unix platform')
+    benchmarks = [x for x in BENCHMARKS
+                  if not args.bench
+                  or any(x[0].startswith(y) for y in args.bench)]
+    if not benchmarks:
+        sys.exit('no benchmark matches ' + ', '.join(args.bench))
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        if baseline.get('size') != args.size:
+            sys.stderr.write('** baseline uses inputs of {0} MB\n'
+                             .format(baseline.get('size')))
+        baseline = baseline.get('results', {})
+    if not os.path.isdir(args.work_dir):
+        os.makedirs(args.work_dir)
+    size = args.size * MB
+    print('{0:<26} {1:>9} {2:>8} {3:>12} {4:>8} {5:>10} {6:>8}'.format(
+        'benchmark', 'MB/s', '', 'lines/s', '', 'RSS (MB)', ''))
+    results = {}
+    for name, input_name, make_args in benchmarks:
+        module = REQUIREMENTS.get(name)
+        if module and importlib.util.find_spec(module) is None:
+            print('{0:<26} SKIPPED (needs {1})'.format(name, module))
+            continue
+        path, meta = ensure_input(args.work_dir, input_name, size, args.seed)
+        res = run_benchmark(name, path, meta, make_args, args.repeat)
+        print_result(name, res, baseline.get(name), sys.stdout)
+        sys.stdout.flush()
+        if res is not None:
+            results[name] = res
+    if args.save:
+        with open(args.save, 'w') as fp:
+            json.dump({'size': args.size, 'seed': args.seed,
+                       'python': sys.version.split()[0], 'results': results},
+                      fp, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+# Converts the LaTeX manual to reStructuredText for Sphinx. Generates
+# index.rst via make_index_rst.py and runs pandoc with pandoc-filter.py for
+# each chapter in parallel. A manifest with content hashes of each chapter and
+# the examples it includes allows the script to skip unchanged chapters.
+#
+# Pandoc runs in the directory of each chapter, i.e., `tex/`, because
+# pandoc-filter.py resolves examples relative to it (`../../examples/`).
+
+# usage: build_manual.py -o OUTPUT_DIR path/to/manual.tex
+#        build_manual.py -j 8 --force -o OUTPUT_DIR path/to/manual.tex
+
+import argparse, sys, os, re, json, hashlib, subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from make_index_rst import parse_manual, chapters, render_index
+
+# same regex as in pandoc-filter.py
+listing_rx = re.compile(r"\\(cppexample|iniexample|sourcefile)(?:\[(.+)\])?{(.+)}")
+
+# maps listing commands to paths relative to the chapter, see pandoc-filter.py
+LISTING_PATHS = {
+    'cppexample': '../../examples/{0}.cpp',
+    'iniexample': '../../examples/{0}.ini',
+    'sourcefile': '../../{0}',
+}
+
+MANIFEST_VERSION = 1
+
+def file_hash(path):
+    h = hashlib.sha1()
+    try:
+        with open(path, 'rb') as fp:
+            for block in iter(lambda: fp.read(1024 * 1024), b''):
+                h.update(block)
+    except (IOError, OSError):
+        return None
+    return h.hexdigest()
+
+def chapter_inputs(tex_path):
+    # returns the chapter itself and all examples it includes
+    result = [tex_path]
+    chapter_dir = os.path.dirname(tex_path)
+    with open(tex_path) as fp:
+        for m in listing_rx.finditer(fp.read()):
+            path = LISTING_PATHS[m.group(1)].format(m.group(3))
+            result.append(os.path.normpath(os.path.join(chapter_dir, path)))
+    return result
+
+def input_hashes(tex_path, filter_path):
+    # changes to the filter affect every chapter
+    return dict((path, file_hash(path))
+                for path in chapter_inputs(tex_path) + [filter_path])
+
+def load_manifest(path):
+    try:
+        with open(path) as fp:
+            result = json.load(fp)
+    except (IOError, OSError, ValueError):
+        return {}
+    return result if result.get('version') == MANIFEST_VERSION else {}
+
+def write_atomically(path, content):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fp:
+        fp.write(content)
+    os.replace(tmp, path)
+
+def convert_chapter(pandoc, filter_path, tex_path, out_path, cache_path):
+    # runs pandoc for one chapter, returns None on success or an error message
+    env = dict(os.environ)
+    env['CAF_LISTING_CACHE'] = cache_path
+    cmd = [pandoc, '--filter', filter_path, '--wrap=none', '--from=latex',
+           '--to=rst', os.path.basename(tex_path)]
+    try:
+        res = subprocess.run(cmd, cwd=os.path.dirname(tex_path), env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as err:
+        return str(err)
+    sys.stderr.write(res.stderr.decode('utf-8', 'replace'))
+    if res.returncode != 0:
+        return 'pandoc exited with code {0}'.format(res.returncode)
+    tmp = out_path + '.tmp'
+    with open(tmp, 'wb') as fp:
+        fp.write(res.stdout)
+    os.replace(tmp, out_path)
+    return None
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Convert the LaTeX manual to reStructuredText.')
+    parser.add_argument('-o', '--output-dir', required=True, help='directory for index.rst and the chapters')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='number of parallel pandoc runs, 0 for one per CPU (default: %(default)s)')
+    parser.add_argument('--pandoc', default='pandoc', help='pandoc executable (default: %(default)s)')
+    parser.add_argument('--filter', default=os.path.join(script_dir, 'pandoc-filter.py'), help='pandoc filter (default: %(default)s)')
+    parser.add_argument('--force', action='store_true', help='convert all chapters regardless of the manifest')
+    parser.add_argument('manual', help='path to manual.tex')
+    args = parser.parse_args()
+    if not os.path.isfile(args.manual):
+        sys.exit('no such file: ' + args.manual)
+    filter_path = os.path.abspath(args.filter)
+    # pandoc runs in another directory
+    pandoc = os.path.abspath(args.pandoc) if os.sep in args.pandoc \
+             else args.pandoc
+    out_dir = os.path.abspath(args.output_dir)
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    manifest_path = os.path.join(out_dir, '.manual-manifest.json')
+    cache_path = os.path.join(out_dir, '.pandoc-listing-cache.json')
+    manifest = {} if args.force else load_manifest(manifest_path)
+    old_chapters = manifest.get('chapters', {})
+    new_manifest = {'version': MANIFEST_VERSION, 'chapters': {}}
+    # index.rst only changes with the structure of the manual
+    with open(args.manual) as fp:
+        # use lists for comparing with the JSON manifest
+        structure = [list(x) for x in parse_manual(fp)]
+    new_manifest['structure'] = structure
+    index_path = os.path.join(out_dir, 'index.rst')
+    if structure != manifest.get('structure') \
+       or not os.path.isfile(index_path):
+        print('-- generating index.rst')
+        write_atomically(index_path, render_index(structure))
+    # convert all chapters with changed inputs
+    tex_dir = os.path.join(os.path.dirname(os.path.abspath(args.manual)),
+                           'tex')
+    todo = []
+    for name in chapters(structure):
+        tex_path = os.path.join(tex_dir, name + '.tex')
+        out_path = os.path.join(out_dir, name + '.rst')
+        if not os.path.isfile(tex_path):
+            sys.exit('no such file: ' + tex_path)
+        hashes = input_hashes(tex_path, filter_path)
+        entry = {'inputs': hashes}
+        if old_chapters.get(name) == entry and os.path.isfile(out_path):
+            new_manifest['chapters'][name] = entry
+            continue
+        todo.append((name, tex_path, out_path, entry))
+    errors = 0
+    if todo:
+        jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+        with ProcessPoolExecutor(min(jobs, len(todo))) as executor:
+            futures = [(name, entry,
+                        executor.submit(convert_chapter, pandoc,
+                                        filter_path, tex_path, out_path,
+                                        cache_path))
+                       for name, tex_path, out_path, entry in todo]
+            for name, entry, future in futures:
+                err = future.result()
+                if err is None:
+                    print('-- converted ' + name)
+                    new_manifest['chapters'][name] = entry
+                else:
+                    sys.stderr.write('*** failed to convert {0}: {1}\n'
+                                     .format(name, err))
+                    errors += 1
+    print('-- {0} of {1} chapters up to date'
+          .format(len(chapters(structure)) - len(todo),
+                  len(chapters(structure))))
+    write_atomically(manifest_path, json.dumps(new_manifest, indent=2))
+    if errors:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
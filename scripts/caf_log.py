@@ -0,0 +1,427 @@
+# Shared ingestion for CAF log files. The parser understands the same format
+# strings as `logger::parse_format` (see libcaf_core/src/logger.cpp) and turns
+# log lines into records or into columnar batches backed by NumPy arrays.
+#
+# Usage from other scripts:
+#
+#   import caf_log
+#   parser = caf_log.LineParser(caf_log.DEFAULT_FORMAT)
+#   for batch in caf_log.read_batches(open(path), parser):
+#       ... batch.actor, batch.level, batch.strings('component') ...
+#   event = caf_log.parse_flow_event(record['message'])
+
+import asyncio, os, re
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the default value for `logger.file-format`
+DEFAULT_FORMAT = '%r %c %p %a %t %C %M %F:%L %m%n'
+
+# maps field specifiers to field names
+FIELDS = {
+    'c': 'component',
+    'C': 'class',
+    'd': 'date',
+    'F': 'file',
+    'L': 'line',
+    'm': 'message',
+    'M': 'method',
+    'n': 'newline',
+    'p': 'level',
+    'r': 'runtime',
+    't': 'thread',
+    'a': 'actor',
+}
+
+# maps the names rendered by the logger to CAF_LOG_LEVEL_* values
+LEVELS = {
+    'QUIET': 0,
+    'ERROR': 3,
+    'WARN': 6,
+    'INFO': 9,
+    'DEBUG': 12,
+    'TRACE': 15,
+}
+
+LEVEL_NAMES = dict((v, k) for k, v in LEVELS.items())
+
+# fields that the columnar representation stores as integers
+INT_FIELDS = ['runtime', 'level', 'actor', 'line']
+
+# fields that the columnar representation stores as interned categories
+CATEGORICAL_FIELDS = ['component', 'class', 'method', 'file', 'thread', 'date']
+
+# regex for each field, must not contain capture groups
+FIELD_PATTERNS = {
+    'component': r'\S*',
+    'class': r'\S*',
+    'date': r'\S+',
+    'file': r'\S*?',
+    'line': r'\d+',
+    'message': r'.*?',
+    'method': r'\S*',
+    'level': r'[A-Z]*',
+    'runtime': r'-?\d+',
+    'thread': r'\S+',
+    'actor': r'\d+',
+}
+
+def parse_format(format_str):
+    # Splits a format string into a list of (field name, plain text) pairs.
+    # Plain text segments use the field name 'text', just like
+    # `logger::parse_format` silently drops invalid field specifiers.
+    result = []
+    plain_text = ''
+    read_percent_sign = False
+    for ch in format_str:
+        if read_percent_sign:
+            read_percent_sign = False
+            if ch == '%':
+                plain_text += '%'
+            elif ch in FIELDS:
+                if plain_text:
+                    result.append(('text', plain_text))
+                    plain_text = ''
+                result.append((FIELDS[ch], ''))
+        elif ch == '%':
+            read_percent_sign = True
+        else:
+            plain_text += ch
+    if plain_text:
+        result.append(('text', plain_text))
+    return result
+
+def field_column(format_str, field):
+    # returns the position of `field` (e.g. '%t') after splitting a log line at
+    # whitespaces or None if the format does not contain the field
+    for index, column in enumerate(format_str.split()):
+        if field in column:
+            return index
+    return None
+
+class LineParser(object):
+    # Parses lines of a log written with a given format string by matching
+    # a regex that we generate once from the format.
+
+    def __init__(self, format_str=DEFAULT_FORMAT):
+        self.format = format_str
+        self.fields = []
+        pattern = ''
+        for name, text in parse_format(format_str):
+            if name == 'text':
+                pattern += re.escape(text)
+            elif name == 'newline':
+                pass
+            elif name in self.fields:
+                # only capture the first occurrence of a field
+                pattern += '(?:' + FIELD_PATTERNS[name] + ')'
+            else:
+                if name == 'actor':
+                    pattern += 'actor'
+                self.fields.append(name)
+                pattern += '(' + FIELD_PATTERNS[name] + ')'
+        self.rx = re.compile(pattern + r'\n?\Z', re.DOTALL)
+
+    def parse(self, line):
+        # returns a tuple with one string per element in `self.fields` or None
+        # if the line does not match the format
+        m = self.rx.match(line)
+        return m.groups() if m is not None else None
+
+    def parse_dict(self, line):
+        xs = self.parse(line)
+        return dict(zip(self.fields, xs)) if xs is not None else None
+
+    def column(self, name):
+        # returns the position of a field in the tuples returned by `parse`
+        return self.fields.index(name) if name in self.fields else None
+
+# -- flow events (see CAF_LOG_SPAWN_EVENT etc. in libcaf_core/caf/logger.hpp) --
+
+# the component of log lines with flow events
+FLOW_COMPONENT = 'caf_flow'
+
+# maps flow events to the keys in the order the logger writes them
+FLOW_EVENTS = {
+    'SPAWN': ['ID', 'NAME', 'TYPE', 'ARGS', 'NODE', 'GROUPS'],
+    'SEND': ['TO', 'FROM', 'STAGES', 'CONTENT'],
+    'RECEIVE': ['FROM', 'STAGES', 'CONTENT'],
+    'REJECT': [],
+    'ACCEPT': ['UNBLOCKED'],
+    'DROP': [],
+    'SKIP': [],
+    'FINALIZE': [],
+    'TERMINATE': ['ID', 'REASON', 'NODE'],
+}
+
+# matches `42@<node>` as well as `<uri>/id/42`
+_actor_id_rx = re.compile(r'(?:^(\d+)@|/id/(\d+)$)')
+
+def parse_flow_event(message):
+    # Returns a (name, fields) pair for the message of a flow event or None.
+    # Values may contain ' ; ' themselves (e.g. CONTENT), so we look for the
+    # keys in the order of FLOW_EVENTS instead of splitting the message.
+    name, sep, rest = message.partition(' ;')
+    keys = FLOW_EVENTS.get(name.strip())
+    if keys is None:
+        return None
+    fields = {}
+    pos = 0
+    rest = ' ;' + rest if sep else ''
+    for i, key in enumerate(keys):
+        marker = ' ; ' + key + ' ='
+        first = rest.find(marker, pos)
+        if first < 0:
+            break
+        first += len(marker)
+        if i + 1 < len(keys):
+            last = rest.find(' ; ' + keys[i + 1] + ' =', first)
+        else:
+            last = -1
+        if last < 0:
+            last = len(rest)
+        fields[key] = rest[first:last].strip()
+        pos = last
+    return name.strip(), fields
+
+def actor_id(x):
+    # returns the actor ID for the rendering of an actor handle or None, e.g.,
+    # for `null:pointer`
+    m = _actor_id_rx.search(x.strip())
+    if m is None:
+        return None
+    return int(m.group(1) or m.group(2))
+
+class InFlight(object):
+    # Pairs SEND events with the RECEIVE events of the same messages. The log
+    # has no message IDs, so we identify messages by (receiver, sender,
+    # content) and match messages with equal keys in FIFO order. Keeps at
+    # most `max_size` messages and evicts the oldest message first.
+
+    def __init__(self, max_size=100000):
+        if max_size < 1:
+            raise ValueError('InFlight needs room for at least one message')
+        self.max_size = max_size
+        # maps keys to deques of (sequence number, value) pairs
+        self.messages = {}
+        # (sequence number, key) pairs in send order, including messages that
+        # we have received since, which we skip or drop lazily
+        self.order = deque()
+        self.next_seq = 0
+        self.size = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return self.size
+
+    def is_pending(self, seq, key):
+        # the deques only lose elements at the front, i.e., a message is still
+        # pending if its key has a message that is at least as old
+        values = self.messages.get(key)
+        return values is not None and values[0][0] <= seq
+
+    def send(self, key, value):
+        # stores `value` for `key` and returns a list of (key, value) pairs
+        # for all evicted messages
+        seq = self.next_seq
+        self.next_seq += 1
+        values = self.messages.get(key)
+        if values is None:
+            values = self.messages[key] = deque()
+        values.append((seq, value))
+        self.order.append((seq, key))
+        self.size += 1
+        result = []
+        while self.size > self.max_size:
+            old_seq, old_key = self.order.popleft()
+            values = self.messages.get(old_key)
+            if values is None or values[0][0] != old_seq:
+                # received in the meantime
+                continue
+            _, old_value = values.popleft()
+            if not values:
+                del self.messages[old_key]
+            self.size -= 1
+            self.evicted += 1
+            result.append((old_key, old_value))
+        return result
+
+    def receive(self, key):
+        # returns the value of the oldest message for `key` or None
+        values = self.messages.get(key)
+        if not values:
+            return None
+        _, result = values.popleft()
+        if not values:
+            del self.messages[key]
+        self.size -= 1
+        # bound the number of received messages in `order`
+        if len(self.order) > 2 * self.max_size:
+            self.order = deque(x for x in self.order
+                               if self.is_pending(x[0], x[1]))
+        return result
+
+    def items(self):
+        # returns all (key, value) pairs of the remaining messages
+        return [(k, x) for k, values in self.messages.items()
+                for _, x in values]
+
+class Interner(object):
+    # Maps strings to dense integer codes.
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, x):
+        res = self.codes.get(x)
+        if res is None:
+            res = len(self.values)
+            self.codes[x] = res
+            self.values.append(x)
+        return res
+
+    def value(self, code):
+        return self.values[code]
+
+class LogBatch(object):
+    # A batch of log records in columnar layout. Integer fields are int64
+    # arrays, categorical fields are int32 arrays with codes into the shared
+    # interners and messages remain a list of strings. Absent fields are None.
+
+    def __init__(self, columns, messages, interners):
+        self.columns = columns
+        self.messages = messages
+        self.interners = interners
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def strings(self, name):
+        # returns the decoded values of a categorical column
+        values = self.interners[name].values
+        return [values[x] for x in self.columns[name]]
+
+    def level_names(self):
+        return [LEVEL_NAMES.get(x, '') for x in self.columns['level']]
+
+def read_batches(lines, parser=None, batch_size=65536, interners=None):
+    # Yields LogBatch objects for an iterable of lines. Lines that do not match
+    # the format continue the message of the previous record. Passing the same
+    # `interners` to multiple calls keeps category codes stable.
+    if np is None:
+        raise RuntimeError('reading columnar batches requires NumPy')
+    if parser is None:
+        parser = LineParser()
+    if interners is None:
+        interners = {}
+    fields = parser.fields
+    for name in CATEGORICAL_FIELDS:
+        if name in fields and name not in interners:
+            interners[name] = Interner()
+    int_columns = [(i, name) for i, name in enumerate(fields)
+                   if name in INT_FIELDS and name != 'level']
+    cat_columns = [(i, name) for i, name in enumerate(fields)
+                   if name in CATEGORICAL_FIELDS]
+    level_index = parser.column('level')
+    message_index = parser.column('message')
+    def make_batch(rows, messages):
+        columns = dict.fromkeys(INT_FIELDS + CATEGORICAL_FIELDS)
+        values = list(zip(*rows))
+        for i, name in int_columns:
+            # let NumPy convert the strings in one go
+            columns[name] = np.array(values[i]).astype(np.int64)
+        for i, name in cat_columns:
+            code = interners[name].code
+            columns[name] = np.array([code(x) for x in values[i]],
+                                     dtype=np.int32)
+        if level_index is not None:
+            get_level = LEVELS.get
+            columns['level'] = np.array([get_level(x, 0)
+                                         for x in values[level_index]],
+                                        dtype=np.int64)
+        return LogBatch(columns, messages, interners)
+    rows = []
+    messages = []
+    match = parser.rx.match
+    for line in lines:
+        m = match(line)
+        if m is None:
+            if messages:
+                messages[-1] += '\n' + line.rstrip('\n')
+            continue
+        if len(rows) == batch_size:
+            yield make_batch(rows, messages)
+            rows = []
+            messages = []
+        xs = m.groups()
+        rows.append(xs)
+        messages.append(xs[message_index] if message_index is not None
+                        else '')
+    if rows:
+        yield make_batch(rows, messages)
+
+async def follow(path, from_start=False, poll_interval=0.1,
+                 read_size=1024 * 1024, max_line=1024 * 1024):
+    # Follows a growing log file like `tail -F` and yields lists of complete
+    # lines. Yields an empty list whenever no new data arrived within
+    # `poll_interval` seconds, which allows callers to flush their output.
+    # Reopens the file after rotation and starts over after truncation. Memory
+    # usage is bounded by `read_size` plus `max_line`, since we emit lines that
+    # exceed `max_line` bytes in pieces.
+    fp = None
+    partial = b''
+    while True:
+        if fp is None:
+            try:
+                fp = open(path, 'rb')
+            except (IOError, OSError):
+                await asyncio.sleep(poll_interval)
+                continue
+            if not from_start:
+                fp.seek(0, os.SEEK_END)
+            # any later incarnation of the file starts from the beginning
+            from_start = True
+            partial = b''
+        data = fp.read(read_size)
+        if data:
+            data = partial + data
+            last = data.rfind(b'\n') + 1
+            if last == 0 and len(data) > max_line:
+                last = len(data)
+            partial = data[last:]
+            if last > 0:
+                text = data[:last].decode('utf-8', 'replace')
+                yield text.splitlines(True)
+            continue
+        # reached the end of the file: check for truncation and rotation
+        try:
+            st = os.stat(path)
+        except (IOError, OSError):
+            st = None
+        fst = os.fstat(fp.fileno())
+        if fst.st_size < fp.tell():
+            fp.seek(0)
+            partial = b''
+            continue
+        if st is not None and (st.st_ino, st.st_dev) != (fst.st_ino,
+                                                         fst.st_dev):
+            # the old file has no more data to offer: switch to the new one
+            fp.close()
+            fp = None
+            continue
+        yield []
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,683 @@
+#!/usr/bin/env python
+
+# Generates plots and summaries from CAF profiler output, i.e., from the file
+# written by `profiled_coordinator` (scheduler.profiling-output-file). This is
+# a Python port of the R script `caf-prof` that only depends on NumPy and
+# optionally on matplotlib for generating plots.
+#
+# The profiler writes one record per line with the columns:
+#
+#   clock  type  id  time  usr  sys  mem
+#
+# where `clock` is a UNIX timestamp in microseconds, `type` is either "worker"
+# or "actor", `time`, `usr` and `sys` are microseconds spent during the
+# measurement window and `mem` is the memory usage in KB.
+
+# usage (plots): caf_prof.py -r profile.txt
+#    (summary): caf_prof.py -r profile.txt --summary --no-plots
+#     (rollup): caf_prof.py -r profile.txt --rollup util.csv --bucket 1000
+#  (streaming): caf_prof.py -r profile.txt --stream --summary --top 20
+
+import argparse, sys, io
+
+import numpy as np
+
+COLUMNS = ['clock', 'type', 'id', 'time', 'usr', 'sys', 'mem']
+
+WORKER = 0
+ACTOR = 1
+
+# bytes per block when reading profiler output
+BLOCK_SIZE = 64 * 1024 * 1024
+
+# -- reading profiler output --------------------------------------------------
+
+def parse_block(block):
+    # converts complete lines of profiler output to an (n, 7) int64 array,
+    # raising a ValueError for any row with a non-integer value or with the
+    # wrong number of columns
+    block = block.replace(b'worker', b'0').replace(b'actor', b'1')
+    if not block.strip():
+        return np.empty((0, len(COLUMNS)), dtype=np.int64)
+    try:
+        xs = np.loadtxt(io.BytesIO(block), dtype=np.int64, comments=None,
+                        ndmin=2)
+    except ValueError as err:
+        raise ValueError('malformed profiler output: {0}'.format(err))
+    if xs.shape[1] != len(COLUMNS):
+        raise ValueError('malformed profiler output: expected {0} columns, '
+                         'got {1}'.format(len(COLUMNS), xs.shape[1]))
+    return xs
+
+def read_blocks(fp, block_size=BLOCK_SIZE):
+    # yields (n, 7) int64 arrays for a binary file object, reading at most
+    # `block_size` bytes at once
+    partial = b''
+    first = True
+    while True:
+        data = fp.read(block_size)
+        if not data:
+            break
+        data = partial + data
+        last = data.rfind(b'\n') + 1
+        partial = data[last:]
+        data = data[:last]
+        if first and data:
+            first = False
+            if data.lstrip().startswith(b'clock'):
+                data = data[data.find(b'\n') + 1:]
+        if data:
+            yield parse_block(data)
+    if partial.strip():
+        yield parse_block(partial)
+
+def open_input(path):
+    if path in ('-', 'stdin'):
+        return sys.stdin.buffer
+    return open(path, 'rb')
+
+class Profile(object):
+    # profiler records of one type in columnar layout, with derived columns
+    # as in caf-prof: cpu = usr + sys, util = cpu / time and
+    # dom = (usr - sys) / cpu
+
+    def __init__(self, records):
+        records = records[records[:, 3] > 0]
+        self.clock = records[:, 0]
+        self.id = records[:, 2]
+        self.time = records[:, 3]
+        self.usr = records[:, 4]
+        self.sys = records[:, 5]
+        self.mem = records[:, 6]
+        self.cpu = self.usr + self.sys
+        self.util = self.cpu / self.time
+        self.dom = safe_div(self.usr - self.sys, self.cpu)
+        # labels default to IDs
+        self.label_names = None
+        self.label = self.id
+
+    def __len__(self):
+        return len(self.id)
+
+    def set_labels(self, mapping, other='OTHER'):
+        # assigns labels from a dictionary mapping IDs to label strings
+        names = sorted(set(mapping.values())) + [other]
+        codes = dict((x, i) for i, x in enumerate(names))
+        keys = np.array(sorted(mapping), dtype=np.int64)
+        values = np.array([codes[mapping[x]] for x in keys], dtype=np.int64)
+        pos = np.searchsorted(keys, self.id)
+        pos[pos == len(keys)] = 0
+        found = keys[pos] == self.id if len(keys) else \
+                np.zeros(len(self.id), dtype=bool)
+        self.label = np.where(found, values[pos] if len(keys) else 0,
+                              len(names) - 1)
+        self.label_names = names
+
+    def label_name(self, code):
+        return self.label_names[code] if self.label_names else str(code)
+
+def profile_by_id(prof):
+    # returns a Profile with one record per ID that sums all records of the
+    # ID, keeping the label of each ID
+    uniq, first, inv = np.unique(prof.id, return_index=True,
+                                 return_inverse=True)
+    records = np.zeros((len(uniq), len(COLUMNS)), dtype=np.int64)
+    records[:, 2] = uniq
+    for col, x in ((3, prof.time), (4, prof.usr), (5, prof.sys)):
+        records[:, col] = np.bincount(inv, weights=x, minlength=len(uniq))
+    result = Profile(records)
+    result.label = prof.label[first]
+    result.label_names = prof.label_names
+    return result
+
+def safe_div(x, y):
+    # returns x / y with 0 where y is 0
+    res = np.zeros(len(x), dtype=np.float64)
+    mask = y != 0
+    res[mask] = x[mask] / y[mask]
+    return res
+
+def load_profile(fp, types=(WORKER, ACTOR), block_size=BLOCK_SIZE):
+    # returns one Profile per requested type
+    parts = dict((t, []) for t in types)
+    for block in read_blocks(fp, block_size):
+        for t in types:
+            parts[t].append(block[block[:, 1] == t])
+    result = {}
+    for t in types:
+        xs = parts[t]
+        result[t] = Profile(np.concatenate(xs) if xs
+                            else np.zeros((0, len(COLUMNS)), dtype=np.int64))
+        parts[t] = None
+    return result
+
+def read_labels(path):
+    # reads a two-column file mapping IDs to labels
+    result = {}
+    with open(path) as fp:
+        for line in fp:
+            xs = line.split(None, 1)
+            if len(xs) == 2:
+                result[int(xs[0])] = xs[1].strip()
+    return result
+
+# -- vectorized aggregation ---------------------------------------------------
+
+class Summary(object):
+    # per-group sums of a profile, mirrors `summarize.prof` in caf-prof
+
+    def __init__(self, keys, usr, sys, time, names):
+        self.keys = keys
+        self.usr = usr
+        self.sys = sys
+        self.time = time
+        self.cpu = usr + sys
+        self.util = safe_div(self.cpu, time)
+        self.dom = safe_div(usr - sys, self.cpu)
+        self.names = names
+
+    def __len__(self):
+        return len(self.keys)
+
+def summarize(prof, by='id'):
+    keys = prof.id if by == 'id' else prof.label
+    uniq, inv = np.unique(keys, return_inverse=True)
+    sums = [np.bincount(inv, weights=x, minlength=len(uniq))
+            for x in (prof.usr, prof.sys, prof.time)]
+    if by == 'id':
+        names = [str(x) for x in uniq]
+    else:
+        names = [prof.label_name(x) for x in uniq]
+    return Summary(uniq, sums[0], sums[1], sums[2], names)
+
+def rollup(prof, bucket_usec):
+    # sums usr, sys and time per (time bucket, id) and returns the arrays
+    # (bucket start, id, usr, sys, time, util)
+    if len(prof) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty, empty, np.zeros(0)
+    start = prof.clock.min()
+    buckets = (prof.clock - start) // bucket_usec
+    uniq_ids, id_codes = np.unique(prof.id, return_inverse=True)
+    keys = buckets * len(uniq_ids) + id_codes
+    uniq, inv = np.unique(keys, return_inverse=True)
+    sums = [np.bincount(inv, weights=x, minlength=len(uniq)).astype(np.int64)
+            for x in (prof.usr, prof.sys, prof.time)]
+    bucket_start = start + (uniq // len(uniq_ids)) * bucket_usec
+    ids = uniq_ids[uniq % len(uniq_ids)]
+    return (bucket_start, ids, sums[0], sums[1], sums[2],
+            safe_div(sums[0] + sums[1], sums[2]))
+
+def write_summary(title, summary, out, limit=None):
+    order = np.argsort(-summary.cpu, kind='stable')
+    if limit:
+        order = order[:limit]
+    out.write('-- {0}\n'.format(title))
+    out.write('{0:>20}{1:>15}{2:>15}{3:>15}{4:>10}{5:>10}\n'
+              .format('id', 'usr', 'sys', 'time', 'util', 'dom'))
+    for i in order:
+        out.write('{0:>20}{1:>15}{2:>15}{3:>15}{4:>10.3f}{5:>10.3f}\n'
+                  .format(summary.names[i], int(summary.usr[i]),
+                          int(summary.sys[i]), int(summary.time[i]),
+                          summary.util[i], summary.dom[i]))
+    out.write('\n')
+
+def write_rollup(prof, kind, bucket_usec, out):
+    cols = rollup(prof, bucket_usec)
+    for row in zip(*cols):
+        out.write('{0},{1},{2},{3},{4},{5},{6:.4f}\n'
+                  .format(row[0], kind, *row[1:]))
+
+# -- streaming aggregation ----------------------------------------------------
+
+# indexes into the metrics dimension of SeriesAggregator.data
+USR, SYS, TIME, MEM, COUNT = range(5)
+
+class SeriesAggregator(object):
+    # Aggregates profiler records into fixed-size time buckets per ID (series)
+    # in constant memory. Once a record falls beyond the last bucket, we
+    # double the bucket width by merging adjacent buckets. With `max_series`,
+    # only the IDs with the highest CPU time get their own series and all
+    # other IDs share the series OTHER. An untracked ID replaces the tracked ID
+    # with the least CPU time if it used more CPU time than that ID within a
+    # single block of input, which keeps hot IDs while ignoring the long tail.
+
+    def __init__(self, bucket_usec, resolution, max_series=None):
+        self.width = bucket_usec
+        self.resolution = resolution
+        self.max_series = max_series
+        self.start = None
+        # dimensions: series, bucket, metric; the last series is OTHER
+        self.data = np.zeros((1, resolution, 5), dtype=np.int64)
+        self.ids = []
+        self.slots = {}
+        self.weights = {}
+
+    def rebucket(self, clock_max):
+        while (clock_max - self.start) // self.width >= self.resolution:
+            n = self.resolution
+            merged = self.data.reshape(len(self.data), n // 2, 2, 5)
+            data = merged.sum(axis=2)
+            data[:, :, MEM] = merged[:, :, :, MEM].max(axis=2)
+            self.data = np.zeros_like(self.data)
+            self.data[:, :n // 2] = data
+            self.width *= 2
+
+    def add_series(self, x):
+        # returns the slot for ID x or the slot of OTHER if x is not hot
+        # enough to replace a tracked ID
+        if self.max_series is None or len(self.ids) < self.max_series:
+            slot = len(self.ids)
+            self.ids.append(x)
+            self.data = np.insert(self.data, slot, 0, axis=0)
+        else:
+            victim = min(self.weights, key=self.weights.get)
+            slot = self.slots.pop(victim)
+            del self.weights[victim]
+            self.data[-1] += self.data[slot]
+            self.data[-1, :, MEM] = np.maximum(self.data[-1, :, MEM],
+                                               self.data[slot, :, MEM])
+            self.data[slot] = 0
+            self.ids[slot] = x
+        self.slots[x] = slot
+        self.weights[x] = 0
+        return slot
+
+    def add(self, block):
+        # adds all records of an (n, 7) array to the buckets
+        block = block[block[:, 3] > 0]
+        if len(block) == 0:
+            return
+        clock = block[:, 0]
+        if self.start is None:
+            self.start = clock.min()
+        self.rebucket(clock.max())
+        uniq, inv = np.unique(block[:, 2], return_inverse=True)
+        cpu = np.bincount(inv, weights=block[:, 4] + block[:, 5],
+                          minlength=len(uniq))
+        uniq_slots = np.empty(len(uniq), dtype=np.int64)
+        admit = True
+        for i in np.argsort(-cpu, kind='stable'):
+            x = int(uniq[i])
+            slot = self.slots.get(x)
+            if slot is None and admit:
+                full = self.max_series is not None \
+                       and len(self.ids) >= self.max_series
+                if full and cpu[i] <= min(self.weights.values()):
+                    # all remaining IDs are even colder
+                    admit = False
+                else:
+                    slot = self.add_series(x)
+            if slot is None:
+                uniq_slots[i] = -1
+            else:
+                uniq_slots[i] = slot
+                self.weights[x] += int(cpu[i])
+        # OTHER is the last series, so -1 is a valid index
+        rows = uniq_slots[inv]
+        buckets = np.clip((clock - self.start) // self.width, 0,
+                          self.resolution - 1)
+        for metric, col in ((USR, 4), (SYS, 5), (TIME, 3)):
+            np.add.at(self.data, (rows, buckets, metric), block[:, col])
+        np.add.at(self.data, (rows, buckets, COUNT), 1)
+        np.maximum.at(self.data, (rows, buckets, MEM), block[:, 6])
+
+    def series(self):
+        # returns (name, data) pairs with data being a (resolution, 5) array
+        result = [(str(x), self.data[i]) for i, x in enumerate(self.ids)]
+        if self.data[-1, :, COUNT].any():
+            result.append(('OTHER', self.data[-1]))
+        return result
+
+    def summary(self):
+        names = []
+        sums = []
+        for name, data in self.series():
+            names.append(name)
+            sums.append(data.sum(axis=0))
+        sums = np.array(sums, dtype=np.int64).reshape(-1, 5)
+        return Summary(np.arange(len(names)), sums[:, USR], sums[:, SYS],
+                       sums[:, TIME], names)
+
+    def write_rollup(self, kind, out):
+        for name, data in self.series():
+            for i in np.nonzero(data[:, TIME])[0]:
+                row = data[i]
+                out.write('{0},{1},{2},{3},{4},{5},{6:.4f},{7}\n'
+                          .format(self.start + i * self.width, kind, name,
+                                  row[USR], row[SYS], row[TIME],
+                                  (row[USR] + row[SYS]) / row[TIME],
+                                  row[MEM]))
+
+def stream_profile(fp, types, bucket_usec, resolution, top,
+                   block_size=BLOCK_SIZE):
+    # returns one SeriesAggregator per requested type
+    result = dict((t, SeriesAggregator(bucket_usec, resolution,
+                                       top if t == ACTOR else None))
+                  for t in types)
+    for block in read_blocks(fp, block_size):
+        for t in types:
+            result[t].add(block[block[:, 1] == t])
+    return result
+
+# -- plots --------------------------------------------------------------------
+
+def usec_label(us, pos=None):
+    # formats microsecond ticks like `make_usec_labels` in caf-prof
+    if us < 1e3:
+        return '{0:g}us'.format(round(us))
+    if us < 1e6:
+        return '{0:g}ms'.format(round(us / 1e3, 1))
+    if us < 60 * 1e6:
+        return '{0:g}s'.format(round(us / 1e6, 1))
+    if us < 60 * 60 * 1e6:
+        return '{0:g}m'.format(round(us / (60 * 1e6), 1))
+    return '{0:g}h'.format(round(us / (60 * 60 * 1e6), 1))
+
+class Plotter(object):
+    def __init__(self, fmt, font_size, squeeze, max_points):
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from matplotlib.ticker import FuncFormatter
+        self.plt = plt
+        self.time_formatter = FuncFormatter(usec_label)
+        self.fmt = fmt
+        self.squeeze = squeeze
+        self.max_points = max_points
+        plt.rcParams.update({'font.size': font_size})
+
+    def record(self, name, fun, *args):
+        filename = 'plot-{0}.{1}'.format(name, self.fmt)
+        sys.stderr.write('-- generating {0}\n'.format(filename))
+        fig = self.plt.figure(figsize=(10, 10))
+        fun(fig, *args)
+        if self.squeeze:
+            fig.tight_layout(pad=0)
+        fig.savefig(filename)
+        self.plt.close(fig)
+
+    def sample(self, n):
+        # returns the indexes of at most `max_points` points to plot
+        if n <= self.max_points:
+            return slice(None)
+        rng = np.random.RandomState(0)
+        return np.sort(rng.choice(n, self.max_points, replace=False))
+
+    def figure_labels(self, fig, xlabel, ylabel):
+        # labels all subplots at once; Figure.supxlabel requires matplotlib 3.4
+        if hasattr(fig, 'supxlabel'):
+            fig.supxlabel(xlabel)
+            fig.supylabel(ylabel)
+        else:
+            fig.text(0.5, 0.01, xlabel, ha='center')
+            fig.text(0.01, 0.5, ylabel, va='center', rotation='vertical')
+
+    def scale_time(self, ax, which, values):
+        # flips to a logarithmic scale if data is more than two orders of
+        # magnitude apart
+        values = values[values > 0]
+        if len(values) and np.log10(values.max() / values.min()) > 2:
+            getattr(ax, 'set_{0}scale'.format(which))('symlog')
+        getattr(ax, which + 'axis').set_major_formatter(self.time_formatter)
+
+    def scatter(self, fig, x, y, labels, names, size=None):
+        ax = fig.add_subplot(111)
+        idx = self.sample(len(x))
+        x, y, labels = x[idx], y[idx], labels[idx]
+        if size is not None:
+            size = size[idx]
+        uniq, counts = np.unique(labels, return_counts=True)
+        # draw big point clouds first to avoid hiding smaller groups
+        for label in uniq[np.argsort(-counts)]:
+            mask = labels == label
+            ax.scatter(x[mask], y[mask],
+                       s=None if size is None else size[mask],
+                       label=names(label), alpha=0.6)
+        if len(uniq) <= 25:
+            ax.legend(title='ID')
+        return ax
+
+    def utilization_time(self, fig, prof):
+        ids = np.unique(prof.id)
+        cols = 4
+        rows = (len(ids) + cols - 1) // cols
+        for i, x in enumerate(ids):
+            ax = fig.add_subplot(rows, cols, i + 1)
+            mask = prof.id == x
+            order = np.argsort(prof.clock[mask], kind='stable')
+            clock = prof.clock[mask][order]
+            ax.plot(clock, safe_div(prof.usr[mask][order],
+                                    prof.time[mask][order]), 'b-x')
+            ax.plot(clock, safe_div(prof.sys[mask][order],
+                                    prof.time[mask][order]), 'r-o',
+                    fillstyle='none')
+            ax.set_ylim(0, 1)
+            ax.set_title(str(x))
+            ax.set_xticks([])
+        self.figure_labels(fig, 'Time', 'CPU utilization')
+
+    def bucket_utilization(self, fig, agg):
+        # plots utilization over time per series of a SeriesAggregator
+        series = agg.series()
+        cols = 4
+        rows = max((len(series) + cols - 1) // cols, 1)
+        clock = np.arange(agg.resolution) * agg.width
+        for i, (name, data) in enumerate(series):
+            ax = fig.add_subplot(rows, cols, i + 1)
+            mask = data[:, TIME] > 0
+            ax.plot(clock[mask], data[mask, USR] / data[mask, TIME], 'b-')
+            ax.plot(clock[mask], data[mask, SYS] / data[mask, TIME], 'r-')
+            ax.set_ylim(0, 1)
+            ax.set_title(name)
+            ax.xaxis.set_major_formatter(self.time_formatter)
+        self.figure_labels(fig, 'Time', 'CPU utilization')
+
+    def utilization_scatter(self, fig, x):
+        ax = self.scatter(fig, safe_div(x.usr, x.time),
+                          safe_div(x.sys, x.time), labels_of(x),
+                          names_of(x), size=scaled(x.time, 4, 100))
+        ax.set_xlabel('User CPU utilization')
+        ax.set_ylabel('System CPU utilization')
+
+    def time_scatter(self, fig, x):
+        ax = self.scatter(fig, x.usr, x.sys, labels_of(x), names_of(x),
+                          size=scaled(safe_div(x.cpu, x.time), 4, 36))
+        self.scale_time(ax, 'x', x.usr)
+        self.scale_time(ax, 'y', x.sys)
+        ax.set_xlabel('User CPU time')
+        ax.set_ylabel('System CPU time')
+
+    def boxplot(self, fig, prof, values, fill, ylabel, time_axis):
+        summary = summarize(prof, 'label')
+        order = np.argsort(-summary.cpu, kind='stable')
+        ax = fig.add_subplot(111)
+        data = [values[prof.label == summary.keys[i]] for i in order]
+        box = ax.boxplot(data, patch_artist=True)
+        cmap = self.plt.get_cmap('RdYlGn')
+        for patch, i in zip(box['boxes'], order):
+            patch.set_facecolor(cmap(fill(summary, i)))
+        ax.set_xticklabels([summary.names[i] for i in order], rotation=90)
+        ax.set_xlabel('ID')
+        ax.set_ylabel(ylabel)
+        if time_axis:
+            self.scale_time(ax, 'y', values)
+
+    def time_boxplot(self, fig, prof):
+        self.boxplot(fig, prof, np.maximum(prof.cpu, 1),
+                     lambda s, i: s.util[i], 'CPU time', True)
+
+    def utilization_boxplot(self, fig, prof):
+        self.boxplot(fig, prof, prof.util,
+                     lambda s, i: (s.dom[i] + 1) / 2, 'CPU utilization',
+                     False)
+
+    def time_barplot(self, fig, x):
+        summary = x if isinstance(x, Summary) else summarize(x, 'label')
+        order = np.argsort(-summary.cpu, kind='stable')
+        ax = fig.add_subplot(111)
+        pos = np.arange(len(order))
+        ax.bar(pos, summary.sys[order], label='System')
+        ax.bar(pos, summary.usr[order], bottom=summary.sys[order],
+               label='User')
+        ax.set_xticks(pos)
+        ax.set_xticklabels([summary.names[i] for i in order], rotation=90)
+        ax.yaxis.set_major_formatter(self.time_formatter)
+        ax.set_xlabel('ID')
+        ax.set_ylabel('CPU time')
+        ax.legend(title='CPU time', loc='upper right')
+
+def labels_of(x):
+    return np.arange(len(x)) if isinstance(x, Summary) else x.label
+
+def names_of(x):
+    if isinstance(x, Summary):
+        return lambda i: x.names[i]
+    return x.label_name
+
+def scaled(values, smin, smax):
+    # scales values logarithmically to marker sizes in [smin, smax]
+    values = np.log1p(np.maximum(values, 0))
+    top = values.max() if len(values) else 0
+    if top == 0:
+        return np.full(len(values), float(smin))
+    return smin + (smax - smin) * values / top
+
+# -- main ---------------------------------------------------------------------
+
+def main_stream(args, types):
+    if args.resolution < 2 or args.resolution % 2 != 0:
+        sys.exit('--resolution must be a positive even number')
+    with open_input(args.read) as fp:
+        try:
+            aggs = stream_profile(fp, types, args.bucket * 1000,
+                                  args.resolution, args.top or 20)
+        except ValueError as err:
+            sys.exit(str(err))
+    plotter = None
+    if not args.no_plots:
+        try:
+            plotter = Plotter(args.output, args.font_size, args.squeeze,
+                              args.max_points)
+        except ImportError:
+            sys.stderr.write('** matplotlib not found, skipping plots\n')
+    rollup_file = open(args.rollup, 'w') if args.rollup else None
+    if rollup_file:
+        rollup_file.write('clock,type,id,usr,sys,time,util,mem\n')
+    for t, kind in ((WORKER, 'worker'), (ACTOR, 'actor')):
+        agg = aggs.get(t)
+        if agg is None or agg.start is None:
+            continue
+        summary = agg.summary()
+        if args.summary:
+            write_summary(kind + 's', summary, sys.stdout, args.top)
+        if rollup_file:
+            agg.write_rollup(kind, rollup_file)
+        if plotter:
+            plotter.record(kind + '-time-bar', plotter.time_barplot, summary)
+            plotter.record(kind + '-time-facets', plotter.bucket_utilization,
+                           agg)
+    if rollup_file:
+        rollup_file.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate plots from CAF profiler output.', add_help=False)
+    parser.add_argument('-a', '--actors', action='store_true', help='generate plots involving actors')
+    parser.add_argument('-w', '--workers', action='store_true', help='generate plots involving workers')
+    parser.add_argument('-l', '--labels', help='two-column file mapping IDs to labels')
+    parser.add_argument('-f', '--font-size', type=int, default=12, help='font base size [%(default)s]')
+    parser.add_argument('-s', '--squeeze', action='store_true', help='make plot edges as small as possible')
+    parser.add_argument('-o', '--output', default='png', help='the image format of the output [%(default)s]')
+    parser.add_argument('-r', '--read', default='stdin', help='read CAF profile from file [-]')
+    parser.add_argument('--summary', action='store_true', help='print per-worker and per-actor summaries')
+    parser.add_argument('--top', type=int, default=0, help='limit summaries (and actor series for --stream) to the top N IDs by CPU time')
+    parser.add_argument('--rollup', help='write per-ID sums per time bucket as CSV to this file')
+    parser.add_argument('--bucket', type=int, default=1000, help='bucket size for --rollup (initial size for --stream) in milliseconds [%(default)s]')
+    parser.add_argument('--max-points', type=int, default=100000, help='maximum number of points per scatter plot [%(default)s]')
+    parser.add_argument('--stream', action='store_true', help='aggregate in constant memory instead of loading all records')
+    parser.add_argument('--resolution', type=int, default=1024, help='number of time buckets for --stream [%(default)s]')
+    parser.add_argument('--no-plots', action='store_true', help='do not generate any plots')
+    parser.add_argument('-h', '--help', action='help', help='display this help and exit')
+    args = parser.parse_args()
+    # if neither --actors nor --workers given, set 'em both
+    if not args.actors and not args.workers:
+        args.actors = True
+        args.workers = True
+    types = [t for t, on in ((WORKER, args.workers), (ACTOR, args.actors))
+             if on]
+    if args.stream:
+        main_stream(args, types)
+        return
+    with open_input(args.read) as fp:
+        try:
+            profiles = load_profile(fp, types)
+        except ValueError as err:
+            sys.exit(str(err))
+    plotter = None
+    if not args.no_plots:
+        try:
+            plotter = Plotter(args.output, args.font_size, args.squeeze,
+                              args.max_points)
+        except ImportError:
+            sys.stderr.write('** matplotlib not found, skipping plots\n')
+    rollup_file = open(args.rollup, 'w') if args.rollup else None
+    if rollup_file:
+        rollup_file.write('clock,type,id,usr,sys,time,util\n')
+    if args.workers:
+        workers = profiles[WORKER]
+        by_id = summarize(workers)
+        if args.summary:
+            write_summary('workers', by_id, sys.stdout, args.top)
+        if rollup_file:
+            write_rollup(workers, 'worker', args.bucket * 1000, rollup_file)
+        if plotter and len(workers):
+            plotter.record('worker-time-bar', plotter.time_barplot, workers)
+            plotter.record('worker-time-facets', plotter.utilization_time,
+                           workers)
+            plotter.record('worker-time-scatter', plotter.time_scatter,
+                           workers)
+            plotter.record('worker-time-scatter-id', plotter.time_scatter,
+                           by_id)
+            plotter.record('worker-util-box', plotter.utilization_boxplot,
+                           workers)
+            plotter.record('worker-util-scatter', plotter.utilization_scatter,
+                           workers)
+            plotter.record('worker-util-scatter-id',
+                           plotter.utilization_scatter, by_id)
+    if args.actors:
+        actors = profiles[ACTOR]
+        if args.labels:
+            actors.set_labels(read_labels(args.labels))
+        by_id = summarize(actors)
+        by_label = summarize(actors, 'label')
+        if args.summary:
+            write_summary('actors', by_id, sys.stdout, args.top)
+            if args.labels:
+                write_summary('actors by label', by_label, sys.stdout,
+                              args.top)
+        if rollup_file:
+            write_rollup(actors, 'actor', args.bucket * 1000, rollup_file)
+        if plotter and len(actors):
+            plotter.record('actor-time-bar', plotter.time_barplot, by_label)
+            plotter.record('actor-time-scatter', plotter.time_scatter, actors)
+            plotter.record('actor-time-scatter-id', plotter.time_scatter,
+                           by_id)
+            plotter.record('actor-time-scatter-label', plotter.time_scatter,
+                           by_label)
+            plotter.record('actor-time-box', plotter.time_boxplot, actors)
+            actors_by_id = profile_by_id(actors)
+            plotter.record('actor-time-box-id', plotter.time_boxplot,
+                           actors_by_id)
+            plotter.record('actor-util-box', plotter.utilization_boxplot,
+                           actors)
+            plotter.record('actor-util-box-id', plotter.utilization_boxplot,
+                           actors_by_id)
+            plotter.record('actor-util-scatter-id',
+                           plotter.utilization_scatter, by_id)
+            plotter.record('actor-util-scatter-label',
+                           plotter.utilization_scatter, by_label)
+    if rollup_file:
+        rollup_file.close()
+
+if __name__ == '__main__':
+    main()
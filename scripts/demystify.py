@@ -5,114 +5,271 @@
 # `replies_to<...>::with<...>` and `atom_constant<...>`
 # with human-readable representation of the actual atom.
 
-import sys
+# usage:        demystify.py < build.log
+#               demystify.py --stats --cache-size 8192 < build.log
+#   (in place): demystify.py -j 8 build-logs/
+#  (one report): demystify.py -j 8 -o report.txt a.log b.log
 
-# decodes 6bit characters to ASCII
-DECODING_TABLE = ' 0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+import argparse, sys, os, re, bisect, functools, fnmatch
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from atom_codec import atom_read
 
 # CAF type strings
 ATOM_CONSTANT_SUFFIX = "caf::atom_constant<"
+TYPED_MPI = "caf::typed_mpi"
+TYPE_LIST = "caf::detail::type_list"
 
-# `pos` points to first character after '<':
-#   template_name<...>
-#                 ^
-# and returns the position of the closing '>'
-def end_of_template(x, pos):
-  open_templates = 1
-  while open_templates > 0:
-    if line[pos] == '<':
-      open_templates += 1
-    elif line[pos] == '>':
-      open_templates -= 1
-    pos += 1
-  # exclude final '>'
-  return pos - 1
-
-def next_element(x, pos, last):
-  # scan for ',' that isn't inside <...>
-  while pos < last and x[pos] != ',':
-    if x[pos] == '<':
-      pos = end_of_template(x, pos + 1)
-    else:
-      pos += 1
-  return pos
-
-def atom_read(x):
-  result = ""
-  read_chars = ((x & 0xF000000000000000) >> 60) == 0xF 
-  mask = 0x0FC0000000000000
-  bitshift = 54
-  while bitshift >= 0:
-    if read_chars:
-      result += DECODING_TABLE[(x & mask) >> bitshift]
-    elif ((x & mask) >> bitshift) == 0xF:
-      read_chars = True
-    bitshift -= 6
-    mask = mask >> 6
-  return result
+# tokens that define the nesting structure of a type, named templates are
+# recognized as part of their opening '<'
+TOKEN_RX = re.compile('(' + re.escape(TYPED_MPI) + '|' + re.escape(TYPE_LIST)
+                      + ')?<|[>,]')
+
+# default number of entries in each LRU cache
+CACHE_SIZE = 4096
+
+# default size of the pieces of a log file that workers process in batch mode
+CHUNK_SIZE = 4 * 1024 * 1024
+
+class Templates(object):
+  # Nesting structure of all `<...>` in a string, computed in a single pass.
+  # Positions always refer to the '<', '>' and ',' characters.
 
-def decompose_type_list(x, first, last):
-  res = []
-  i = first
-  n = next_element(x, first, last)
-  while i != last:
-    res.append(x[i:n])
-    # skip following ','
-    i = min(n + 2, last)
-    n = next_element(x, i, last)
-  return res
+  def __init__(self, x):
+    # maps the position of '<' to the position of its '>'
+    self.close = {}
+    # maps the position of '<' to the positions of its top-level ','
+    self.commas = {}
+    # positions of '<' for `typed_mpi` and `type_list` in ascending order
+    self.typed_mpis = []
+    self.type_lists = []
+    stack = []
+    for m in TOKEN_RX.finditer(x):
+      pos = m.end() - 1
+      ch = x[pos]
+      if ch == '<':
+        stack.append(pos)
+        name = m.group(1)
+        if name == TYPED_MPI:
+          self.typed_mpis.append(m.start())
+        elif name == TYPE_LIST:
+          self.type_lists.append(pos)
+      elif not stack:
+        # stray '>' or ',', e.g., from `operator->`
+        continue
+      elif ch == '>':
+        self.close[stack.pop()] = pos
+      else:
+        self.commas.setdefault(stack[-1], []).append(pos)
+
+  def elements(self, x, pos):
+    # returns the template arguments of the template opened at `pos`
+    last = self.close[pos]
+    if last == pos + 1:
+      return []
+    bounds = [pos] + self.commas.get(pos, []) + [last]
+    return [x[bounds[i] + 1:bounds[i + 1]].strip(' ')
+            for i in range(len(bounds) - 1)]
 
 def stringify(x):
-  if x.startswith(ATOM_CONSTANT_SUFFIX):
-    begin = len(ATOM_CONSTANT_SUFFIX)
-    end = len(x) - 1
-    res = "'"
-    res += atom_read(int(x[begin:end]))
-    res += "'"
-    return res
+  if x.startswith(ATOM_CONSTANT_SUFFIX) and x.endswith('>'):
+    try:
+      value = int(x[len(ATOM_CONSTANT_SUFFIX):-1])
+    except ValueError:
+      return x
+    return "'" + cached_atom_read(value) + "'"
   return x
 
 def stringify_list(xs):
-  res = ""
-  for index in range(len(xs)):
-    if index > 0:
-      res += ", "
-    res += stringify(xs[index].strip(' '))
-  return res
-  
-
-def decompose_typed_actor(x, first, last):
-  needle = "caf::detail::type_list<"
-  # first type list -> input types
-  j = x.find(needle, first) + len(needle)
-  k = end_of_template(x, j)
-  inputs = decompose_type_list(x, j, k)
-  # second type list -> outputs
-  j = x.find(needle, k) + len(needle)
-  k = end_of_template(x, j)
-  outputs = decompose_type_list(x, j, k)
-  # replace all 'caf::atom_constant<...>' entries in inputs
-  res = "replies_to<"
-  res += stringify_list(inputs)
-  res += ">::with<"
-  res += stringify_list(outputs)
-  res += ">"
-  return res
-
-
-for line in sys.stdin:
+  return ", ".join(stringify(x) for x in xs)
+
+def decompose_typed_actor(x):
+  # `x` is a complete `caf::typed_mpi<...>`, returns the replacement or None
+  # if `x` has no input and output type lists
+  templates = Templates(x)
+  first = len(TYPED_MPI)
+  last = templates.close.get(first)
+  # the first type list holds the inputs, the second one the outputs
+  i = bisect.bisect_left(templates.type_lists, first)
+  lists = templates.type_lists[i:i + 2]
+  if last is None or len(lists) != 2 or lists[1] > last \
+     or any(pos not in templates.close for pos in lists):
+    return None
+  inputs = templates.elements(x, lists[0])
+  outputs = templates.elements(x, lists[1])
+  # replace all 'caf::atom_constant<...>' entries in inputs and outputs
+  return "replies_to<" + stringify_list(inputs) + ">::with<" \
+         + stringify_list(outputs) + ">"
+
+def set_cache_size(size):
+  # compiler output repeats the same typed_mpi and atom over and over again,
+  # so we memoize both by their raw text and value, respectively
+  global cached_decompose_typed_actor, cached_atom_read
+  cache = functools.lru_cache(size)
+  cached_decompose_typed_actor = cache(decompose_typed_actor)
+  cached_atom_read = cache(atom_read)
+
+set_cache_size(CACHE_SIZE)
+
+def cache_stats():
+  # returns (name, hits, misses, current size) for each cache
+  return [(name, f.cache_info().hits, f.cache_info().misses,
+           f.cache_info().currsize)
+          for name, f in (('typed_mpi', cached_decompose_typed_actor),
+                          ('atom', cached_atom_read))]
+
+def demystify(line):
   # replace "std::__1" with "std::" (Clang libc++)
-  line = line.replace("std::__1", "std::")
-  needle = "caf::typed_mpi<"
-  idx = line.find(needle)
-  while idx != -1:
-    # find end of typed_actor<...>
-    first = idx + len(needle)
-    last = end_of_template(line, first)
-    updated = decompose_typed_actor(line, first, last)
-    prefix = line[:idx]
-    suffix = line[last:]
-    line = prefix + updated + suffix
-    idx = line.find(needle, idx + len(updated))
-  sys.stdout.write(line.replace("caf::", ""))
+  line = line.replace("std::__1::", "std::")
+  if TYPED_MPI not in line:
+    return line.replace("caf::", "")
+  templates = Templates(line)
+  out = []
+  pos = 0
+  for first in templates.typed_mpis:
+    # skip typed_mpi nested in a typed_mpi we already replaced
+    if first < pos:
+      continue
+    last = templates.close.get(first + len(TYPED_MPI))
+    if last is None:
+      continue
+    updated = cached_decompose_typed_actor(line[first:last + 1])
+    if updated is None:
+      continue
+    out.append(line[pos:first])
+    out.append(updated)
+    pos = last + 1
+  out.append(line[pos:])
+  return "".join(out).replace("caf::", "")
+
+# -- batch mode ---------------------------------------------------------------
+
+def find_logs(paths, pattern, suffix):
+  # expands directories to all files matching `pattern` in sorted order,
+  # skipping output of previous runs
+  result = []
+  for path in paths:
+    if not os.path.isdir(path):
+      result.append(path)
+      continue
+    for root, dirs, files in os.walk(path):
+      dirs.sort()
+      for name in sorted(files):
+        if fnmatch.fnmatch(name, pattern) and not name.endswith(suffix):
+          result.append(os.path.join(root, name))
+  return result
+
+def make_chunks(filepath, chunk_size):
+  # splits the file into ranges that end at a newline character
+  result = []
+  with open(filepath, 'rb') as fp:
+    size = os.fstat(fp.fileno()).st_size
+    begin = 0
+    while begin < size:
+      fp.seek(min(begin + chunk_size, size) - 1)
+      fp.readline()
+      end = fp.tell()
+      result.append((begin, end))
+      begin = end
+  return result
+
+def demystify_chunk(filepath, begin, end):
+  # returns the demystified bytes of a chunk and the cache statistics for it,
+  # surrogate escapes pass bytes that are not valid UTF-8 through unchanged
+  before = cache_stats()
+  with open(filepath, 'rb') as fp:
+    fp.seek(begin)
+    text = fp.read(end - begin).decode('utf-8', 'surrogateescape')
+  out = "".join(demystify(line) for line in text.splitlines(True))
+  stats = [(name, hits - x[1], misses - x[2], size)
+           for (name, hits, misses, size), x in zip(cache_stats(), before)]
+  return out.encode('utf-8', 'surrogateescape'), stats
+
+def run_batch(files, args):
+  # demystifies all files with a pool of workers while keeping the output
+  # of each file in order, returns accumulated cache statistics
+  jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+  totals = dict((name, [0, 0, 0]) for name, _, _, _ in cache_stats())
+  report = None
+  if args.output:
+    report = sys.stdout.buffer if args.output == '-' \
+             else open(args.output, 'wb')
+  def consume(item, out):
+    # items are futures, headers (bytes) or None for closing the file
+    if item is None:
+      out.close()
+      return
+    if isinstance(item, bytes):
+      out.write(item)
+      return
+    data, stats = item.result()
+    out.write(data)
+    for name, hits, misses, size in stats:
+      totals[name][0] += hits
+      totals[name][1] += misses
+      totals[name][2] = max(totals[name][2], size)
+  try:
+    with ProcessPoolExecutor(jobs, initializer=set_cache_size,
+                             initargs=(args.cache_size,)) as executor:
+      # (item, output file) pairs in output order, bounds the number of
+      # chunks in flight
+      pending = deque()
+      for filepath in files:
+        if report is None:
+          out = open(filepath + args.suffix, 'wb')
+        else:
+          out = report
+          if len(files) > 1:
+            # the header must wait for the chunks of the previous file
+            header = '==> {0} <==\n'.format(filepath).encode('utf-8')
+            pending.append((header, out))
+        for begin, end in make_chunks(filepath, args.chunk_size):
+          pending.append((executor.submit(demystify_chunk, filepath, begin,
+                                          end), out))
+          while len(pending) > 2 * jobs:
+            consume(*pending.popleft())
+        if report is None:
+          # marks the point for closing the file after its last chunk
+          pending.append((None, out))
+      while pending:
+        consume(*pending.popleft())
+  finally:
+    if report is not None and report is not sys.stdout.buffer:
+      report.close()
+  return [(name, x[0], x[1], x[2]) for name, x in totals.items()]
+
+def print_cache_totals(stats, out):
+  for name, hits, misses, size in stats:
+    total = hits + misses
+    ratio = 100.0 * hits / total if total > 0 else 0.0
+    out.write('{0:>9} cache: {1} hits, {2} misses ({3:.1f}% hit rate), '
+              '{4} entries\n'.format(name, hits, misses, ratio, size))
+
+def main():
+  parser = argparse.ArgumentParser(description='Demystify CAF types in compiler output.')
+  parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='maximum number of entries per cache, 0 disables caching (default: %(default)s)')
+  parser.add_argument('--stats', action='store_true', help='print cache statistics to STDERR when done')
+  parser.add_argument('-j', '--jobs', type=int, default=0, help='number of worker processes for log files, 0 for one per CPU (default: %(default)s)')
+  parser.add_argument('-o', '--output', help='write one merged report to this file ("-" for STDOUT) instead of writing a copy with --suffix next to each log')
+  parser.add_argument('--suffix', default='.demystified', help='suffix for demystified copies of log files (default: %(default)s)')
+  parser.add_argument('--pattern', default='*.log', help='file name pattern when searching directories (default: %(default)s)')
+  parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='size of the pieces of a log that workers process in bytes (default: %(default)s)')
+  parser.add_argument('logs', nargs='*', help='log files or directories to demystify, reads STDIN if omitted')
+  args = parser.parse_args()
+  set_cache_size(args.cache_size)
+  if args.logs:
+    files = find_logs(args.logs, args.pattern, args.suffix)
+    missing = [x for x in files if not os.path.isfile(x)]
+    if missing:
+      sys.exit('no such file: ' + missing[0])
+    stats = run_batch(files, args)
+  else:
+    for line in sys.stdin:
+      sys.stdout.write(demystify(line))
+    stats = cache_stats()
+  if args.stats:
+    print_cache_totals(stats, sys.stderr)
 
+if __name__ == '__main__':
+  main()
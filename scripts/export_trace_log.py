@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+
+# Converts a CAF log into the Chrome trace-event format for chrome://tracing
+# or https://ui.perfetto.dev. Each thread (`%t`) becomes a track, ENTRY/EXIT
+# pairs of `CAF_LOG_TRACE` become duration slices and SEND/RECEIVE flow events
+# become arrows from the sending to the receiving actor. SPAWN, TERMINATE and
+# log lines with at least --instants severity become instant events.
+#
+# The script writes events while reading the log and only keeps the open
+# slices per thread plus at most --max-in-flight sent messages in memory. With
+# --chunk-size, it splits the output into files with at most that many events
+# each. Slices that span two files end at the last timestamp of the first file
+# and start again in the next file. Arrows across two files do not show up.
+#
+# Note that `%r` has millisecond resolution, i.e., many events share the same
+# timestamp.
+
+# usage: export_trace_log.py -o trace.json FILENAME
+#        export_trace_log.py --chunk-size 5000000 -o trace.json FILENAME
+
+import argparse, sys, os, json, fileinput
+
+from caf_log import (DEFAULT_FORMAT, LEVELS, FLOW_COMPONENT, LineParser,
+                     InFlight, parse_flow_event, actor_id)
+
+# all events belong to a single process
+PID = 1
+
+# ignore deeper nesting of ENTRY lines to bound memory for logs without EXIT
+# lines, e.g., after a crash
+MAX_DEPTH = 256
+
+# maximum number of characters in the name of an instant event
+MAX_NAME_LENGTH = 80
+
+class TraceWriter(object):
+    # Writes trace events incrementally. With a `chunk_size`, starts a new
+    # file `<base>-<n><ext>` after `chunk_size` events and calls `on_close`
+    # and `on_open` for writing closing and opening events for the chunk.
+
+    def __init__(self, path, chunk_size=0):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunk = 0
+        self.count = 0
+        self.total = 0
+        self.out = None
+        self.on_close = lambda: []
+        self.on_open = lambda: []
+
+    def file_name(self):
+        if not self.chunk_size:
+            return self.path
+        base, ext = os.path.splitext(self.path)
+        return '{0}-{1:04d}{2}'.format(base, self.chunk, ext or '.json')
+
+    def open(self):
+        if self.path == '-':
+            self.out = sys.stdout
+        else:
+            self.out = open(self.file_name(), 'w')
+        self.out.write('{"displayTimeUnit":"ms","traceEvents":[\n')
+        self.count = 0
+        for event in self.on_open():
+            self._write(event)
+
+    def close(self):
+        if self.out is None:
+            return
+        for event in self.on_close():
+            self._write(event)
+        self.out.write('\n]}\n')
+        if self.out is not sys.stdout:
+            self.out.close()
+        self.out = None
+        self.chunk += 1
+
+    def _write(self, event):
+        if self.count:
+            self.out.write(',\n')
+        self.out.write(json.dumps(event, separators=(',', ':')))
+        self.count += 1
+        self.total += 1
+
+    def write(self, event):
+        if self.out is None:
+            self.open()
+        elif self.chunk_size and self.count >= self.chunk_size:
+            self.close()
+            self.open()
+        self._write(event)
+
+class Track(object):
+    __slots__ = ['tid', 'name', 'stack', 'overflow']
+
+    def __init__(self, tid, name):
+        self.tid = tid
+        self.name = name
+        # names of the open slices
+        self.stack = []
+        # number of ENTRY lines beyond MAX_DEPTH
+        self.overflow = 0
+
+class Exporter(object):
+    def __init__(self, parser, writer, max_in_flight=100000,
+                 min_level='WARN'):
+        self.parser = parser
+        self.writer = writer
+        self.runtime = parser.column('runtime')
+        self.thread = parser.column('thread')
+        self.message = parser.column('message')
+        self.level = parser.column('level')
+        self.component = parser.column('component')
+        self.actor = parser.column('actor')
+        self.cls = parser.column('class')
+        self.method = parser.column('method')
+        if None in (self.runtime, self.thread, self.message):
+            raise ValueError('file format needs at least %r, %t and %m: '
+                             + parser.format)
+        self.min_level = LEVELS[min_level]
+        self.tracks = {}
+        # flow IDs of sent messages
+        self.in_flight = InFlight(max_in_flight)
+        self.next_flow_id = 1
+        self.last_ts = 0
+        self.flows = 0
+        self.unmatched_receives = 0
+        self.unmatched_exits = 0
+        writer.on_open = self.chunk_prologue
+        writer.on_close = self.chunk_epilogue
+
+    # -- chunk handling -------------------------------------------------------
+
+    def thread_name_event(self, track):
+        return {'ph': 'M', 'name': 'thread_name', 'pid': PID,
+                'tid': track.tid, 'args': {'name': track.name}}
+
+    def chunk_prologue(self):
+        # names the process and all known threads and reopens open slices
+        result = [{'ph': 'M', 'name': 'process_name', 'pid': PID,
+                   'args': {'name': 'CAF'}}]
+        for track in self.tracks.values():
+            result.append(self.thread_name_event(track))
+            for name in track.stack:
+                result.append({'ph': 'B', 'name': name, 'ts': self.last_ts,
+                               'pid': PID, 'tid': track.tid})
+        return result
+
+    def chunk_epilogue(self):
+        # closes all open slices at the last timestamp
+        return [{'ph': 'E', 'ts': self.last_ts, 'pid': PID, 'tid': track.tid}
+                for track in self.tracks.values() for _ in track.stack]
+
+    # -- event conversion -----------------------------------------------------
+
+    def track(self, thread):
+        result = self.tracks.get(thread)
+        if result is None:
+            result = self.tracks[thread] = Track(len(self.tracks) + 1, thread)
+            if self.writer.out is not None:
+                self.writer.write(self.thread_name_event(result))
+        return result
+
+    def function_name(self, xs):
+        method = xs[self.method] if self.method is not None else ''
+        if self.cls is not None and xs[self.cls]:
+            return xs[self.cls] + '::' + method
+        return method
+
+    def add(self, line):
+        xs = self.parser.parse(line)
+        if xs is None:
+            return
+        ts = int(xs[self.runtime]) * 1000
+        self.last_ts = ts
+        # make sure the writer emits the prologue before the first thread name
+        if self.writer.out is None:
+            self.writer.open()
+        track = self.track(xs[self.thread])
+        msg = xs[self.message]
+        level = xs[self.level] if self.level is not None else ''
+        if level == 'TRACE' and msg.startswith('ENTRY'):
+            if len(track.stack) >= MAX_DEPTH:
+                track.overflow += 1
+                return
+            name = self.function_name(xs)
+            event = {'ph': 'B', 'name': name, 'ts': ts, 'pid': PID,
+                     'tid': track.tid}
+            args = msg[5:].strip()
+            if args:
+                event['args'] = {'args': args}
+            # update the stack only after writing, since the writer may start
+            # a new chunk that reopens all slices on the stack
+            self.writer.write(event)
+            track.stack.append(name)
+        elif level == 'TRACE' and msg.startswith('EXIT'):
+            # EXIT lines come from the scope guard and thus name a lambda
+            # instead of the traced function, so we rely on the stack
+            if track.overflow:
+                track.overflow -= 1
+            elif track.stack:
+                self.writer.write({'ph': 'E', 'ts': ts, 'pid': PID,
+                                   'tid': track.tid})
+                track.stack.pop()
+            else:
+                self.unmatched_exits += 1
+        elif self.component is not None \
+             and xs[self.component] == FLOW_COMPONENT:
+            event = parse_flow_event(msg)
+            if event is not None:
+                self.add_flow_event(xs, ts, track, event[0], event[1])
+        elif LEVELS.get(level, LEVELS['TRACE']) <= self.min_level:
+            self.writer.write({'ph': 'i', 's': 't',
+                               'name': msg[:MAX_NAME_LENGTH], 'cat': level,
+                               'ts': ts, 'pid': PID, 'tid': track.tid,
+                               'args': {'message': msg}})
+
+    def add_flow_event(self, xs, ts, track, name, fields):
+        if name == 'SEND':
+            # logged in the context of the sender
+            key = (actor_id(fields['TO']), actor_id(fields['FROM']),
+                   fields['CONTENT'])
+            flow_id = self.next_flow_id
+            self.next_flow_id += 1
+            self.slice('send', ts, track, fields)
+            self.writer.write({'ph': 's', 'id': flow_id, 'name': 'message',
+                               'cat': FLOW_COMPONENT, 'ts': ts, 'pid': PID,
+                               'tid': track.tid})
+            self.in_flight.send(key, flow_id)
+        elif name == 'RECEIVE':
+            # logged in the context of the receiver
+            receiver = int(xs[self.actor]) if self.actor is not None else None
+            key = (receiver, actor_id(fields['FROM']), fields['CONTENT'])
+            self.slice('receive', ts, track, fields)
+            flow_id = self.in_flight.receive(key)
+            if flow_id is None:
+                self.unmatched_receives += 1
+                return
+            self.flows += 1
+            self.writer.write({'ph': 'f', 'bp': 'e', 'id': flow_id,
+                               'name': 'message', 'cat': FLOW_COMPONENT,
+                               'ts': ts, 'pid': PID, 'tid': track.tid})
+        elif name in ('SPAWN', 'TERMINATE'):
+            self.writer.write({'ph': 'i', 's': 't', 'name': name.lower(),
+                               'cat': FLOW_COMPONENT, 'ts': ts, 'pid': PID,
+                               'tid': track.tid, 'args': fields})
+
+    def slice(self, name, ts, track, fields):
+        # flow events bind to the enclosing slice, so we add a slice for each
+        # SEND and RECEIVE
+        self.writer.write({'ph': 'X', 'name': name, 'cat': FLOW_COMPONENT,
+                           'ts': ts, 'dur': 0, 'pid': PID, 'tid': track.tid,
+                           'args': fields})
+
+    def unmatched_entries(self):
+        return sum(len(x.stack) + x.overflow for x in self.tracks.values())
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a CAF log to the Chrome trace-event format.')
+    parser.add_argument('-f', '--format', default=DEFAULT_FORMAT, help='value of logger.file-format (default: "%(default)s")')
+    parser.add_argument('-o', '--output', default='-', help='path to the JSON output or "-" for STDOUT (default: %(default)s)')
+    parser.add_argument('--chunk-size', type=int, default=0, help='maximum number of events per output file, 0 for a single file (default: %(default)s)')
+    parser.add_argument('--max-in-flight', type=int, default=100000, help='maximum number of sent messages waiting for their RECEIVE (default: %(default)s)')
+    parser.add_argument('--instants', choices=['QUIET', 'ERROR', 'WARN', 'INFO', 'DEBUG'], default='WARN', help='minimum severity of log lines that become instant events (default: %(default)s)')
+    parser.add_argument('log', help='path to the log file or "-" for reading from STDIN')
+    args = parser.parse_args()
+    if args.max_in_flight < 1:
+        sys.exit('--max-in-flight must be positive')
+    if args.chunk_size and args.output == '-':
+        sys.exit('--chunk-size requires an output file')
+    writer = TraceWriter(args.output, args.chunk_size)
+    try:
+        exporter = Exporter(LineParser(args.format), writer,
+                            args.max_in_flight, args.instants)
+    except ValueError as err:
+        sys.exit(str(err))
+    if args.log == '-':
+        for line in fileinput.input('-'):
+            exporter.add(line)
+    else:
+        if not os.path.isfile(args.log):
+            sys.exit('no such file: ' + args.log)
+        with open(args.log, errors='replace') as fp:
+            for line in fp:
+                exporter.add(line)
+    if writer.out is None:
+        # always produce a valid trace, even for an empty log
+        writer.open()
+    writer.close()
+    sys.stderr.write('{0} events in {1} file(s), {2} message flows\n'
+                     .format(writer.total, max(writer.chunk, 1),
+                             exporter.flows))
+    in_flight = exporter.in_flight
+    if in_flight.evicted or len(in_flight) or exporter.unmatched_receives:
+        sys.stderr.write('unmatched SEND events: {0} ({1} evicted), '
+                         'unmatched RECEIVE events: {2}\n'
+                         .format(in_flight.evicted + len(in_flight),
+                                 in_flight.evicted,
+                                 exporter.unmatched_receives))
+    if exporter.unmatched_exits or exporter.unmatched_entries():
+        sys.stderr.write('unmatched ENTRY lines: {0}, unmatched EXIT lines: '
+                         '{1}\n'.format(exporter.unmatched_entries(),
+                                        exporter.unmatched_exits))
+
+if __name__ == '__main__':
+    main()
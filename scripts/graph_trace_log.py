@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+
+# Extracts the actor graph from the flow events (component `caf_flow`) of a
+# CAF log with at least debug verbosity. The script reads the log in a single
+# pass and aggregates:
+#
+# - the spawn tree, i.e., which actor spawned which (SPAWN events name the
+#   new actor and `%a` names the parent)
+# - messages and bytes per sender -> receiver edge (SEND events) plus the
+#   number of messages the receiver actually processed (RECEIVE events)
+# - the lifetime of each actor from its SPAWN to its TERMINATE event
+#
+# The log has no message sizes, so the script approximates bytes by the
+# length of the CONTENT field, i.e., the rendered message.
+#
+# The output is either a DOT graph, a GraphML graph or a CSV edge list.
+# With -k, the output only contains the K heaviest edges and their actors.
+
+# usage:  (summary): graph_trace_log.py FILENAME
+#     (Graphviz): graph_trace_log.py -k 50 -o graph.dot FILENAME
+#                 dot -Tsvg graph.dot > graph.svg
+#   (edge list): graph_trace_log.py -o edges.csv --actors actors.csv FILENAME
+
+import argparse, sys, os, csv, fileinput
+from xml.sax.saxutils import escape, quoteattr
+
+from caf_log import (DEFAULT_FORMAT, FLOW_COMPONENT, LineParser,
+                     parse_flow_event, actor_id)
+
+# ID for messages without sender, e.g., from `anon_send`
+ANONYMOUS = 0
+
+class Actor(object):
+    __slots__ = ['id', 'name', 'type', 'parent', 'spawned', 'terminated',
+                 'reason', 'sent', 'received', 'bytes_sent']
+
+    def __init__(self, id):
+        self.id = id
+        self.name = ''
+        self.type = ''
+        self.parent = None
+        self.spawned = None
+        self.terminated = None
+        self.reason = ''
+        self.sent = 0
+        self.received = 0
+        self.bytes_sent = 0
+
+    def lifetime(self):
+        if self.spawned is None or self.terminated is None:
+            return None
+        return self.terminated - self.spawned
+
+    def label(self):
+        if self.id == ANONYMOUS:
+            return 'anonymous'
+        return '{0} {1}'.format(self.name, self.id) if self.name \
+               else str(self.id)
+
+class Edge(object):
+    __slots__ = ['messages', 'bytes', 'received']
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.received = 0
+
+class ActorGraph(object):
+    def __init__(self, parser):
+        self.parser = parser
+        self.runtime = parser.column('runtime')
+        self.component = parser.column('component')
+        self.actor = parser.column('actor')
+        self.message = parser.column('message')
+        if None in (self.runtime, self.component, self.actor, self.message):
+            raise ValueError('file format needs at least %r, %c, %a and %m: '
+                             + parser.format)
+        self.actors = {}
+        # maps (sender, receiver) to Edge objects
+        self.edges = {}
+
+    def get_actor(self, id):
+        result = self.actors.get(id)
+        if result is None:
+            result = self.actors[id] = Actor(id)
+        return result
+
+    def get_edge(self, sender, receiver):
+        key = (sender, receiver)
+        result = self.edges.get(key)
+        if result is None:
+            result = self.edges[key] = Edge()
+        return result
+
+    def add(self, line):
+        xs = self.parser.parse(line)
+        if xs is None or xs[self.component] != FLOW_COMPONENT:
+            return
+        event = parse_flow_event(xs[self.message])
+        if event is None:
+            return
+        name, fields = event
+        if name == 'SEND':
+            # logged in the context of the sender
+            receiver = actor_id(fields.get('TO', ''))
+            if receiver is None:
+                return
+            sender = actor_id(fields.get('FROM', ''))
+            if sender is None:
+                sender = ANONYMOUS
+            size = len(fields.get('CONTENT', ''))
+            edge = self.get_edge(sender, receiver)
+            edge.messages += 1
+            edge.bytes += size
+            actor = self.get_actor(sender)
+            actor.sent += 1
+            actor.bytes_sent += size
+            self.get_actor(receiver)
+        elif name == 'RECEIVE':
+            # logged in the context of the receiver
+            receiver = int(xs[self.actor])
+            sender = actor_id(fields.get('FROM', ''))
+            if sender is None:
+                sender = ANONYMOUS
+            self.get_edge(sender, receiver).received += 1
+            self.get_actor(sender)
+            self.get_actor(receiver).received += 1
+        elif name == 'SPAWN':
+            try:
+                actor = self.get_actor(int(fields.get('ID', '')))
+            except ValueError:
+                return
+            actor.name = fields.get('NAME', '')
+            actor.type = fields.get('TYPE', '')
+            actor.spawned = int(xs[self.runtime])
+            parent = int(xs[self.actor])
+            # actor 0 means the line has no actor context, e.g., in main
+            if parent != 0 and parent != actor.id:
+                actor.parent = parent
+                self.get_actor(parent)
+        elif name == 'TERMINATE':
+            try:
+                actor = self.get_actor(int(fields.get('ID', '')))
+            except ValueError:
+                return
+            actor.terminated = int(xs[self.runtime])
+            actor.reason = fields.get('REASON', '')
+
+    def subgraph(self, top, key):
+        # returns the `top` heaviest edges (all edges for 0) and their actors
+        edges = sorted(self.edges.items(), key=lambda x: key(x[1]),
+                       reverse=True)
+        if top:
+            edges = edges[:top]
+        ids = set()
+        for (sender, receiver), _ in edges:
+            ids.add(sender)
+            ids.add(receiver)
+        if not top:
+            ids.update(self.actors)
+        actors = [self.actors[x] for x in sorted(ids)]
+        return actors, edges
+
+SORT_KEYS = {
+    'messages': lambda x: x.messages,
+    'bytes': lambda x: x.bytes,
+    'received': lambda x: x.received,
+}
+
+# -- output formats -----------------------------------------------------------
+
+def write_dot(actors, edges, out):
+    ids = set(x.id for x in actors)
+    heaviest = max([x.messages for _, x in edges] or [1]) or 1
+    out.write('digraph actors {\n')
+    out.write('  node [shape=box, fontname="Helvetica"];\n')
+    for actor in actors:
+        label = '{0}\\nsent: {1}, received: {2}'.format(
+                    actor.label(), actor.sent, actor.received)
+        out.write('  a{0} [label="{1}"];\n'
+                  .format(actor.id, label.replace('"', '\\"')))
+    # spawn tree
+    for actor in actors:
+        if actor.parent is not None and actor.parent in ids:
+            out.write('  a{0} -> a{1} [style=dashed, color=gray];\n'
+                      .format(actor.parent, actor.id))
+    for (sender, receiver), edge in edges:
+        width = 1.0 + 4.0 * edge.messages / heaviest
+        out.write('  a{0} -> a{1} [label="{2}", penwidth={3:.2f}];\n'
+                  .format(sender, receiver, edge.messages, width))
+    out.write('}\n')
+
+GRAPHML_KEYS = [
+    ('name', 'node', 'string'),
+    ('type', 'node', 'string'),
+    ('spawned', 'node', 'long'),
+    ('terminated', 'node', 'long'),
+    ('lifetime', 'node', 'long'),
+    ('sent', 'node', 'long'),
+    ('received', 'node', 'long'),
+    ('kind', 'edge', 'string'),
+    ('messages', 'edge', 'long'),
+    ('bytes', 'edge', 'long'),
+    ('processed', 'edge', 'long'),
+]
+
+def write_graphml(actors, edges, out):
+    def data(key, value):
+        if value is None or value == '':
+            return ''
+        return '<data key={0}>{1}</data>'.format(quoteattr(key),
+                                                 escape(str(value)))
+    ids = set(x.id for x in actors)
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    out.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+    for name, domain, kind in GRAPHML_KEYS:
+        out.write('  <key id="{0}" for="{1}" attr.name="{0}" '
+                  'attr.type="{2}"/>\n'.format(name, domain, kind))
+    out.write('  <graph id="actors" edgedefault="directed">\n')
+    for x in actors:
+        out.write('    <node id="a{0}">{1}</node>\n'.format(x.id, ''.join([
+            data('name', x.label()), data('type', x.type),
+            data('spawned', x.spawned), data('terminated', x.terminated),
+            data('lifetime', x.lifetime()), data('sent', x.sent),
+            data('received', x.received)])))
+    for x in actors:
+        if x.parent is not None and x.parent in ids:
+            out.write('    <edge source="a{0}" target="a{1}">{2}</edge>\n'
+                      .format(x.parent, x.id, data('kind', 'spawn')))
+    for (sender, receiver), edge in edges:
+        out.write('    <edge source="a{0}" target="a{1}">{2}</edge>\n'
+                  .format(sender, receiver, ''.join([
+                      data('kind', 'message'), data('messages', edge.messages),
+                      data('bytes', edge.bytes),
+                      data('processed', edge.received)])))
+    out.write('  </graph>\n</graphml>\n')
+
+def write_edges_csv(actors, edges, out):
+    writer = csv.writer(out)
+    writer.writerow(['sender', 'receiver', 'messages', 'bytes', 'received'])
+    for (sender, receiver), edge in edges:
+        writer.writerow([sender, receiver, edge.messages, edge.bytes,
+                         edge.received])
+
+def write_actors_csv(graph, out):
+    # distinct senders per receiver reveal fan-in bottlenecks
+    fan_in = {}
+    fan_out = {}
+    for sender, receiver in graph.edges:
+        fan_in[receiver] = fan_in.get(receiver, 0) + 1
+        fan_out[sender] = fan_out.get(sender, 0) + 1
+    writer = csv.writer(out)
+    writer.writerow(['id', 'name', 'type', 'parent', 'spawned', 'terminated',
+                     'lifetime', 'reason', 'sent', 'bytes_sent', 'received',
+                     'fan_in', 'fan_out'])
+    for id in sorted(graph.actors):
+        x = graph.actors[id]
+        writer.writerow([x.id, x.name, x.type, x.parent, x.spawned,
+                         x.terminated, x.lifetime(), x.reason, x.sent,
+                         x.bytes_sent, x.received, fan_in.get(id, 0),
+                         fan_out.get(id, 0)])
+
+WRITERS = {
+    'dot': write_dot,
+    'graphml': write_graphml,
+    'csv': write_edges_csv,
+}
+
+def print_summary(graph, limit, out):
+    fan_in = {}
+    for sender, receiver in graph.edges:
+        fan_in[receiver] = fan_in.get(receiver, 0) + 1
+    out.write('actors: {0}, edges: {1}, messages: {2}\n'
+              .format(len(graph.actors), len(graph.edges),
+                      sum(x.messages for x in graph.edges.values())))
+    columns = [
+        ('received', lambda x: x.received),
+        ('sent', lambda x: x.sent),
+        ('fan-in', lambda x: fan_in.get(x.id, 0)),
+    ]
+    for title, key in columns:
+        out.write('\ntop actors by {0}:\n'.format(title))
+        rows = sorted(graph.actors.values(), key=key, reverse=True)[:limit]
+        for actor in rows:
+            out.write('{0:>10}  {1}\n'.format(key(actor), actor.label()))
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract the actor graph from a CAF log.')
+    parser.add_argument('-f', '--format', default=DEFAULT_FORMAT, help='value of logger.file-format (default: "%(default)s")')
+    parser.add_argument('-o', '--output', help='write the graph to this file, the extension (.dot, .graphml or .csv) selects the format')
+    parser.add_argument('-t', '--type', choices=sorted(WRITERS), help='output format (default: derived from --output)')
+    parser.add_argument('-k', '--top', type=int, default=0, help='only include the K heaviest edges and their actors, 0 for all (default: %(default)s)')
+    parser.add_argument('-s', '--sort', choices=sorted(SORT_KEYS), default='messages', help='edge weight for -k (default: %(default)s)')
+    parser.add_argument('-n', '--limit', type=int, default=10, help='number of actors per list in the summary (default: %(default)s)')
+    parser.add_argument('--actors', help='write per-actor statistics as CSV to this file')
+    parser.add_argument('log', help='path to the log file or "-" for reading from STDIN')
+    args = parser.parse_args()
+    kind = args.type
+    if args.output and kind is None:
+        kind = os.path.splitext(args.output)[1][1:].lower()
+        if kind not in WRITERS:
+            sys.exit('cannot derive the output format from ' + args.output
+                     + ', use --type')
+    try:
+        graph = ActorGraph(LineParser(args.format))
+    except ValueError as err:
+        sys.exit(str(err))
+    if args.log == '-':
+        for line in fileinput.input('-'):
+            graph.add(line)
+    else:
+        if not os.path.isfile(args.log):
+            sys.exit('no such file: ' + args.log)
+        with open(args.log, errors='replace') as fp:
+            for line in fp:
+                graph.add(line)
+    print_summary(graph, args.limit, sys.stdout)
+    if args.output:
+        actors, edges = graph.subgraph(args.top, SORT_KEYS[args.sort])
+        with open(args.output, 'w', newline='' if kind == 'csv' else None) \
+             as out:
+            WRITERS[kind](actors, edges, out)
+    if args.actors:
+        with open(args.actors, 'w', newline='') as out:
+            write_actors_csv(graph, out)
+
+if __name__ == '__main__':
+    main()
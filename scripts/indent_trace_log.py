@@ -1,12 +1,22 @@
 #!/usr/bin/env python
 
-# Indents a CAF log with trace verbosity. The script does *not* deal with a log
-# with multiple threads.
+# Indents a CAF log with trace verbosity. By default, the script assumes a log
+# with a single thread. With `-t`, the script keeps one indentation per thread
+# instead, using the thread field (`%t`) of the log's file format.
 
 # usage (read file): indent_trace_log.py FILENAME
 #      (read stdin): indent_trace_log.py -
+#  (multi-threaded): indent_trace_log.py -t FILENAME
+#  (one file each): indent_trace_log.py -s thread -o PREFIX FILENAME
+#        (parallel): indent_trace_log.py -j 0 FILENAME
+#   (indexed query): indent_trace_log.py -x -i 42 FILENAME
+#  (follow, tail -F): indent_trace_log.py -F -t FILENAME
 
-import argparse, sys, os, fileinput, re
+import argparse, sys, os, fileinput, re, io, mmap, time, asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from caf_log import DEFAULT_FORMAT, field_column, follow
 
 def is_entry(line):
     return 'TRACE' in line and 'ENTRY' in line
@@ -14,40 +24,341 @@ def is_entry(line):
 def is_exit(line):
     return 'TRACE' in line and 'EXIT' in line
 
-def print_indented(line, indent):
+def print_indented(out, line, indent):
     if is_exit(line):
         indent = indent[:-2]
-    sys.stdout.write(indent)
-    sys.stdout.write(line)
+    out.write(indent)
+    out.write(line)
     if is_entry(line):
         indent += "  "
     return indent
 
-def read_lines(fp, ids):
-    indent = ""
+class SplitWriter(object):
+    # writes lines to one file per key, keeping at most `max_open` files open
+    # at the same time to stay within the limits of the OS
+
+    def __init__(self, prefix, max_open=64, binary=False):
+        self.prefix = prefix
+        self.max_open = max_open
+        self.binary = binary
+        self.files = OrderedDict()
+        self.known_keys = set()
+
+    def get(self, key):
+        fp = self.files.pop(key, None)
+        if fp is None:
+            if len(self.files) >= self.max_open:
+                self.files.popitem(last=False)[1].close()
+            mode = 'a' if key in self.known_keys else 'w'
+            if self.binary:
+                mode += 'b'
+            self.known_keys.add(key)
+            fp = open('{0}{1}.log'.format(self.prefix, key), mode)
+        self.files[key] = fp
+        return fp
+
+    def close(self):
+        for fp in self.files.values():
+            fp.close()
+        self.files.clear()
+
+def filter_lines(fp, ids):
     if not ids or len(ids) == 0:
-        for line in fp:
-            indent = print_indented(line, indent)
+        return fp
+    rx = re.compile('.+ (?:actor|ID = )([0-9]+) .+')
+    def matches(line):
+        rx_res = rx.match(line)
+        return rx_res != None and rx_res.group(1) in ids
+    return (line for line in fp if matches(line))
+
+def indent_single(lines, out, indent=""):
+    for line in lines:
+        indent = print_indented(out, line, indent)
+    return indent
+
+def indent_threads(lines, thread_column, get_out, key_column, indents=None,
+                   tid=None, key=None):
+    # Maps thread IDs to their current indentation. Threads without open
+    # ENTRY lines drop out of the map, i.e., its size is bounded by the number
+    # of threads that are currently inside a traced function.
+    if indents is None:
+        indents = {}
+    for line in lines:
+        # lines without enough columns are continuations of multi-line
+        # messages and belong to the previous thread
+        xs = line.split(None, max(thread_column, key_column) + 1)
+        if len(xs) > max(thread_column, key_column):
+            tid = xs[thread_column]
+            key = xs[key_column]
+        indent = print_indented(get_out(key), line, indents.get(tid, ""))
+        if indent:
+            indents[tid] = indent
+        else:
+            indents.pop(tid, None)
+    return tid, key
+
+def get_columns(args):
+    # returns the column of the thread ID and the column of the key for -s
+    # (None if not splitting) or (None, None) for single-threaded indentation
+    if not args.threads and not args.split:
+        return None, None
+    thread_column = field_column(args.format, '%t')
+    if thread_column is None:
+        sys.exit('file format has no thread field (%t): ' + args.format)
+    if not args.split:
+        return thread_column, None
+    key_column = field_column(args.format, '%a' if args.split == 'actor'
+                                                else '%t')
+    if key_column is None:
+        sys.exit('file format has no actor field (%a): ' + args.format)
+    return thread_column, key_column
+
+# -- parallel processing of log files -----------------------------------------
+
+# A chunk changes the indentation depth (in steps of two spaces) of a thread
+# from x to max(x + a, b). Such functions compose and the identity is (0, 0),
+# since depths are never negative. This allows us to compute the depth at each
+# chunk boundary from per-chunk summaries without looking at any line twice in
+# the main process.
+
+def compose(f, g):
+    # returns g after f
+    return (f[0] + g[0], max(f[1] + g[0], g[1]))
+
+def apply(f, x):
+    return max(x + f[0], f[1])
+
+# memory-mapped log file of a worker process
+worker_log = None
+
+def init_worker(filepath):
+    global worker_log
+    with open(filepath, 'rb') as fp:
+        worker_log = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+def chunk_lines(begin, end, ids):
+    # latin-1 maps each byte to exactly one character and back
+    text = worker_log[begin:end].decode('latin-1')
+    return filter_lines(io.StringIO(text, newline='\n'), ids)
+
+def summarize_chunk(begin, end, ids, thread_column, key_column):
+    # returns the summary per thread (or for the whole chunk if thread_column
+    # is None) plus thread ID and key of the last line for continuation lines
+    # in the next chunk; the summary for continuation lines at the beginning
+    # of this chunk uses None as thread ID
+    summaries = {}
+    tid = None
+    key = None
+    last_column = max(thread_column or 0, key_column or 0)
+    for line in chunk_lines(begin, end, ids):
+        if thread_column is not None:
+            xs = line.split(None, last_column + 1)
+            if len(xs) > last_column:
+                tid = xs[thread_column]
+                key = xs[key_column] if key_column is not None else tid
+        f = summaries.get(tid, (0, 0))
+        if is_exit(line):
+            f = compose(f, (-1, 0))
+        if is_entry(line):
+            f = compose(f, (1, 0))
+        summaries[tid] = f
+    return summaries, (tid, key)
+
+def render_chunk(begin, end, ids, thread_column, key_column, depths, tid,
+                 key):
+    # returns the indented lines of a chunk as bytes or, if key_column is not
+    # None, a dictionary mapping keys to bytes
+    lines = chunk_lines(begin, end, ids)
+    if thread_column is None:
+        out = io.StringIO()
+        indent = '  ' * depths.get(None, 0)
+        for line in lines:
+            indent = print_indented(out, line, indent)
+        return out.getvalue().encode('latin-1')
+    indents = dict((k, '  ' * v) for k, v in depths.items())
+    if key_column is None:
+        out = io.StringIO()
+        indent_threads(lines, thread_column, lambda k: out, thread_column,
+                       indents, tid, key)
+        return out.getvalue().encode('latin-1')
+    outs = {}
+    def get_out(k):
+        if k not in outs:
+            outs[k] = io.StringIO()
+        return outs[k]
+    indent_threads(lines, thread_column, get_out, key_column, indents, tid,
+                   key)
+    return dict((k, v.getvalue().encode('latin-1')) for k, v in outs.items())
+
+def make_chunks(filepath, chunk_size):
+    # splits the file into ranges that end at a newline character
+    result = []
+    with open(filepath, 'rb') as fp:
+        size = os.fstat(fp.fileno()).st_size
+        if size == 0:
+            return result
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            begin = 0
+            while begin < size:
+                end = mm.find(b'\n', min(begin + chunk_size, size) - 1)
+                end = size if end == -1 else end + 1
+                result.append((begin, end))
+                begin = end
+        finally:
+            mm.close()
+    return result
+
+def read_chunks(filepath, args):
+    thread_column, key_column = get_columns(args)
+    chunks = make_chunks(filepath, args.chunk_size)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    writer = SplitWriter(args.output, binary=True) if args.split else None
+    sys.stdout.flush()
+    with ProcessPoolExecutor(jobs, initializer=init_worker,
+                             initargs=(filepath,)) as pool:
+        # first pass: summarize each chunk
+        summaries = pool.map(summarize_chunk, *zip(*[
+                               (begin, end, args.ids, thread_column,
+                                key_column) for begin, end in chunks]))
+        # second pass: render chunks with the state carried in from their
+        # predecessors and write the results in order
+        pending = deque()
+        def flush_one():
+            res = pending.popleft().result()
+            if writer is None:
+                sys.stdout.buffer.write(res)
+            else:
+                for k, v in res.items():
+                    writer.get(k).write(v)
+        depths = {}
+        tid = None
+        key = None
+        try:
+            for (begin, end), (summary, last) in zip(chunks, summaries):
+                pending.append(pool.submit(render_chunk, begin, end, args.ids,
+                                           thread_column, key_column,
+                                           dict(depths), tid, key))
+                for k, f in summary.items():
+                    if k is None and thread_column is not None:
+                        k = tid
+                    depth = apply(f, depths.get(k, 0))
+                    if depth > 0:
+                        depths[k] = depth
+                    else:
+                        depths.pop(k, None)
+                if last[0] is not None:
+                    tid, key = last
+                while len(pending) > 2 * jobs:
+                    flush_one()
+            while pending:
+                flush_one()
+        finally:
+            if writer is not None:
+                writer.close()
+    sys.stdout.buffer.flush()
+
+# -- following live logs ------------------------------------------------------
+
+async def follow_log(filepath, args):
+    # indents new lines as they arrive and flushes the output at least every
+    # `args.latency` milliseconds while data keeps coming in
+    thread_column, key_column = get_columns(args)
+    writer = SplitWriter(args.output) if args.split else None
+    get_out = writer.get if writer else lambda key: sys.stdout
+    indent = ""
+    indents = {}
+    tid = None
+    key = None
+    budget = args.latency / 1000.0
+    last_flush = time.monotonic()
+    def flush():
+        if writer:
+            for fp in writer.files.values():
+                fp.flush()
+        else:
+            sys.stdout.flush()
+    try:
+        async for lines in follow(filepath, args.from_start):
+            if thread_column is None:
+                indent = indent_single(filter_lines(lines, args.ids),
+                                       sys.stdout, indent)
+            else:
+                tid, key = indent_threads(filter_lines(lines, args.ids),
+                                          thread_column, get_out,
+                                          key_column or thread_column,
+                                          indents, tid, key)
+            # always flush when running idle
+            now = time.monotonic()
+            if not lines or now - last_flush >= budget:
+                flush()
+                last_flush = now
+    finally:
+        if writer:
+            writer.close()
+
+def read_lines(fp, args):
+    lines = filter_lines(fp, args.ids)
+    thread_column, key_column = get_columns(args)
+    if thread_column is None:
+        indent_single(lines, sys.stdout)
+    elif key_column is None:
+        indent_threads(lines, thread_column, lambda key: sys.stdout,
+                       thread_column)
     else:
-        rx = re.compile('.+ (?:actor|ID = )([0-9]+) .+')
-        for line in fp:
-            rx_res = rx.match(line)
-            if rx_res != None and rx_res.group(1) in ids:
-                indent = print_indented(line, indent)
+        writer = SplitWriter(args.output)
+        try:
+            indent_threads(lines, thread_column, writer.get, key_column)
+        finally:
+            writer.close()
 
 def main():
-    parser = argparse.ArgumentParser(description='Add a new C++ class.')
+    parser = argparse.ArgumentParser(description='Indent a CAF trace log.')
     parser.add_argument('-i', dest='ids', action='append', help='only include actors with given ID(s)')
+    parser.add_argument('-t', '--threads', action='store_true', help='indent each thread separately')
+    parser.add_argument('-s', '--split', choices=['thread', 'actor'], help='write one file per thread or per actor (implies -t)')
+    parser.add_argument('-o', '--output', default='', help='file name prefix for -s (default: none)')
+    parser.add_argument('-f', '--format', default=DEFAULT_FORMAT, help='value of logger.file-format (default: "%(default)s")')
+    parser.add_argument('-x', '--index', action='store_true', help='use (and update) the index FILENAME.idx for -i')
+    parser.add_argument('-F', '--follow', action='store_true', help='follow a growing log file like tail -F')
+    parser.add_argument('--from-start', action='store_true', help='process existing lines before following (default: start at the end)')
+    parser.add_argument('--latency', type=int, default=200, help='maximum delay in milliseconds before flushing output for -F (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, help='process the file with N processes (0: one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024 * 1024, help='size of a chunk in bytes for -j (default: %(default)s)')
     parser.add_argument("log", help='path to the log file or "-" for reading from STDIN')
     args = parser.parse_args()
+    if args.index:
+        # the index only speeds up -i on regular files
+        if not args.ids:
+            parser.error('-x requires -i')
+        if args.jobs is not None or args.follow or args.log == '-':
+            parser.error('-x cannot be combined with -j, -F or reading STDIN')
     filepath = args.log
     if filepath == '-':
-        read_lines(fileinput.input(), args.ids)
+        read_lines(fileinput.input('-'), args)
     else:
         if not os.path.isfile(filepath):
             sys.exit()
+        if args.follow:
+            try:
+                asyncio.run(follow_log(filepath, args))
+            except KeyboardInterrupt:
+                pass
+            return
+        if args.index:
+            # the index applies the same filter as -i, i.e., we can simply
+            # process all lines returned by the query
+            from index_trace_log import query_lines
+            lines = query_lines(filepath, [('actor', x) for x in args.ids],
+                                args.format)
+            args.ids = None
+            read_lines(lines, args)
+            return
+        if args.jobs is not None:
+            read_chunks(filepath, args)
+            return
         with open(filepath) as fp:
-            read_lines(fp, args.ids)
+            read_lines(fp, args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+
+# Maintains a sidecar index for a CAF log that maps actor IDs, thread IDs and
+# components to runs of byte offsets in the log. The index lives next to the
+# log (FILENAME.idx) and grows incrementally: each update only scans the part
+# of the log that was written since the last update.
+
+# usage   (build/update): index_trace_log.py FILENAME
+#        (print matches): index_trace_log.py -q actor:42 -q thread:1234 FILENAME
+
+# The index consists of a header followed by segments. Each segment covers a
+# contiguous byte range of the log and starts with a directory of its keys,
+# which allows queries to read only the runs of the keys they look for:
+#
+#   header:    MAGIC, uint32 size, JSON (file format and log fingerprint)
+#   segment:   uint64 begin, uint64 end, uint32 directory size,
+#              uint32 runs size, directory, runs
+#   directory: uint32 number of entries, entries
+#   entry:     uint8 kind, uint16 size, key, uint32 offset, uint32 size
+#
+# Offsets of directory entries are relative to the runs of the segment. Runs
+# are varint-encoded pairs (distance to the end of the previous run, length of
+# the run) of byte ranges with consecutive matching lines.
+
+import argparse, sys, os, re, mmap, json, struct, hashlib, heapq
+
+from caf_log import DEFAULT_FORMAT, field_column
+
+MAGIC = b'CAFIDX2\n'
+
+KINDS = ['actor', 'thread', 'component']
+
+# number of bytes at the beginning of the log that identify the log file
+FINGERPRINT_SIZE = 4096
+
+# maximum number of log bytes per segment, bounds memory usage while indexing
+SEGMENT_SIZE = 64 * 1024 * 1024
+
+# same regex as used by `indent_trace_log.py -i`
+actor_rx = re.compile(rb'.+ (?:actor|ID = )([0-9]+) .+')
+
+def index_path(filepath):
+    return filepath + '.idx'
+
+def fingerprint(mm, size):
+    return hashlib.sha1(mm[:min(size, FINGERPRINT_SIZE)]).hexdigest()
+
+# -- varint encoding ----------------------------------------------------------
+
+def encode_runs(runs):
+    buf = bytearray()
+    last = 0
+    for begin, end in runs:
+        for x in (begin - last, end - begin):
+            while x >= 0x80:
+                buf.append((x & 0x7F) | 0x80)
+                x >>= 7
+            buf.append(x)
+        last = end
+    return bytes(buf)
+
+def decode_runs(buf, last=0):
+    x = 0
+    shift = 0
+    values = []
+    for byte in bytearray(buf):
+        x |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(x)
+        x = 0
+        shift = 0
+    for i in range(0, len(values), 2):
+        begin = last + values[i]
+        last = begin + values[i + 1]
+        yield begin, last
+
+# -- reading and writing index files ------------------------------------------
+
+SEGMENT_HEADER = struct.Struct('<QQII')
+
+DIRECTORY_ENTRY = struct.Struct('<BH')
+
+def read_header(fp):
+    # returns the header of an open index file or None
+    buf = fp.read(len(MAGIC) + 4)
+    if len(buf) < len(MAGIC) + 4 or not buf.startswith(MAGIC):
+        return None
+    size, = struct.unpack_from('<I', buf, len(MAGIC))
+    raw = fp.read(size)
+    if len(raw) < size:
+        return None
+    try:
+        return json.loads(raw.decode('utf-8'))
+    except ValueError:
+        return None
+
+def read_segments(fp):
+    # returns a list of (begin, end, directory offset, directory size, runs
+    # size) tuples for an open index file positioned after the header, only
+    # reading the fixed-size segment headers, or None if the last segment is
+    # incomplete
+    file_size = os.fstat(fp.fileno()).st_size
+    segments = []
+    pos = fp.tell()
+    while pos < file_size:
+        fp.seek(pos)
+        buf = fp.read(SEGMENT_HEADER.size)
+        if len(buf) < SEGMENT_HEADER.size:
+            return None
+        begin, end, dir_size, runs_size = SEGMENT_HEADER.unpack(buf)
+        pos += SEGMENT_HEADER.size
+        segments.append((begin, end, pos, dir_size, runs_size))
+        pos += dir_size + runs_size
+    if pos > file_size:
+        return None
+    return segments
+
+def read_index(filepath):
+    # returns the header and the list of segments (see read_segments) or
+    # (None, []) if there is no (valid) index
+    path = index_path(filepath)
+    if not os.path.isfile(path):
+        return None, []
+    with open(path, 'rb') as fp:
+        header = read_header(fp)
+        if header is None:
+            return None, []
+        segments = read_segments(fp)
+    if segments is None:
+        # a partially written segment invalidates the index
+        return None, []
+    return header, segments
+
+def read_directory(fp, segment):
+    # returns a dictionary mapping (kind, key) to (offset, size) of the runs
+    # relative to the beginning of the file
+    begin, end, dir_offset, dir_size, runs_size = segment
+    fp.seek(dir_offset)
+    buf = fp.read(dir_size)
+    runs_offset = dir_offset + dir_size
+    num_entries, = struct.unpack_from('<I', buf, 0)
+    pos = 4
+    result = {}
+    for _ in range(num_entries):
+        kind, size = DIRECTORY_ENTRY.unpack_from(buf, pos)
+        pos += DIRECTORY_ENTRY.size
+        key = buf[pos:pos + size].decode('utf-8')
+        pos += size
+        offset, size = struct.unpack_from('<II', buf, pos)
+        pos += 8
+        result[(KINDS[kind], key)] = (runs_offset + offset, size)
+    return result
+
+def write_segment(fp, begin, end, keys):
+    directory = bytearray(struct.pack('<I', len(keys)))
+    blobs = []
+    offset = 0
+    for (kind, key), runs in keys.items():
+        raw_key = key.encode('utf-8')
+        blob = encode_runs(runs)
+        directory += DIRECTORY_ENTRY.pack(KINDS.index(kind), len(raw_key))
+        directory += raw_key
+        directory += struct.pack('<II', offset, len(blob))
+        blobs.append(blob)
+        offset += len(blob)
+    fp.write(SEGMENT_HEADER.pack(begin, end, len(directory), offset))
+    fp.write(directory)
+    for blob in blobs:
+        fp.write(blob)
+
+# -- indexing -----------------------------------------------------------------
+
+def scan_segment(mm, begin, end, thread_column, component_column):
+    # returns a dictionary mapping (kind, key) to runs for all lines in the
+    # byte range [begin, end)
+    keys = {}
+    def add(kind, key, line_begin, line_end):
+        runs = keys.get((kind, key))
+        if runs is None:
+            keys[(kind, key)] = [[line_begin, line_end]]
+        elif runs[-1][1] == line_begin:
+            runs[-1][1] = line_end
+        else:
+            runs.append([line_begin, line_end])
+    last_column = max(thread_column, component_column)
+    pos = begin
+    # the range always ends at a newline, i.e., the last element is empty
+    for line in mm[begin:end].split(b'\n')[:-1]:
+        line_end = pos + len(line) + 1
+        rx_res = actor_rx.match(line)
+        if rx_res is not None:
+            add('actor', rx_res.group(1).decode('latin-1'), pos, line_end)
+        xs = line.split(None, last_column + 1)
+        if len(xs) > last_column:
+            add('thread', xs[thread_column].decode('latin-1'), pos, line_end)
+            add('component', xs[component_column].decode('latin-1'), pos,
+                line_end)
+        pos = line_end
+    return keys
+
+def update_index(filepath, file_format=DEFAULT_FORMAT):
+    # brings the index of `filepath` up to date, rebuilding it if the log was
+    # truncated, rotated or written with another format
+    thread_column = field_column(file_format, '%t')
+    component_column = field_column(file_format, '%c')
+    if thread_column is None or component_column is None:
+        raise ValueError('file format needs thread and component fields (%t '
+                         'and %c): ' + file_format)
+    with open(filepath, 'rb') as fp:
+        size = os.fstat(fp.fileno()).st_size
+        if size == 0:
+            return
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header, segments = read_index(filepath)
+            indexed = segments[-1][1] if segments else 0
+            if header is None or header['format'] != file_format \
+               or indexed > size \
+               or header['fingerprint'] != fingerprint(mm, header['size']):
+                fingerprint_size = min(size, FINGERPRINT_SIZE)
+                header = {'format': file_format, 'size': fingerprint_size,
+                          'fingerprint': fingerprint(mm, fingerprint_size)}
+                raw_header = json.dumps(header).encode('utf-8')
+                with open(index_path(filepath), 'wb') as out:
+                    out.write(MAGIC)
+                    out.write(struct.pack('<I', len(raw_header)))
+                    out.write(raw_header)
+                indexed = 0
+            # only index complete lines
+            last = mm.rfind(b'\n', indexed, size) + 1
+            if last <= indexed:
+                return
+            with open(index_path(filepath), 'ab') as out:
+                while indexed < last:
+                    end = last
+                    if end - indexed > SEGMENT_SIZE:
+                        end = mm.find(b'\n', indexed + SEGMENT_SIZE - 1) + 1
+                    write_segment(out, indexed, end,
+                                  scan_segment(mm, indexed, end,
+                                               thread_column,
+                                               component_column))
+                    indexed = end
+        finally:
+            mm.close()
+
+# -- queries ------------------------------------------------------------------
+
+def find_runs(fp, segments, keys):
+    # returns all runs for any of the (kind, key) pairs in ascending order
+    # with overlapping runs merged, reading only the directories of the
+    # segments and the runs of the requested keys from the index file `fp`
+    keys = set(keys)
+    blobs = []
+    for segment in segments:
+        directory = read_directory(fp, segment)
+        for key in keys:
+            entry = directory.get(key)
+            if entry is not None:
+                fp.seek(entry[0])
+                blobs.append(fp.read(entry[1]))
+    current = None
+    for begin, end in heapq.merge(*[decode_runs(x) for x in blobs]):
+        if current is not None and begin <= current[1]:
+            current[1] = max(current[1], end)
+            continue
+        if current is not None:
+            yield tuple(current)
+        current = [begin, end]
+    if current is not None:
+        yield tuple(current)
+
+def query_lines(filepath, keys, file_format=DEFAULT_FORMAT):
+    # updates the index and yields all lines matching any of the
+    # (kind, key) pairs in their original order
+    update_index(filepath, file_format)
+    header, segments = read_index(filepath)
+    with open(index_path(filepath), 'rb') as idx:
+        runs = list(find_runs(idx, segments, keys))
+    with open(filepath, 'rb') as fp:
+        for begin, end in runs:
+            fp.seek(begin)
+            while begin < end:
+                line = fp.readline()
+                begin += len(line)
+                yield line.decode('utf-8', 'replace')
+
+def parse_query(x):
+    kind, sep, key = x.partition(':')
+    if not sep or kind not in KINDS:
+        raise argparse.ArgumentTypeError('expected KIND:KEY with KIND in '
+                                         + ', '.join(KINDS) + ': ' + x)
+    return kind, key
+
+def main():
+    parser = argparse.ArgumentParser(description='Index a CAF log.')
+    parser.add_argument('-q', dest='queries', action='append', type=parse_query, help='print lines for KIND:KEY, e.g. actor:42')
+    parser.add_argument('-f', '--format', default=DEFAULT_FORMAT, help='value of logger.file-format (default: "%(default)s")')
+    parser.add_argument('log', help='path to the log file')
+    args = parser.parse_args()
+    if not os.path.isfile(args.log):
+        sys.exit('no such file: ' + args.log)
+    if not args.queries:
+        update_index(args.log, args.format)
+        return
+    for line in query_lines(args.log, args.queries, args.format):
+        sys.stdout.write(line)
+
+if __name__ == '__main__':
+    main()
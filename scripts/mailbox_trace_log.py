@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+
+# Measures how long messages wait in mailboxes by pairing the SEND event of
+# each message with its RECEIVE event (component `caf_flow`, debug verbosity).
+# The log has no message IDs, so the script identifies messages by receiver,
+# sender and content and matches equal messages in FIFO order.
+#
+# The report shows queueing-delay percentiles per receiver and per message
+# type plus the deepest mailboxes. The type of a message is its first element,
+# e.g., the atom in `('join_atom', 1199)`. With --depth, the script also writes
+# the maximum number of queued messages and of non-empty mailboxes per
+# interval as CSV.
+#
+# The script keeps at most --max-in-flight unmatched messages in memory and
+# evicts the oldest ones first, e.g., messages that were never processed or
+# whose RECEIVE is missing from the log. The report lists evicted and
+# remaining messages as unmatched.
+#
+# Note that `%r` has millisecond resolution, i.e., all delays are in ms.
+
+# usage:   (report): mailbox_trace_log.py FILENAME
+#    (depth in CSV): mailbox_trace_log.py --depth depth.csv --interval 10 FILENAME
+
+import argparse, sys, os, csv, fileinput
+from collections import Counter
+
+from caf_log import (DEFAULT_FORMAT, FLOW_COMPONENT, LineParser, InFlight,
+                     parse_flow_event, actor_id)
+from profile_trace_log import percentiles
+
+def message_type(content):
+    # returns the first element of a rendered message, dropping arguments of
+    # types such as `exit_msg(...)` and replacing numbers and strings, which
+    # would result in one type per value otherwise
+    x = content.strip()
+    if x.startswith('message('):
+        x = x[8:]
+    elif x.startswith('('):
+        x = x[1:]
+    depth = 0
+    for i, ch in enumerate(x):
+        if ch in '([{<':
+            depth += 1
+        elif ch in ')]}>':
+            if depth == 0:
+                x = x[:i]
+                break
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            x = x[:i]
+            break
+    x = x.strip()
+    if not x:
+        return '()'
+    if x[0] == "'":
+        return x
+    if x[0] == '"':
+        return 'string'
+    if x[0] in '-0123456789':
+        return 'number'
+    return x.split('(', 1)[0]
+
+class DelayStats(object):
+    __slots__ = ['count', 'total', 'hist']
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.hist = Counter()
+
+    def add(self, delay):
+        self.count += 1
+        self.total += delay
+        self.hist[delay] += 1
+
+class MailboxAnalyzer(object):
+    def __init__(self, parser, max_in_flight=100000, depth_out=None,
+                 interval=100):
+        self.parser = parser
+        self.runtime = parser.column('runtime')
+        self.component = parser.column('component')
+        self.actor = parser.column('actor')
+        self.message = parser.column('message')
+        if None in (self.runtime, self.component, self.actor, self.message):
+            raise ValueError('file format needs at least %r, %c, %a and %m: '
+                             + parser.format)
+        # maps (receiver, sender, content) to send timestamps
+        self.in_flight = InFlight(max_in_flight)
+        self.total = DelayStats()
+        self.receivers = {}
+        self.types = {}
+        # current and maximum number of queued messages per receiver
+        self.depths = Counter()
+        self.max_depths = Counter()
+        self.depth = 0
+        self.unmatched_types = Counter()
+        self.unmatched_receives = 0
+        self.depth_out = depth_out
+        self.interval = interval
+        self.bucket = None
+        # maximum number of queued messages and of non-empty mailboxes in
+        # the current interval
+        self.bucket_max = 0
+        self.bucket_receivers = 0
+
+    def add(self, line):
+        xs = self.parser.parse(line)
+        if xs is None or xs[self.component] != FLOW_COMPONENT:
+            return
+        event = parse_flow_event(xs[self.message])
+        if event is None:
+            return
+        name, fields = event
+        if name == 'SEND':
+            # logged in the context of the sender
+            receiver = actor_id(fields.get('TO', ''))
+            if receiver is None:
+                return
+            key = (receiver, actor_id(fields.get('FROM', '')),
+                   fields.get('CONTENT', ''))
+            ts = int(xs[self.runtime])
+            self.update_depth(receiver, 1, ts)
+            for (other, _, content), _ in self.in_flight.send(key, ts):
+                self.unmatched_types[message_type(content)] += 1
+                self.update_depth(other, -1, ts)
+        elif name == 'RECEIVE':
+            # logged in the context of the receiver
+            receiver = int(xs[self.actor])
+            key = (receiver, actor_id(fields.get('FROM', '')),
+                   fields.get('CONTENT', ''))
+            sent = self.in_flight.receive(key)
+            if sent is None:
+                self.unmatched_receives += 1
+                return
+            ts = int(xs[self.runtime])
+            self.update_depth(receiver, -1, ts)
+            # clocks of different threads may disagree slightly
+            delay = max(ts - sent, 0)
+            self.total.add(delay)
+            for stats, k in ((self.receivers, receiver),
+                             (self.types, message_type(key[2]))):
+                x = stats.get(k)
+                if x is None:
+                    x = stats[k] = DelayStats()
+                x.add(delay)
+
+    def update_depth(self, receiver, delta, ts):
+        if self.depth_out is not None:
+            # writes the maximum total depth per interval; timestamps of
+            # different threads may go backwards slightly, so we never
+            # return to an interval that we have written already
+            bucket = ts // self.interval
+            if self.bucket is not None and bucket < self.bucket:
+                bucket = self.bucket
+            if bucket != self.bucket:
+                self.write_depth(bucket)
+                self.bucket = bucket
+                self.bucket_max = self.depth
+                self.bucket_receivers = len(self.depths)
+        depth = self.depths[receiver] + delta
+        if depth > 0:
+            self.depths[receiver] = depth
+            if depth > self.max_depths[receiver]:
+                self.max_depths[receiver] = depth
+        else:
+            del self.depths[receiver]
+        self.depth += delta
+        self.bucket_max = max(self.bucket_max, self.depth)
+        self.bucket_receivers = max(self.bucket_receivers, len(self.depths))
+
+    def write_depth(self, next_bucket=None):
+        # writes the current interval and fills gaps up to `next_bucket`
+        if self.bucket is None:
+            return
+        self.depth_out.writerow([self.bucket * self.interval,
+                                 self.bucket_max, self.bucket_receivers])
+        if next_bucket is not None:
+            for bucket in range(self.bucket + 1, next_bucket):
+                self.depth_out.writerow([bucket * self.interval, self.depth,
+                                         len(self.depths)])
+
+    def unmatched_sends(self):
+        result = Counter(self.unmatched_types)
+        for (_, _, content), _ in self.in_flight.items():
+            result[message_type(content)] += 1
+        return result
+
+SORT_KEYS = {
+    'count': lambda x: x[1].count,
+    'total': lambda x: x[1].total,
+    'p99': lambda x: percentiles(x[1].hist, [0.99])[0],
+}
+
+def print_table(title, stats, sort_key, limit, out, label=str):
+    rows = sorted(stats.items(), key=SORT_KEYS[sort_key], reverse=True)
+    if limit:
+        rows = rows[:limit]
+    header = ['count', 'mean', 'p50', 'p99', 'p999', 'max']
+    out.write('\n{0}:\n'.format(title))
+    out.write(''.join('{0:>10}'.format(x) for x in header))
+    out.write('\n')
+    for key, x in rows:
+        values = [x.count, '{0:.1f}'.format(x.total / x.count)] \
+                 + percentiles(x.hist) + [max(x.hist)]
+        out.write(''.join('{0:>10}'.format(v) for v in values))
+        out.write('  ')
+        out.write(label(key))
+        out.write('\n')
+
+def print_report(analyzer, sort_key, limit, out):
+    total = analyzer.total
+    out.write('matched messages: {0}\n'.format(total.count))
+    if total.count:
+        print_table('queueing delay in ms', {'all messages': total}, sort_key,
+                    0, out)
+        print_table('per receiver', analyzer.receivers, sort_key, limit, out,
+                    lambda x: 'actor' + str(x))
+        print_table('per message type', analyzer.types, sort_key, limit, out)
+    if analyzer.max_depths:
+        out.write('\ndeepest mailboxes:\n')
+        for receiver, depth in analyzer.max_depths.most_common(limit or None):
+            out.write('{0:>10}  actor{1}\n'.format(depth, receiver))
+    unmatched = analyzer.unmatched_sends()
+    in_flight = analyzer.in_flight
+    if unmatched or analyzer.unmatched_receives:
+        out.write('\nunmatched SEND events: {0} ({1} evicted, {2} remaining), '
+                  'unmatched RECEIVE events: {3}\n'
+                  .format(in_flight.evicted + len(in_flight),
+                          in_flight.evicted, len(in_flight),
+                          analyzer.unmatched_receives))
+        for name, n in unmatched.most_common(limit or None):
+            out.write('{0:>10}  {1}\n'.format(n, name))
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure queueing delays of messages in a CAF log.')
+    parser.add_argument('-f', '--format', default=DEFAULT_FORMAT, help='value of logger.file-format (default: "%(default)s")')
+    parser.add_argument('-s', '--sort', choices=sorted(SORT_KEYS), default='total', help='sort the tables by this column (default: %(default)s)')
+    parser.add_argument('-n', '--limit', type=int, default=20, help='number of rows per table, 0 for all (default: %(default)s)')
+    parser.add_argument('--max-in-flight', type=int, default=100000, help='maximum number of sent messages waiting for their RECEIVE (default: %(default)s)')
+    parser.add_argument('--depth', help='write the mailbox depth over time as CSV to this file')
+    parser.add_argument('--interval', type=int, default=100, help='length of an interval in ms for --depth (default: %(default)s)')
+    parser.add_argument('log', help='path to the log file or "-" for reading from STDIN')
+    args = parser.parse_args()
+    if args.interval <= 0:
+        sys.exit('--interval must be positive')
+    if args.max_in_flight < 1:
+        sys.exit('--max-in-flight must be positive')
+    depth_file = open(args.depth, 'w', newline='') if args.depth else None
+    depth_out = None
+    if depth_file is not None:
+        depth_out = csv.writer(depth_file)
+        depth_out.writerow(['time', 'max_queued', 'max_receivers'])
+    try:
+        analyzer = MailboxAnalyzer(LineParser(args.format),
+                                   args.max_in_flight, depth_out,
+                                   args.interval)
+    except ValueError as err:
+        sys.exit(str(err))
+    if args.log == '-':
+        for line in fileinput.input('-'):
+            analyzer.add(line)
+    else:
+        if not os.path.isfile(args.log):
+            sys.exit('no such file: ' + args.log)
+        with open(args.log, errors='replace') as fp:
+            for line in fp:
+                analyzer.add(line)
+    if depth_file is not None:
+        analyzer.write_depth()
+        depth_file.close()
+    print_report(analyzer, args.sort, args.limit, sys.stdout)
+
+if __name__ == '__main__':
+    main()
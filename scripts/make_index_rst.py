@@ -10,21 +10,47 @@ import sys
 
 part_rx = re.compile(r"\\part{(.+)}")
 include_rx = re.compile(r"\\include{tex/(.+)}")
-with open(sys.argv[1], 'w') as out_file:
-  out_file.write(".. include:: index_header.rst\n")
+
+def parse_manual(tex_file):
+  # returns the structure of the manual as list of ('part', title) and
+  # ('include', chapter) pairs
+  result = []
+  for line in tex_file:
+    m = part_rx.match(line)
+    if m:
+      result.append(('part', m.group(1)))
+      continue
+    m = include_rx.match(line)
+    if m:
+      result.append(('include', m.group(1)))
+  return result
+
+def chapters(structure):
+  return [name for kind, name in structure if kind == 'include']
+
+def render_index(structure):
+  result = ".. include:: index_header.rst\n"
+  for kind, name in structure:
+    if kind == 'part':
+      result += ("\n.. toctree::\n"
+                 "   :maxdepth: 2\n"
+                 "   :caption: ")
+      result += name
+      result += "\n\n"
+    else:
+      result += "   "
+      result += name
+      result += "\n"
+  result += "\n.. include:: index_footer.rst\n"
+  return result
+
+def main():
+  if len(sys.argv) != 3:
+    sys.exit('Usage: make_index_rst.py <output-file> <input-file>')
   with open(sys.argv[2]) as tex_file:
-    for line in tex_file:
-      m = part_rx.match(line)
-      if m:
-        out_file.write("\n.. toctree::\n"
-                         "   :maxdepth: 2\n"
-                         "   :caption: ")
-        out_file.write(m.group(1))
-        out_file.write("\n\n")
-        continue
-      m = include_rx.match(line)
-      if m:
-        out_file.write("   ")
-        out_file.write(m.group(1))
-        out_file.write("\n")
-  out_file.write("\n.. include:: index_footer.rst\n")
+    structure = parse_manual(tex_file)
+  with open(sys.argv[1], 'w') as out_file:
+    out_file.write(render_index(structure))
+
+if __name__ == '__main__':
+  main()
@@ -1,6 +1,11 @@
 #!/usr/bin/env python
 
+import atexit
+import functools
+import hashlib
+import io
 import json
+import os
 import sys
 import re
 
@@ -15,6 +20,11 @@ singlefig_rx = re.compile(r"\\singlefig{(.+)}{(.+)}{(.+)}")
 
 listing_rx = re.compile(r"\\(cppexample|iniexample|sourcefile)(?:\[(.+)\])?{(.+)}")
 
+# rendered listings survive pandoc runs in this file, an empty value for
+# CAF_LISTING_CACHE disables the cache
+listing_cache_path = os.environ.get('CAF_LISTING_CACHE',
+                                    '.pandoc-listing-cache.json')
+
 # -- factory functions --------------------------------------------------------
 
 def make_rst_block(x):
@@ -33,30 +43,103 @@ def make_rst_image(img, caption, label):
 # -- code listing generation --------------------------------------------------
 
 def parse_range(astr):
+    # returns a sorted list of disjoint, inclusive (first, last) line ranges
+    # or None if the listing has no range; line numbers start at 1
     if not astr:
-        return set()
-    result = set()
+        return None
+    ranges = []
     for part in astr.split(','):
         x = part.split('-')
-        result.update(range(int(x[0]), int(x[-1]) + 1))
-    return sorted(result)
+        ranges.append((max(int(x[0]), 1), int(x[-1])))
+    ranges.sort()
+    result = []
+    for first, last in ranges:
+        if result and first <= result[-1][1] + 1:
+            result[-1] = (result[-1][0], max(result[-1][1], last))
+        elif first <= last:
+            result.append((first, last))
+    return result
+
+@functools.lru_cache(maxsize=None)
+def read_lines(fname):
+    # returns the content of a file and its lines
+    with open(fname, 'rb') as fin:
+        content = fin.read()
+    # split lines like reading the file in text mode, i.e., with universal
+    # newlines
+    text = io.StringIO(content.decode('utf-8'), newline=None)
+    return content, text.readlines()
+
+class ListingCache:
+    # Maps listings (file, range, language) to the rendered block together
+    # with the SHA-1 of the file, its size and its modification time. Unless
+    # size or mtime changed, we skip reading the file altogether.
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = self.load()
+        self.updates = {}
+        atexit.register(self.save)
+
+    def load(self):
+        try:
+            with open(self.path) as fin:
+                return json.load(fin)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def get(self, key, fname, render):
+        st = os.stat(fname)
+        entry = self.entries.get(key)
+        if entry and entry['size'] == st.st_size \
+           and entry['mtime'] == st.st_mtime_ns:
+            return entry['block']
+        content, lines = read_lines(fname)
+        digest = hashlib.sha1(content).hexdigest()
+        if entry and entry['sha1'] == digest:
+            block = entry['block']
+        else:
+            block = render(lines)
+        entry = {'sha1': digest, 'size': st.st_size, 'mtime': st.st_mtime_ns,
+                 'block': block}
+        self.entries[key] = entry
+        self.updates[key] = entry
+        return block
+
+    def save(self):
+        # pandoc runs once per chapter, possibly in parallel, so we merge our
+        # updates into the current state and replace the file atomically
+        if not self.updates:
+            return
+        entries = self.load()
+        entries.update(self.updates)
+        tmp = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        try:
+            with open(tmp, 'w') as out:
+                json.dump(entries, out)
+            os.replace(tmp, self.path)
+        except (IOError, OSError) as err:
+            sys.stderr.write('WARNING: cannot write listing cache: {0}\n'
+                             .format(err))
+
+listing_cache = None
 
 def make_rst_listing(line_range, fname, language):
-    snippet = ''
-    if not line_range:
-        with open(fname, 'r') as fin:
-            for line in fin:
-                snippet += '   '
-                snippet += line
-    else:
-        with open(fname) as mfile:
-            for num, line in enumerate(mfile, 1):
-                if num in line_range:
-                    snippet += '   '
-                    snippet += line
-    return make_rst_block('.. code-block:: ' + language + '\n' +
-                          '\n' +
-                          snippet + '\n')
+    global listing_cache
+    def render(lines):
+        if line_range is not None:
+            lines = [x for first, last in line_range
+                     for x in lines[first - 1:last]]
+        snippet = ''.join('   ' + x for x in lines)
+        return '.. code-block:: ' + language + '\n' + \
+               '\n' + \
+               snippet + '\n'
+    if not listing_cache_path:
+        return make_rst_block(render(read_lines(fname)[1]))
+    if listing_cache is None:
+        listing_cache = ListingCache(listing_cache_path)
+    key = '{0}:{1}:{2}'.format(os.path.abspath(fname), line_range, language)
+    return make_rst_block(listing_cache.get(key, fname, render))
 
 def cppexample(line_range, fname):
     return make_rst_listing(line_range, '../../examples/{0}.cpp'.format(fname), 'C++')
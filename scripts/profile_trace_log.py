@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+# Computes a per-function latency profile from the ENTRY/EXIT pairs that
+# `CAF_LOG_TRACE` writes to a CAF log with trace verbosity. The script pairs
+# ENTRY and EXIT lines per thread and reports inclusive time (including
+# callees) and exclusive time (excluding traced callees) per `%C::%M`.
+#
+# Note that `%r` has millisecond resolution, i.e., all durations are in ms.
+
+# usage (report): profile_trace_log.py FILENAME
+#  (flame graph): profile_trace_log.py -c stacks.txt FILENAME
+#                 flamegraph.pl stacks.txt > profile.svg
+
+import argparse, sys, os, fileinput
+from collections import Counter
+
+from caf_log import DEFAULT_FORMAT, LineParser
+
+QUANTILES = [0.5, 0.99, 0.999]
+
+def percentile(counter, q, total=None):
+    # returns the q-quantile of the values counted in `counter`
+    if total is None:
+        total = sum(counter.values())
+    if total == 0:
+        return 0
+    rank = q * total
+    seen = 0
+    for value in sorted(counter):
+        seen += counter[value]
+        if seen >= rank:
+            return value
+    return value
+
+def percentiles(counter, qs=QUANTILES):
+    total = sum(counter.values())
+    return [percentile(counter, q, total) for q in qs]
+
+class FunctionStats(object):
+    __slots__ = ['calls', 'inclusive', 'exclusive', 'inclusive_hist',
+                 'exclusive_hist']
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0
+        self.exclusive = 0
+        # duration -> number of calls, exact and bounded by the number of
+        # distinct durations
+        self.inclusive_hist = Counter()
+        self.exclusive_hist = Counter()
+
+    def add(self, inclusive, exclusive):
+        self.calls += 1
+        self.inclusive += inclusive
+        self.exclusive += exclusive
+        self.inclusive_hist[inclusive] += 1
+        self.exclusive_hist[exclusive] += 1
+
+class Frame(object):
+    __slots__ = ['function', 'stack', 'entry', 'children']
+
+    def __init__(self, function, stack, entry):
+        self.function = function
+        self.stack = stack
+        self.entry = entry
+        self.children = 0
+
+class Profiler(object):
+    def __init__(self, parser):
+        self.parser = parser
+        self.runtime = parser.column('runtime')
+        self.thread = parser.column('thread')
+        self.level = parser.column('level')
+        self.message = parser.column('message')
+        self.cls = parser.column('class')
+        self.method = parser.column('method')
+        if None in (self.runtime, self.thread, self.message, self.method):
+            raise ValueError('file format needs at least %r, %t, %M and %m: '
+                             + parser.format)
+        self.stacks = {}
+        self.functions = {}
+        self.collapsed = Counter()
+        self.unmatched_exits = 0
+
+    def function_name(self, xs):
+        if self.cls is not None and xs[self.cls]:
+            return xs[self.cls] + '::' + xs[self.method]
+        return xs[self.method]
+
+    def add(self, line):
+        xs = self.parser.parse(line)
+        if xs is None or (self.level is not None
+                          and xs[self.level] != 'TRACE'):
+            return
+        msg = xs[self.message]
+        if msg.startswith('ENTRY'):
+            stack = self.stacks.setdefault(xs[self.thread], [])
+            name = self.function_name(xs)
+            path = stack[-1].stack + ';' + name if stack else name
+            stack.append(Frame(name, path, int(xs[self.runtime])))
+        elif msg.startswith('EXIT'):
+            # EXIT lines come from the scope guard and thus name a lambda
+            # instead of the traced function, so we rely on the stack
+            stack = self.stacks.get(xs[self.thread])
+            if not stack:
+                self.unmatched_exits += 1
+                return
+            frame = stack.pop()
+            inclusive = max(int(xs[self.runtime]) - frame.entry, 0)
+            exclusive = max(inclusive - frame.children, 0)
+            if stack:
+                stack[-1].children += inclusive
+            else:
+                del self.stacks[xs[self.thread]]
+            stats = self.functions.get(frame.function)
+            if stats is None:
+                stats = self.functions[frame.function] = FunctionStats()
+            stats.add(inclusive, exclusive)
+            self.collapsed[frame.stack] += exclusive
+
+    def unmatched_entries(self):
+        return sum(len(x) for x in self.stacks.values())
+
+SORT_KEYS = {
+    'exclusive': lambda x: x[1].exclusive,
+    'inclusive': lambda x: x[1].inclusive,
+    'calls': lambda x: x[1].calls,
+}
+
+def print_report(profiler, sort_key, limit, out):
+    rows = sorted(profiler.functions.items(), key=SORT_KEYS[sort_key],
+                  reverse=True)
+    if limit:
+        rows = rows[:limit]
+    header = ['calls', 'incl', 'excl', 'incl p50', 'p99', 'p999',
+              'excl p50', 'p99', 'p999']
+    out.write(''.join('{0:>10}'.format(x) for x in header))
+    out.write('  function\n')
+    for name, stats in rows:
+        values = [stats.calls, stats.inclusive, stats.exclusive] \
+                 + percentiles(stats.inclusive_hist) \
+                 + percentiles(stats.exclusive_hist)
+        out.write(''.join('{0:>10}'.format(x) for x in values))
+        out.write('  ')
+        out.write(name)
+        out.write('\n')
+    if profiler.unmatched_exits or profiler.unmatched_entries():
+        out.write('\nunmatched ENTRY lines: {0}, unmatched EXIT lines: {1}\n'
+                  .format(profiler.unmatched_entries(),
+                          profiler.unmatched_exits))
+
+def write_csv(profiler, out):
+    out.write('function,calls,inclusive,exclusive,'
+              'inclusive_p50,inclusive_p99,inclusive_p999,'
+              'exclusive_p50,exclusive_p99,exclusive_p999\n')
+    for name, stats in sorted(profiler.functions.items()):
+        values = [stats.calls, stats.inclusive, stats.exclusive] \
+                 + percentiles(stats.inclusive_hist) \
+                 + percentiles(stats.exclusive_hist)
+        out.write('"{0}",'.format(name.replace('"', '""')))
+        out.write(','.join(str(x) for x in values))
+        out.write('\n')
+
+def write_collapsed(profiler, out):
+    # one line per call stack in the format of flamegraph.pl and speedscope
+    for stack, value in sorted(profiler.collapsed.items()):
+        if value > 0:
+            out.write('{0} {1}\n'.format(stack, value))
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile functions in a CAF trace log.')
+    parser.add_argument('-f', '--format', default=DEFAULT_FORMAT, help='value of logger.file-format (default: "%(default)s")')
+    parser.add_argument('-s', '--sort', choices=sorted(SORT_KEYS), default='exclusive', help='sort the report by this column (default: %(default)s)')
+    parser.add_argument('-n', '--limit', type=int, default=50, help='number of functions in the report, 0 for all (default: %(default)s)')
+    parser.add_argument('-c', '--collapsed', help='write collapsed stacks (exclusive ms) for flame graph tools to this file')
+    parser.add_argument('--csv', help='write all per-function statistics as CSV to this file')
+    parser.add_argument('log', help='path to the log file or "-" for reading from STDIN')
+    args = parser.parse_args()
+    try:
+        profiler = Profiler(LineParser(args.format))
+    except ValueError as err:
+        sys.exit(str(err))
+    if args.log == '-':
+        for line in fileinput.input('-'):
+            profiler.add(line)
+    else:
+        if not os.path.isfile(args.log):
+            sys.exit('no such file: ' + args.log)
+        with open(args.log, errors='replace') as fp:
+            for line in fp:
+                profiler.add(line)
+    print_report(profiler, args.sort, args.limit, sys.stdout)
+    if args.collapsed:
+        with open(args.collapsed, 'w') as out:
+            write_collapsed(profiler, out)
+    if args.csv:
+        with open(args.csv, 'w') as out:
+            write_csv(profiler, out)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# Round-trip tests for the columnar log archive of archive_trace_log.py.
+
+# usage: python -m unittest discover -s scripts/test -t scripts
+
+import os, shutil, subprocess, sys, tempfile, unittest
+
+import archive_trace_log
+from archive_trace_log import Archive, Query
+
+SCRIPT = os.path.abspath(archive_trace_log.__file__)
+
+NODE = '7C5E3BEB1DE2B7D4B2C9C6D2F1A00C0B1F2D9A7E#4242'
+
+THREADS = ['139876543210752', '139876543214848', '139876543218944']
+
+def make_log(num_lines=2000):
+    # returns a log in the default format with multi-line messages, flow
+    # events, non-ASCII text and bytes that are not valid UTF-8
+    fmt = '{0} {1} {2} actor{3} {4} {5} {6} {7}:{8} {9}\n'
+    lines = [b'[caf] logging to caf.log\n']
+    runtime = 1600
+    for i in range(num_lines):
+        runtime += i % 3
+        thread = THREADS[i % len(THREADS)]
+        actor = i % 17
+        if i % 10 == 0:
+            line = fmt.format(runtime, 'caf_flow', 'DEBUG', actor, thread,
+                              'caf.scheduled_actor', 'enqueue',
+                              'scheduled_actor.cpp', 159,
+                              'SEND ; TO = {0}@{1} ; FROM = {2}@{1} ; STAGES '
+                              '= [] ; CONTENT = message(\'ping\', {3})'
+                              .format(actor + 1, NODE, actor, i))
+        elif i % 10 == 1:
+            line = fmt.format(runtime, 'caf', 'ERROR', actor, thread,
+                              'caf.io.basp_broker', 'handle_exception',
+                              'basp_broker.cpp', 412,
+                              'exception: {bad} größe\n  at frame #0\n'
+                              '  at frame #1')
+        elif i % 10 == 2:
+            line = fmt.format(runtime, 'caf', 'TRACE', actor, thread, '',
+                              'parse_args', 'actor_system_config.cpp', 315,
+                              'ENTRY x = ' + str(i))
+        else:
+            line = fmt.format(runtime, 'caf', 'TRACE', actor, thread,
+                              'caf.scheduled_actor', 'operator()',
+                              'scheduled_actor.cpp', 464, 'EXIT')
+        lines.append(line.encode('utf-8'))
+        if i % 97 == 0:
+            lines.append(b'raw \xff\xfe bytes, CRLF line ending\r\n')
+    return b''.join(lines)
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.dir, 'caf.log')
+        self.archive = os.path.join(self.dir, 'caf.cafa')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_script(self, *args):
+        return subprocess.check_output([sys.executable, SCRIPT] + list(args))
+
+    def pack(self, content, *args):
+        with open(self.log, 'wb') as fp:
+            fp.write(content)
+        self.run_script('pack', '-o', self.archive, *(args + (self.log,)))
+
+    def query(self, *args):
+        return self.run_script('query', *(args + (self.archive,)))
+
+    def test_round_trip(self):
+        content = make_log()
+        for block_size in ('100', '65536'):
+            self.pack(content, '--block-size', block_size)
+            self.assertEqual(self.query(), content)
+
+    def test_round_trip_edge_cases(self):
+        # empty log, no trailing newline and lines before the first match
+        for content in (b'', make_log(10)[:-1], b'no log line\n',
+                        b'no log line'):
+            self.pack(content)
+            self.assertEqual(self.query(), content)
+        # queries that include the last line keep the missing newline
+        self.pack(make_log(10)[:-1])
+        self.assertTrue(self.query('-a', '9').endswith(b'EXIT'))
+        self.assertTrue(self.query('-a', '8').endswith(b'EXIT\n'))
+
+    def test_custom_format(self):
+        fmt = '%d [%t] {%p} %c: %m%n'
+        content = (b'2020-01-01T00:00:00.000 [1] {INFO} caf: a {b}\n'
+                   b'2020-01-01T00:00:00.001 [2] {WARN} caf.io: c\n'
+                   b'  d\n')
+        self.pack(content, '-f', fmt)
+        self.assertEqual(self.query(), content)
+        self.assertEqual(self.query('-t', '2'),
+                         b'2020-01-01T00:00:00.001 [2] {WARN} caf.io: c\n'
+                         b'  d\n')
+
+    def test_queries_match_a_scan(self):
+        content = make_log()
+        self.pack(content, '--block-size', '100')
+        # lines of the log with their continuation lines
+        records = []
+        for line in content.splitlines(True)[1:]:
+            if line[:1].isdigit():
+                records.append(line)
+            else:
+                records[-1] += line
+        fields = [x.split(b' ', 9) for x in records]
+        def select(pred):
+            return b''.join(x for x, xs in zip(records, fields) if pred(xs))
+        self.assertEqual(self.query('-a', '3'),
+                         select(lambda xs: xs[3] == b'actor3'))
+        self.assertEqual(self.query('-t', THREADS[1], '-c', 'caf_flow'),
+                         select(lambda xs: xs[4] == THREADS[1].encode()
+                                and xs[1] == b'caf_flow'))
+        self.assertEqual(self.query('--begin', '2000', '--end', '2100'),
+                         select(lambda xs: 2000 <= int(xs[0]) <= 2100))
+        self.assertEqual(self.query('-l', 'DEBUG'),
+                         select(lambda xs: xs[2] in (b'ERROR', b'DEBUG')))
+        self.assertEqual(self.query('-t', 'unknown'), b'')
+
+    def test_stats_allow_skipping_blocks(self):
+        self.pack(make_log(), '--block-size', '100')
+        archive = Archive(self.archive)
+        try:
+            q = Query(archive)
+            q.add_range('runtime', 2000, 2100)
+            skipped = [q.skip(x) for x in archive.blocks]
+            self.assertTrue(any(skipped))
+            self.assertFalse(all(skipped))
+        finally:
+            archive.close()
+
+    def test_rejects_incomplete_archives(self):
+        self.pack(make_log(100))
+        with open(self.archive, 'rb') as fp:
+            data = fp.read()
+        with open(self.archive, 'wb') as fp:
+            fp.write(data[:-5])
+        self.assertRaises(ValueError, Archive, self.archive)
+        with open(self.archive, 'wb') as fp:
+            fp.write(b'not an archive')
+        self.assertRaises(ValueError, Archive, self.archive)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# Tests that the vectorized functions in atom_codec.py agree with the scalar
+# reference implementations.
+
+# usage: python -m unittest discover -s scripts/test -t scripts
+
+import random, unittest
+
+import atom_codec
+from atom_codec import atom_read, atom_encode, decode_many, encode_many
+
+# names with characters of the whole decoding table, with characters outside
+# of it and with up to MAX_LENGTH characters
+NAMES = ['', 'a', 'ok', 'get_state', 'join_atom', 'abcdefghij', 'ABCXYZ019_',
+         ' x ', 'a-b', 'caf::tick', 'ätom', 'tick\x00']
+
+# values that decode_many must accept just like atom_read: marker only, no
+# marker, all bits set, and integers that do not fit into uint64
+EDGE_VALUES = [0, 0xF, 0x3F, 1 << 59, 0xF << 60, (1 << 64) - 1, -1, -42,
+               1 << 64, (1 << 64) + 0xF, 1 << 100]
+
+def random_values(rng, n):
+    result = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.4:
+            # valid atoms of random length
+            k = rng.randint(0, atom_codec.MAX_LENGTH)
+            result.append(atom_encode(''.join(
+                rng.choice(atom_codec.DECODING_TABLE) for _ in range(k))))
+        elif roll < 0.8:
+            result.append(rng.getrandbits(64))
+        else:
+            result.append(rng.getrandbits(rng.randint(1, 63)))
+    return result
+
+@unittest.skipIf(atom_codec.np is None, 'requires NumPy')
+class TestVectorized(unittest.TestCase):
+    def test_decode_matches_scalar(self):
+        values = random_values(random.Random(42), 5000)
+        self.assertEqual(decode_many(values), [atom_read(x) for x in values])
+
+    def test_decode_edge_values(self):
+        for x in EDGE_VALUES:
+            self.assertEqual(decode_many([x]), [atom_read(x)], hex(x))
+        self.assertEqual(decode_many(EDGE_VALUES),
+                         [atom_read(x) for x in EDGE_VALUES])
+
+    def test_decode_out_of_range_values_in_a_stream(self):
+        # a single value beyond uint64 must not affect the other values
+        values = random_values(random.Random(7), 100)
+        values[50:50] = [-1, 1 << 64]
+        self.assertEqual(decode_many(values), [atom_read(x) for x in values])
+
+    def test_decode_accepts_iterables(self):
+        values = random_values(random.Random(1), 10)
+        self.assertEqual(decode_many(iter(values)),
+                         [atom_read(x) for x in values])
+        self.assertEqual(decode_many([]), [])
+
+    def test_encode_matches_scalar(self):
+        self.assertEqual(encode_many(NAMES), [atom_encode(x) for x in NAMES])
+        rng = random.Random(42)
+        alphabet = atom_codec.DECODING_TABLE + '-:.ä'
+        names = [''.join(rng.choice(alphabet)
+                         for _ in range(rng.randint(0, atom_codec.MAX_LENGTH)))
+                 for _ in range(5000)]
+        self.assertEqual(encode_many(names), [atom_encode(x) for x in names])
+
+    def test_round_trip(self):
+        names = [x for x in NAMES
+                 if all(ch in atom_codec.DECODING_TABLE[1:] for ch in x)]
+        self.assertEqual(decode_many(encode_many(names)), names)
+
+    def test_encode_rejects_long_names(self):
+        self.assertRaises(ValueError, atom_encode, 'abcdefghijk')
+        self.assertRaises(ValueError, encode_many, ['ok', 'abcdefghijk'])
+
+class TestFallback(unittest.TestCase):
+    # without NumPy, the functions use the scalar versions
+    def setUp(self):
+        self.np = atom_codec.np
+        atom_codec.np = None
+
+    def tearDown(self):
+        atom_codec.np = self.np
+
+    def test_decode(self):
+        values = random_values(random.Random(3), 100) + EDGE_VALUES
+        self.assertEqual(decode_many(values), [atom_read(x) for x in values])
+
+    def test_encode(self):
+        self.assertEqual(encode_many(NAMES), [atom_encode(x) for x in NAMES])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+# Tests for the shared log parser in caf_log.py.
+
+# usage: python -m unittest discover -s scripts/test -t scripts
+
+import unittest
+
+from caf_log import (DEFAULT_FORMAT, LineParser, InFlight, parse_format,
+                     parse_flow_event, actor_id)
+
+NODE = '7C5E3BEB1DE2B7D4B2C9C6D2F1A00C0B1F2D9A7E#4242'
+
+# lines as written by the logger with the default file format
+ENTRY_LINE = ('1603 caf TRACE actor7 139876543210752 caf.scheduled_actor '
+              'resume scheduled_actor.cpp:464 ENTRY max_throughput = 300\n')
+
+EXIT_LINE = ('1605 caf TRACE actor7 139876543210752 caf.scheduled_actor '
+             'operator() scheduled_actor.cpp:464 EXIT\n')
+
+SEND_LINE = ('1604 caf_flow DEBUG actor7 139876543210752 caf.scheduled_actor '
+             'enqueue scheduled_actor.cpp:159 SEND ; TO = 12@{0} ; FROM = '
+             '7@{0} ; STAGES = [] ; CONTENT = message(\'ping\', 42)\n'
+             .format(NODE))
+
+RECEIVE_LINE = ('1611 caf_flow DEBUG actor12 139876543214848 '
+                'caf.scheduled_actor consume scheduled_actor.cpp:641 RECEIVE '
+                '; FROM = 7@{0} ; STAGES = [] ; CONTENT = message(\'ping\', '
+                '42)\n'.format(NODE))
+
+class TestParseFormat(unittest.TestCase):
+    def test_default_format(self):
+        self.assertEqual(parse_format(DEFAULT_FORMAT), [
+            ('runtime', ''), ('text', ' '), ('component', ''), ('text', ' '),
+            ('level', ''), ('text', ' '), ('actor', ''), ('text', ' '),
+            ('thread', ''), ('text', ' '), ('class', ''), ('text', ' '),
+            ('method', ''), ('text', ' '), ('file', ''), ('text', ':'),
+            ('line', ''), ('text', ' '), ('message', ''), ('newline', '')])
+
+    def test_percent_sign_and_invalid_specifiers(self):
+        # `logger::parse_format` drops unknown specifiers silently
+        self.assertEqual(parse_format('[%p] 100%% %x%m'), [
+            ('text', '['), ('level', ''), ('text', '] 100% '),
+            ('message', '')])
+
+    def test_trailing_text(self):
+        self.assertEqual(parse_format('%m <-'),
+                         [('message', ''), ('text', ' <-')])
+
+class TestLineParser(unittest.TestCase):
+    def test_default_format(self):
+        parser = LineParser()
+        self.assertEqual(parser.fields, [
+            'runtime', 'component', 'level', 'actor', 'thread', 'class',
+            'method', 'file', 'line', 'message'])
+        self.assertEqual(parser.parse_dict(ENTRY_LINE), {
+            'runtime': '1603', 'component': 'caf', 'level': 'TRACE',
+            'actor': '7', 'thread': '139876543210752',
+            'class': 'caf.scheduled_actor', 'method': 'resume',
+            'file': 'scheduled_actor.cpp', 'line': '464',
+            'message': 'ENTRY max_throughput = 300'})
+        xs = parser.parse(EXIT_LINE)
+        self.assertEqual(xs[parser.column('method')], 'operator()')
+        self.assertEqual(xs[parser.column('message')], 'EXIT')
+
+    def test_flow_event_lines(self):
+        parser = LineParser()
+        xs = parser.parse_dict(SEND_LINE)
+        self.assertEqual(xs['component'], 'caf_flow')
+        self.assertEqual(xs['actor'], '7')
+        self.assertTrue(xs['message'].startswith('SEND ; TO = 12@'))
+        self.assertTrue(xs['message'].endswith(
+            "CONTENT = message('ping', 42)"))
+        self.assertEqual(parser.parse_dict(RECEIVE_LINE)['actor'], '12')
+
+    def test_free_function_without_class(self):
+        # the logger renders an empty class name for free functions
+        line = ('17 caf DEBUG actor0 139876543210752  parse_args '
+                'actor_system_config.cpp:315 skip unknown option\n')
+        xs = LineParser().parse_dict(line)
+        self.assertEqual(xs['class'], '')
+        self.assertEqual(xs['method'], 'parse_args')
+        self.assertEqual(xs['message'], 'skip unknown option')
+
+    def test_rejects_lines_of_other_formats(self):
+        parser = LineParser()
+        # continuation of a multi-line message
+        self.assertIsNone(parser.parse('  at frame #3\n'))
+        # unknown level
+        self.assertIsNone(parser.parse(ENTRY_LINE.replace('TRACE', 'trace')))
+        self.assertIsNone(parser.parse(''))
+
+    def test_custom_format(self):
+        parser = LineParser('%r [%t] %p %c: %m%n')
+        self.assertEqual(parser.fields, ['runtime', 'thread', 'level',
+                                         'component', 'message'])
+        self.assertEqual(parser.parse('42 [1407] WARN caf.io: a: b\n'),
+                         ('42', '1407', 'WARN', 'caf.io', 'a: b'))
+        self.assertIsNone(parser.column('actor'))
+        self.assertEqual(parser.column('message'), 4)
+
+    def test_repeated_fields(self):
+        # only the first occurrence of a field becomes a column
+        parser = LineParser('%p %m %p%n')
+        self.assertEqual(parser.fields, ['level', 'message'])
+        self.assertEqual(parser.parse('INFO hello world INFO\n'),
+                         ('INFO', 'hello world'))
+
+class TestFlowEvents(unittest.TestCase):
+    def test_send(self):
+        msg = LineParser().parse_dict(SEND_LINE)['message']
+        self.assertEqual(parse_flow_event(msg), ('SEND', {
+            'TO': '12@' + NODE, 'FROM': '7@' + NODE, 'STAGES': '[]',
+            'CONTENT': "message('ping', 42)"}))
+
+    def test_receive(self):
+        msg = LineParser().parse_dict(RECEIVE_LINE)['message']
+        self.assertEqual(parse_flow_event(msg), ('RECEIVE', {
+            'FROM': '7@' + NODE, 'STAGES': '[]',
+            'CONTENT': "message('ping', 42)"}))
+
+    def test_spawn_and_terminate(self):
+        self.assertEqual(parse_flow_event(
+            'SPAWN ; ID = 12 ; NAME = pong ; TYPE = '
+            'caf::stateful_actor<pong_state> ; ARGS = () ; NODE = ' + NODE
+            + ' ; GROUPS = []'), ('SPAWN', {
+                'ID': '12', 'NAME': 'pong',
+                'TYPE': 'caf::stateful_actor<pong_state>', 'ARGS': '()',
+                'NODE': NODE, 'GROUPS': '[]'}))
+        self.assertEqual(parse_flow_event(
+            'TERMINATE ; ID = 12 ; REASON = error(exit_reason, normal) ; '
+            'NODE = ' + NODE), ('TERMINATE', {
+                'ID': '12', 'REASON': 'error(exit_reason, normal)',
+                'NODE': NODE}))
+
+    def test_separator_in_content(self):
+        # values may contain ' ; ' themselves
+        self.assertEqual(parse_flow_event(
+            'SEND ; TO = 3@' + NODE + ' ; FROM = invalid-actor ; STAGES = [] '
+            '; CONTENT = message("a ; FROM = b ; c")')[1]['CONTENT'],
+            'message("a ; FROM = b ; c")')
+
+    def test_events_without_fields(self):
+        self.assertEqual(parse_flow_event('SKIP'), ('SKIP', {}))
+        self.assertEqual(parse_flow_event('ACCEPT ; UNBLOCKED = 1'),
+                         ('ACCEPT', {'UNBLOCKED': '1'}))
+
+    def test_truncated_event(self):
+        # e.g., the last line of a log after a crash
+        self.assertEqual(parse_flow_event('SEND ; TO = 12@' + NODE),
+                         ('SEND', {'TO': '12@' + NODE}))
+
+    def test_other_messages(self):
+        self.assertIsNone(parse_flow_event('ENTRY max_throughput = 300'))
+        self.assertIsNone(parse_flow_event('SENDING ; TO = 3'))
+
+    def test_actor_id(self):
+        self.assertEqual(actor_id('12@' + NODE), 12)
+        self.assertEqual(actor_id(' tcp://10.0.0.1:4242/id/12 '), 12)
+        self.assertIsNone(actor_id('invalid-actor'))
+        self.assertIsNone(actor_id(''))
+
+class TestInFlight(unittest.TestCase):
+    def test_fifo_order_for_equal_keys(self):
+        xs = InFlight(10)
+        xs.send('a', 1)
+        xs.send('b', 2)
+        xs.send('a', 3)
+        self.assertEqual(len(xs), 3)
+        self.assertEqual(xs.receive('a'), 1)
+        self.assertEqual(xs.receive('a'), 3)
+        self.assertIsNone(xs.receive('a'))
+        self.assertIsNone(xs.receive('c'))
+        self.assertEqual(xs.items(), [('b', 2)])
+        self.assertEqual(len(xs), 1)
+
+    def test_evicts_oldest_message_first(self):
+        xs = InFlight(3)
+        self.assertEqual(xs.send('a', 1), [])
+        self.assertEqual(xs.send('b', 2), [])
+        self.assertEqual(xs.send('a', 3), [])
+        # evicts only the single oldest message, not all messages for 'a'
+        self.assertEqual(xs.send('c', 4), [('a', 1)])
+        self.assertEqual(xs.send('c', 5), [('b', 2)])
+        self.assertEqual(xs.evicted, 2)
+        self.assertEqual(sorted(xs.items()), [('a', 3), ('c', 4), ('c', 5)])
+        self.assertEqual(xs.receive('a'), 3)
+
+    def test_skips_received_messages_when_evicting(self):
+        xs = InFlight(2)
+        xs.send('a', 1)
+        xs.send('b', 2)
+        self.assertEqual(xs.receive('a'), 1)
+        self.assertEqual(xs.send('c', 3), [])
+        # 'a' is gone already, i.e., 'b' is the oldest pending message
+        self.assertEqual(xs.send('d', 4), [('b', 2)])
+        self.assertEqual(xs.evicted, 1)
+        self.assertEqual(sorted(xs.items()), [('c', 3), ('d', 4)])
+
+    def test_bounded_bookkeeping(self):
+        xs = InFlight(4)
+        for i in range(1000):
+            xs.send(i % 3, i)
+            self.assertEqual(xs.receive(i % 3), i)
+            self.assertLessEqual(len(xs.order), 3 * xs.max_size)
+        self.assertEqual(len(xs), 0)
+        self.assertEqual(xs.evicted, 0)
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, InFlight, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+# Round-trip tests for the sidecar index of index_trace_log.py.
+
+# usage: python -m unittest discover -s scripts/test -t scripts
+
+import os, shutil, tempfile, unittest
+
+import index_trace_log
+from index_trace_log import (index_path, read_index, update_index,
+                             query_lines)
+
+THREADS = ['139876543210752', '139876543214848', '139876543218944']
+
+COMPONENTS = ['caf', 'caf_flow', 'caf.io']
+
+def make_lines(first, count):
+    # returns log lines in the default format, including flow events that
+    # refer to actors via `ID = ...`
+    fmt = '{0} {1} {2} actor{3} {4} {5} {6} {7}:{8} {9}\n'
+    result = []
+    for i in range(first, first + count):
+        if i % 50 == 0:
+            msg = 'SPAWN ; ID = {0} ; NAME = worker ; TYPE = caf.actor ; ' \
+                  'ARGS = () ; NODE = 7C5E3BEB#4242 ; GROUPS = []'.format(i)
+        else:
+            msg = 'ENTRY x = {0}'.format(i)
+        result.append(fmt.format(i, COMPONENTS[i % 3], 'TRACE', i % 7,
+                                 THREADS[(i // 4) % 3], 'caf.scheduled_actor',
+                                 'resume', 'scheduled_actor.cpp', 464, msg))
+    return result
+
+def reference(lines, kind, key):
+    # selects lines just like `indent_trace_log.py -i` or `grep` would
+    result = []
+    for line in lines:
+        xs = line.split()
+        if kind == 'thread' and xs[4] == key:
+            result.append(line)
+        elif kind == 'component' and xs[1] == key:
+            result.append(line)
+        elif kind == 'actor':
+            m = index_trace_log.actor_rx.match(line.encode())
+            if m is not None and m.group(1).decode() == key:
+                result.append(line)
+    return result
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.dir, 'caf.log')
+        # force several segments per update
+        self.segment_size = index_trace_log.SEGMENT_SIZE
+        index_trace_log.SEGMENT_SIZE = 4096
+
+    def tearDown(self):
+        index_trace_log.SEGMENT_SIZE = self.segment_size
+        shutil.rmtree(self.dir)
+
+    def write(self, lines, mode='w'):
+        with open(self.log, mode) as fp:
+            fp.write(''.join(lines))
+
+    def check_queries(self, lines):
+        for kind, key in [('thread', THREADS[0]), ('thread', THREADS[2]),
+                          ('component', 'caf_flow'), ('actor', '3'),
+                          ('actor', '50'), ('thread', 'unknown')]:
+            self.assertEqual(list(query_lines(self.log, [(kind, key)])),
+                             reference(lines, kind, key), (kind, key))
+        # lines matching several keys appear only once and in order
+        keys = [('actor', '3'), ('component', 'caf')]
+        expected = [x for x in lines
+                    if any(x in reference(lines, k, v) for k, v in keys)]
+        self.assertEqual(list(query_lines(self.log, keys)), expected)
+
+    def index_bytes(self):
+        with open(index_path(self.log), 'rb') as fp:
+            return fp.read()
+
+    def test_build(self):
+        lines = make_lines(0, 500)
+        self.write(lines)
+        update_index(self.log)
+        header, segments = read_index(self.log)
+        self.assertEqual(header['format'], index_trace_log.DEFAULT_FORMAT)
+        self.assertGreater(len(segments), 1)
+        self.assertEqual(segments[0][0], 0)
+        self.assertEqual(segments[-1][1], os.path.getsize(self.log))
+        for prev, cur in zip(segments, segments[1:]):
+            self.assertEqual(prev[1], cur[0])
+        self.check_queries(lines)
+
+    def test_incremental_update(self):
+        lines = make_lines(0, 300)
+        self.write(lines)
+        update_index(self.log)
+        before = self.index_bytes()
+        _, segments = read_index(self.log)
+        # an incomplete line stays out of the index until it is complete
+        more = make_lines(300, 200)
+        self.write(more + [more[0][:20]], 'a')
+        update_index(self.log)
+        after = self.index_bytes()
+        self.assertEqual(after[:len(before)], before)
+        _, new_segments = read_index(self.log)
+        self.assertEqual(new_segments[:len(segments)], segments)
+        self.assertGreater(len(new_segments), len(segments))
+        self.assertEqual(new_segments[-1][1],
+                         os.path.getsize(self.log) - 20)
+        self.write([more[0][20:]], 'a')
+        lines += more + [more[0]]
+        self.check_queries(lines)
+        # no new data leaves the index as it is
+        before = self.index_bytes()
+        update_index(self.log)
+        self.assertEqual(self.index_bytes(), before)
+
+    def test_rejects_stale_fingerprint(self):
+        self.write(make_lines(0, 300))
+        update_index(self.log)
+        before = self.index_bytes()
+        # a new log that is at least as large as the old one, e.g., after
+        # rotating the log, only differs in its first bytes
+        lines = make_lines(1000, 300)
+        self.write(lines)
+        update_index(self.log)
+        header, segments = read_index(self.log)
+        self.assertFalse(self.index_bytes().startswith(before))
+        self.assertEqual(header['fingerprint'],
+                         index_trace_log.fingerprint(
+                             ''.join(lines).encode(), header['size']))
+        self.assertEqual(segments[0][0], 0)
+        self.check_queries(lines)
+
+    def test_rebuilds_after_truncation(self):
+        self.write(make_lines(0, 300))
+        update_index(self.log)
+        lines = make_lines(0, 100)
+        self.write(lines)
+        self.check_queries(lines)
+
+    def test_rebuilds_for_other_formats(self):
+        self.write(make_lines(0, 100))
+        update_index(self.log)
+        fmt = '%r %c %p %a %t %C %M %F:%L  %m%n'
+        update_index(self.log, fmt)
+        header, _ = read_index(self.log)
+        self.assertEqual(header['format'], fmt)
+
+    def test_rebuilds_damaged_index(self):
+        lines = make_lines(0, 300)
+        self.write(lines)
+        update_index(self.log)
+        data = self.index_bytes()
+        with open(index_path(self.log), 'wb') as fp:
+            fp.write(data[:-3])
+        self.assertEqual(read_index(self.log), (None, []))
+        self.check_queries(lines)
+
+    def test_rejects_formats_without_fields(self):
+        self.write(make_lines(0, 10))
+        self.assertRaises(ValueError, update_index, self.log, '%r %m%n')
+
+if __name__ == '__main__':
+    unittest.main()